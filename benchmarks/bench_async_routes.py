@@ -0,0 +1,103 @@
+"""
+Concurrency benchmark for POST /create-order: the previous blocking handler (plain `def` route,
+flush per message on Starlette's threadpool) versus the async route with the pipelined publisher.
+
+Broker round-trips are emulated with SlowProducer, so no Kafka is needed:
+
+    PYTHONPATH=. python -m benchmarks.bench_async_routes --requests 2000 --concurrency 1000 --latency-ms 20
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from typing import Dict, List
+
+import httpx
+from fastapi import Depends, FastAPI
+
+from benchmarks.common import SlowProducer, emit, latency_summary
+from services.cart_service.app.api.models import CreateOrderRequest
+from services.cart_service.app.api.routes import router, get_order_generator
+from services.cart_service.order_generator import OrderGenerator
+from services.cart_service.publisher import OrderEventPublisher
+from services.cart_service.store_memory import OrderStoreMemory
+
+
+def blocking_app(latency_sec: float) -> FastAPI:
+    """The cart service as it was before: sync route, publish = produce + flush."""
+    generator = OrderGenerator(publisher=OrderEventPublisher(producer=SlowProducer(latency_sec)), store=OrderStoreMemory())
+    app = FastAPI()
+
+    def shared_generator() -> OrderGenerator:
+        return generator
+
+    @app.post("/create-order")
+    def create_order(request: CreateOrderRequest, order_generator: OrderGenerator = Depends(shared_generator)):
+        order_id = order_generator.create_order(request.order_id, request.number_of_items)
+        return {"message": "order created and published successfully", "orderId": order_id}
+
+    return app
+
+
+def async_app(latency_sec: float) -> FastAPI:
+    """The current cart service routes with a pipelined publisher."""
+    publisher = OrderEventPublisher(producer=SlowProducer(latency_sec), pipelined=True, poll_interval_sec=0.005)
+    generator = OrderGenerator(publisher=publisher, store=OrderStoreMemory())
+    app = FastAPI()
+    app.include_router(router)
+
+    async def shared_generator() -> OrderGenerator:
+        return generator
+
+    app.dependency_overrides[get_order_generator] = shared_generator
+    return app
+
+
+async def drive(app: FastAPI, requests: int, concurrency: int) -> Dict[str, object]:
+    latencies: List[float] = []
+    failures = 0
+    gate = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", limits=limits) as client:
+        async def one(i: int) -> None:
+            nonlocal failures
+            async with gate:
+                start = time.perf_counter()
+                r = await client.post("/create-order", json={"orderId": str(i + 1), "numberOfItems": 3})
+                latencies.append(time.perf_counter() - start)
+                if r.status_code != 200:
+                    failures += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "requests": requests,
+        "failures": failures,
+        "elapsed_sec": round(elapsed, 3),
+        "requests_per_sec": round(requests / elapsed, 1),
+        **latency_summary(latencies),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=1000)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="emulated broker round-trip")
+    args = parser.parse_args()
+
+    latency_sec = args.latency_ms / 1000.0
+    emit({
+        "benchmark": "cart_create_order_concurrency",
+        "params": vars(args),
+        "before_blocking_threadpool": asyncio.run(drive(blocking_app(latency_sec), args.requests, args.concurrency)),
+        "after_async_pipelined": asyncio.run(drive(async_app(latency_sec), args.requests, args.concurrency)),
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Cart order store throughput under concurrent threadpool-style access:
+
+    PYTHONPATH=. python -m benchmarks.bench_cart_store --threads 1 8 32 --shards 1 64
+
+Each thread loops over create (add_if_absent of a new id), a few reads, and a status
+compare-and-set on a random existing order. shards=1 is a single global lock.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List
+
+from benchmarks.common import emit, latency_summary
+from libs.kafka_common.models import Currency, Order, OrderItem, OrderStatus
+from services.cart_service.store_memory import OrderStoreMemory
+
+_STATUSES = [OrderStatus.NEW, OrderStatus.CONFIRMED, OrderStatus.SHIPPED]
+
+
+def make_order(order_id: str) -> Order:
+    return Order(
+        order_id=order_id, customer_id="CUST-00001", order_date=datetime(2024, 1, 1),
+        items=[OrderItem(item_id="ITEM-001", quantity=1, price=10.0)], total_amount=10.0,
+        currency=Currency.USD, status=OrderStatus.NEW,
+    )
+
+
+def run(threads: int, shards: int, ops_per_thread: int, preload: int, seed: int) -> Dict[str, object]:
+    store = OrderStoreMemory(shards=shards)
+    for n in range(preload):
+        store.add(make_order(f"ORD-{n}"))
+    # orders are built up front so the loop only measures the store
+    new_orders = [[make_order(f"ORD-{t}-{n}") for n in range(ops_per_thread)] for t in range(threads)]
+    barrier = threading.Barrier(threads + 1)
+    latencies: List[List[float]] = [[] for _ in range(threads)]
+
+    def worker(t: int) -> None:
+        rng = random.Random(seed + t)
+        out = latencies[t]
+        barrier.wait()
+        for order in new_orders[t]:
+            started = time.perf_counter()
+            store.add_if_absent(order)
+            for _ in range(4):
+                store.get(f"ORD-{rng.randrange(preload)}")
+            order_id = f"ORD-{rng.randrange(preload)}"
+            current = store.get(order_id)
+            store.compare_and_set_status(order_id, current.status, rng.choice(_STATUSES))
+            out.append(time.perf_counter() - started)
+
+    workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    for w in workers:
+        w.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - started
+    flat = [x for per_thread in latencies for x in per_thread]
+    return {"ops_per_sec": round(len(flat) * 6 / elapsed), "iteration_latency": latency_summary(flat)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 64])
+    parser.add_argument("--ops-per-thread", type=int, default=5_000)
+    parser.add_argument("--preload", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    results = {
+        f"threads={threads},shards={shards}": run(threads, shards, args.ops_per_thread, args.preload, args.seed)
+        for threads in args.threads
+        for shards in args.shards
+    }
+    emit({"benchmark": "cart_store", "params": vars(args), "results": results})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Encode/decode cost and payload size of every registered event codec, for OrderCreatedEvents
+with increasing item counts (and one OrderStatusUpdatedEvent):
+
+    PYTHONPATH=. python -m benchmarks.bench_codecs --items 1 10 100 1000
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import timeit
+from datetime import datetime
+from typing import Dict, List
+
+from benchmarks.common import emit
+from libs.kafka_common.events import OrderCreatedEvent, OrderStatusUpdatedEvent
+from libs.kafka_common.models import Currency, Order, OrderItem, OrderStatus
+from libs.kafka_common.serdes_json import available_codecs, get_codec
+
+
+def make_created_event(n_items: int, rng: random.Random) -> OrderCreatedEvent:
+    items = [
+        OrderItem(item_id=f"ITEM-{rng.randint(1, 999):03d}", quantity=rng.randint(1, 10), price=round(rng.uniform(10.0, 100.0), 2))
+        for _ in range(n_items)
+    ]
+    order = Order(
+        order_id=f"ORD-{rng.randint(1, 10**9)}",
+        customer_id=f"CUST-{rng.randint(1, 99999):05d}",
+        order_date=datetime.now(),
+        items=items,
+        total_amount=round(sum(i.quantity * i.price for i in items), 2),
+        currency=rng.choice(list(Currency)),
+        status=OrderStatus.NEW,
+    )
+    return OrderCreatedEvent(order_id=order.order_id, order=order)
+
+
+def per_call_us(fn, min_time: float) -> float:
+    """Best-of-3 mean time per call, with the loop count calibrated to take about min_time."""
+    timer = timeit.Timer(fn)
+    number, elapsed = timer.autorange()
+    number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+    best = min(timer.repeat(repeat=3, number=number))
+    return round(best / number * 1e6, 2)
+
+
+def bench_event(event, min_time: float) -> Dict[str, Dict[str, float]]:
+    results: Dict[str, Dict[str, float]] = {}
+    for name in available_codecs():
+        codec = get_codec(name)
+        raw = codec.encode(event)
+        view = memoryview(raw)
+        results[name] = {
+            "bytes": len(raw),
+            "encode_us": per_call_us(lambda: codec.encode(event), min_time),
+            "decode_us": per_call_us(lambda: codec.decode(view), min_time),
+        }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per measurement")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    cases: List[Dict[str, object]] = [
+        {"event": "ORDER_STATUS_UPDATED", "items": 0,
+         "codecs": bench_event(OrderStatusUpdatedEvent(order_id="ORD-1", status=OrderStatus.SHIPPED), args.min_time)}
+    ]
+    for n in args.items:
+        cases.append({"event": "ORDER_CREATED", "items": n, "codecs": bench_event(make_created_event(n, rng), args.min_time)})
+
+    emit({"benchmark": "event_codecs", "params": vars(args), "cases": cases})
+
+
+if __name__ == "__main__":
+    main()
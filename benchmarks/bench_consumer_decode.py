@@ -0,0 +1,109 @@
+"""
+Backlog drain of ConsumerRunner with payloads decoded on the consumer thread (--processes 0) or by
+a decode pool of N worker processes, into a compact OrderDB:
+
+    PYTHONPATH=. python -m benchmarks.bench_consumer_decode --orders 50000 --items 1 10 --processes 0 2 4
+
+The backlog (ORDER_CREATED events with publisher headers) is produced to an in-process
+MemoryBroker first, then drained by ConsumerRunner._run on the main thread.
+
+Reported per case:
+- orders applied per second
+- consumer process CPU per order: the consumer thread plus the pool's feeder threads, not the
+  workers. It caps the drain rate at about 1e6 / cpu_us orders/s however many cores the workers
+  get, so compare it with the --processes 0 case.
+
+On a machine with fewer cores than processes + 1, the workers and the consumer take turns on the
+same core. Wall-clock rates then show the pool's overhead rather than its gain.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from benchmarks.bench_codecs import make_created_event
+from benchmarks.common import emit, run_metadata
+from libs.kafka_common.config import ORDERS_TOPIC
+from libs.kafka_common.event_headers import event_headers
+from libs.kafka_common.memory_broker import MemoryBroker, MemoryConsumer, MemoryProducer
+from libs.kafka_common.serdes_json import serialize_event
+from services.order_service.consumer_db import OrderDB
+from services.order_service.consumer_runner import ConsumerRunner
+
+
+def fill_backlog(broker: MemoryBroker, orders: int, items: int, partitions: int, rng: random.Random) -> List[str]:
+    """Produces the backlog; returns the last order id of each partition."""
+    producer = MemoryProducer(broker=broker)
+    last: Dict[int, str] = {}
+    for n in range(orders):
+        event = make_created_event(items, rng)
+        order_id = f"ORD-{n}"
+        event.order_id = event.order.order_id = order_id
+        partition = n % partitions
+        producer.produce(ORDERS_TOPIC, value=serialize_event(event), key=order_id.encode(), partition=partition, headers=event_headers(event))
+        last[partition] = order_id
+    producer.flush()
+    return list(last.values())
+
+
+def drain(broker: MemoryBroker, last_ids: List[str], processes: int, batch_size: int) -> Dict[str, Any]:
+    def memory_consumer(group_id: str, auto_offset_reset: str, extra_config: Optional[Dict[str, Any]] = None) -> MemoryConsumer:
+        return MemoryConsumer({"group.id": group_id, "auto.offset.reset": auto_offset_reset, **(extra_config or {})}, broker=broker)
+
+    db = OrderDB(compact=True)
+    runner = ConsumerRunner(
+        db, group_id=f"bench-decode-{processes}-{time.monotonic_ns()}", batch_size=batch_size,
+        batch_timeout_sec=0.01, consumer_factory=memory_consumer, decode_processes=processes,
+    )
+    if runner.decode_pool is not None:
+        # start the workers outside the measurement
+        runner.decode_pool._ensure_executor().submit(int).result()
+
+    def stop_when_drained() -> None:
+        while not all(db.contains(order_id) for order_id in last_ids):
+            time.sleep(0.002)
+        runner._stop_event.set()
+
+    watcher = threading.Thread(target=stop_when_drained, daemon=True)
+    watcher.start()
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        runner._run()
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    finally:
+        if runner.decode_pool is not None:
+            runner.decode_pool.close()
+    watcher.join()
+    orders = len(db.export_orders())
+    return {
+        "orders": orders,
+        "orders_per_sec": round(orders / wall),
+        "consumer_cpu_us_per_order": round(cpu / orders * 1e6, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=50_000)
+    parser.add_argument("--items", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--processes", type=int, nargs="+", default=[0, 2, 4])
+    parser.add_argument("--partitions", type=int, default=6)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    cases = []
+    for items in args.items:
+        broker = MemoryBroker(num_partitions=args.partitions)
+        last_ids = fill_backlog(broker, args.orders, items, args.partitions, random.Random(args.seed))
+        for processes in args.processes:
+            cases.append({"items": items, "processes": processes, **drain(broker, last_ids, processes, args.batch_size)})
+
+    emit({"benchmark": "consumer_decode", "meta": run_metadata(), "params": vars(args), "cases": cases})
+
+
+if __name__ == "__main__":
+    main()
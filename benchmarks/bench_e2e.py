@@ -0,0 +1,283 @@
+"""
+End-to-end throughput and latency of the whole pipeline: POST /create-order on the cart service
+routes -> orders topic -> ConsumerRunner -> OrderDB, at an offered rate and a mix of order sizes:
+
+    PYTHONPATH=. python -m benchmarks.bench_e2e --rate 1000 --duration 10 --items 1:70,10:25,100:5
+    PYTHONPATH=. python -m benchmarks.bench_e2e --backend kafka --backlog 50000 --output e2e.json
+
+Requests go to the cart app in-process over ASGI and are sent open-loop: request i is due at
+start + i / rate, and its end-to-end latency runs from that due time until the ORDER_CREATED event
+has been applied to the OrderDB (from then on /order-details returns it). A backed-up pipeline
+therefore can't hide latency by slowing the load down. --rate 0 sends as fast as --concurrency
+allows.
+
+Reported:
+- offered and achieved request rates, and orders applied per second
+- cart request latency, and end-to-end p50/p99/p999
+- catch-up time: from the last acknowledged request until the consumer has applied everything
+- with --backlog N: the time to drain N orders published while the consumer was stopped
+
+--backend memory (default) runs against the in-process MemoryBroker, with --partitions and a
+--latency-ms delivery delay. --backend kafka uses KAFKA_BOOTSTRAP_SERVERS with a fresh consumer
+group that starts at the latest offsets; warm-up orders are sent until one arrives, so the
+consumer is assigned before measuring starts. Everything shares one process (and its GIL), so
+compare runs with each other rather than with a deployed system.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from fastapi import FastAPI
+
+from benchmarks.common import emit, latency_summary, run_metadata
+from libs.kafka_common.kafka_factory import create_consumer, create_producer
+from libs.kafka_common.memory_broker import MemoryBroker, MemoryConsumer, MemoryProducer
+from services.cart_service.app.api.routes import router, get_order_generator
+from services.cart_service.order_generator import OrderGenerator
+from services.cart_service.publisher import OrderEventPublisher
+from services.cart_service.store_memory import OrderStoreMemory
+from services.order_service.consumer_db import CompactOrder, OrderDB
+from services.order_service.consumer_runner import ConsumerRunner
+from services.order_service.models import OrderEntry
+
+# order id ranges of one run, below the run's base id
+WARMUP_IDS = 500_000_000
+BACKLOG_IDS = 600_000_000
+
+
+class TimedOrderDB(OrderDB):
+    """OrderDB recording when each order became readable."""
+
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.visible_at: Dict[str, float] = {}
+        self.arrived = threading.Event()
+
+    def add_order(self, order_entry: OrderEntry):
+        result = super().add_order(order_entry)
+        self.visible_at[order_entry.order.order_id] = time.perf_counter()
+        self.arrived.set()
+        return result
+
+    def add_record(self, order_id: str, record: CompactOrder) -> None:
+        super().add_record(order_id, record)
+        self.visible_at[order_id] = time.perf_counter()
+        self.arrived.set()
+
+
+def parse_mix(spec: str) -> Tuple[List[int], List[float]]:
+    """"1:70,10:25,100:5" -> item counts and their weights."""
+    sizes, weights = [], []
+    for part in spec.split(","):
+        size, _, weight = part.partition(":")
+        sizes.append(int(size))
+        weights.append(float(weight or 1))
+    return sizes, weights
+
+
+def make_backend(args: argparse.Namespace) -> Tuple[Any, Callable[..., Any]]:
+    """The producer for the cart publisher and the consumer factory for ConsumerRunner."""
+    if args.backend == "memory":
+        broker = MemoryBroker(num_partitions=args.partitions, latency_ms=args.latency_ms)
+
+        def memory_consumer(group_id: str, auto_offset_reset: str, extra_config: Optional[Dict[str, Any]] = None) -> MemoryConsumer:
+            return MemoryConsumer({"group.id": group_id, "auto.offset.reset": auto_offset_reset, **(extra_config or {})}, broker=broker)
+
+        return MemoryProducer(broker=broker), memory_consumer
+
+    def kafka_consumer(group_id: str, auto_offset_reset: str, extra_config: Optional[Dict[str, Any]] = None) -> Any:
+        # a fresh group must not replay the topic's history into the measurement
+        return create_consumer(group_id, auto_offset_reset="latest", extra_config=extra_config)
+
+    return create_producer(), kafka_consumer
+
+
+def cart_app(generator: OrderGenerator) -> FastAPI:
+    app = FastAPI()
+    app.include_router(router)
+
+    async def shared_generator() -> OrderGenerator:
+        return generator
+
+    app.dependency_overrides[get_order_generator] = shared_generator
+    return app
+
+
+async def warm_up(client: httpx.AsyncClient, db: TimedOrderDB, base: int, timeout_sec: float) -> None:
+    """Sends an order every 200 ms until one of them reaches the DB."""
+    deadline = time.monotonic() + timeout_sec
+    n = 0
+    while not db.arrived.is_set():
+        if time.monotonic() > deadline:
+            raise SystemExit("warm-up: no order reached the consumer; is the broker up?")
+        await client.post("/create-order", json={"orderId": str(base + WARMUP_IDS + n), "numberOfItems": 1})
+        n += 1
+        await asyncio.sleep(0.2)
+
+
+async def drive(client: httpx.AsyncClient, orders: List[Tuple[str, int]], rate: float, concurrency: int) -> Dict[str, Any]:
+    due_at: Dict[str, float] = {}
+    acked: List[str] = []
+    request_latencies: List[float] = []
+    failures = 0
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(order_id: str, items: int, due: float) -> None:
+        nonlocal failures
+        try:
+            r = await client.post("/create-order", json={"orderId": order_id, "numberOfItems": items})
+            ok = r.status_code == 200
+        except httpx.HTTPError:
+            ok = False
+        finally:
+            gate.release()
+        request_latencies.append(time.perf_counter() - due)
+        if ok:
+            acked.append(f"ORD-{order_id}")
+        else:
+            failures += 1
+
+    tasks = []
+    start = time.perf_counter()
+    for i, (order_id, items) in enumerate(orders):
+        if rate > 0:
+            due = start + i / rate
+            delay = due - time.perf_counter()
+            if delay > 0.001:
+                await asyncio.sleep(delay)
+        await gate.acquire()
+        if rate <= 0:
+            due = time.perf_counter()
+        due_at[f"ORD-{order_id}"] = due
+        tasks.append(asyncio.create_task(one(order_id, items, due)))
+    await asyncio.gather(*tasks)
+    return {
+        "start": start,
+        "end": time.perf_counter(),
+        "due_at": due_at,
+        "acked": acked,
+        "failures": failures,
+        "request_latencies": request_latencies,
+    }
+
+
+def wait_visible(db: TimedOrderDB, order_ids: List[str], timeout_sec: float) -> int:
+    """Waits until every order id is in the DB; returns how many never showed up."""
+    deadline = time.monotonic() + timeout_sec
+    missing = [o for o in order_ids if o not in db.visible_at]
+    while missing and time.monotonic() < deadline:
+        time.sleep(0.005)
+        missing = [o for o in missing if o not in db.visible_at]
+    return len(missing)
+
+
+def run_backlog(generator: OrderGenerator, runner: ConsumerRunner, db: TimedOrderDB, base: int, count: int, timeout_sec: float) -> Dict[str, Any]:
+    runner.stop()
+    started = time.perf_counter()
+    order_ids = []
+    for chunk in range(0, count, 1000):
+        requests = [(str(base + BACKLOG_IDS + n), 1) for n in range(chunk, min(count, chunk + 1000))]
+        order_ids += [order_id for order_id, err in generator.create_orders(requests) if err is None]
+    published = time.perf_counter()
+
+    runner.start()
+    unseen = wait_visible(db, order_ids, timeout_sec)
+    drained = max((db.visible_at[o] for o in order_ids if o in db.visible_at), default=published)
+    drain_sec = max(drained - published, 1e-9)
+    return {
+        "orders": len(order_ids),
+        "publish_sec": round(published - started, 3),
+        "drain_sec": round(drain_sec, 3),
+        "drain_orders_per_sec": round((len(order_ids) - unseen) / drain_sec),
+        "unseen": unseen,
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    sizes, weights = parse_mix(args.items)
+    base = int(time.time()) % 1000 * 1_000_000_000
+    count = args.orders or max(1, int(args.rate * args.duration))
+    orders = [(str(base + n), size) for n, size in enumerate(rng.choices(sizes, weights, k=count))]
+
+    producer, consumer_factory = make_backend(args)
+    publisher = OrderEventPublisher(producer=producer, pipelined=True, poll_interval_sec=0.005)
+    generator = OrderGenerator(publisher=publisher, store=OrderStoreMemory(), seed=args.seed)
+    db = TimedOrderDB(compact=args.compact)
+    runner = ConsumerRunner(
+        db,
+        group_id=f"bench-e2e-{base}",
+        batch_size=args.batch_size,
+        batch_timeout_sec=args.batch_timeout_ms / 1000.0,
+        commit_strategy=args.commit,
+        consumer_factory=consumer_factory,
+        decode_processes=args.decode_processes,
+    )
+    runner.start()
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    transport = httpx.ASGITransport(app=cart_app(generator))
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", limits=limits, timeout=60) as client:
+            await warm_up(client, db, base, args.warmup_timeout)
+            load = await drive(client, orders, args.rate, args.concurrency)
+
+        unseen = await asyncio.to_thread(wait_visible, db, load["acked"], args.drain_timeout)
+        visible = [o for o in load["acked"] if o in db.visible_at]
+        e2e = [db.visible_at[o] - load["due_at"][o] for o in visible]
+        last_visible = max((db.visible_at[o] for o in visible), default=load["end"])
+        load_sec = load["end"] - load["start"]
+        results: Dict[str, Any] = {
+            "orders": count,
+            "acked": len(load["acked"]),
+            "failures": load["failures"],
+            "unseen": unseen,
+            "offered_rate": args.rate,
+            "achieved_requests_per_sec": round(len(load["acked"]) / load_sec, 1),
+            "applied_orders_per_sec": round(len(visible) / max(last_visible - load["start"], 1e-9), 1),
+            "request_latency": latency_summary(load["request_latencies"]),
+            "e2e_latency": latency_summary(e2e),
+            "catch_up_sec": round(max(0.0, last_visible - load["end"]), 3),
+        }
+        if args.backlog:
+            results["backlog"] = await asyncio.to_thread(run_backlog, generator, runner, db, base, args.backlog, args.drain_timeout)
+        return results
+    finally:
+        runner.stop()
+        publisher.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("memory", "kafka"), default="memory")
+    parser.add_argument("--rate", type=float, default=1000.0, help="offered orders/sec (0 = as fast as possible)")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load at --rate")
+    parser.add_argument("--orders", type=int, default=0, help="number of orders (overrides --rate x --duration)")
+    parser.add_argument("--items", default="1:70,10:25,100:5", help="order size mix, items:weight,...")
+    parser.add_argument("--concurrency", type=int, default=1000, help="max requests in flight")
+    parser.add_argument("--backlog", type=int, default=0, help="orders to publish with the consumer stopped, then drain")
+    parser.add_argument("--partitions", type=int, default=6, help="memory backend: partitions per topic")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="memory backend: delivery latency")
+    parser.add_argument("--batch-size", type=int, default=500, help="ConsumerRunner batch size")
+    parser.add_argument("--batch-timeout-ms", type=float, default=10.0)
+    parser.add_argument("--commit", choices=("auto", "manual"), default="auto")
+    parser.add_argument("--compact", action="store_true")
+    parser.add_argument("--decode-processes", type=int, default=0, help="ConsumerRunner decode pool size (needs --compact)")
+    parser.add_argument("--warmup-timeout", type=float, default=30.0)
+    parser.add_argument("--drain-timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    emit({"benchmark": "e2e", "meta": run_metadata(), "params": vars(args), "results": results}, output=args.output)
+
+
+if __name__ == "__main__":
+    main()
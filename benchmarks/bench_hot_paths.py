@@ -0,0 +1,204 @@
+"""
+Micro-benchmarks of the per-event and per-request hot paths, with time and allocations per call:
+
+    PYTHONPATH=. python -m benchmarks.bench_hot_paths --items 1 10 100 --mixes 0:0 0.1:0.05 0.3:0.2
+    PYTHONPATH=. python -m benchmarks.bench_hot_paths --only handle order_details --output hot.json
+
+Cases (each per item count unless noted):
+- serialize_event / deserialize_event: ORDER_CREATED events with the configured EVENT_CODEC, plus
+  one ORDER_STATUS_UPDATED
+- handle: OrderEventHandler.handle over a stream of ORDER_CREATED + ORDER_STATUS_UPDATED per order
+  (1-5 items). Each --mixes entry "ooo:dup" puts that fraction of status updates before their
+  ORDER_CREATED (buffered as pending) and redelivers that fraction of events later (duplicates)
+- add_order, update_status: OrderDB with Pydantic entries and with compact records
+- create_order: OrderGenerator.create_order through OrderEventPublisher into the in-memory broker
+- order_details: the /order-details body build (model_dump + JSON), Pydantic and compact
+
+Orders come from OrderGenerator._build_order, seeded, so every run sees the same data. Timing is
+the best of --repeat runs over --ops calls with fresh state each run. Allocations are measured in
+a separate run under tracemalloc: retained bytes per call (still allocated after the run) and the
+median transient peak of a single call.
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import random
+import statistics
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+from benchmarks.common import emit, run_metadata
+from libs.kafka_common.events import OrderCreatedEvent, OrderEvent, OrderStatusUpdatedEvent
+from libs.kafka_common.memory_broker import MemoryBroker, MemoryProducer
+from libs.kafka_common.models import Order, OrderStatus
+from libs.kafka_common.serdes_json import deserialize_event, serialize_event
+from services.cart_service.order_generator import OrderGenerator
+from services.cart_service.publisher import OrderEventPublisher
+from services.cart_service.store_memory import OrderStoreMemory
+from services.order_service.app.api.routes import _render_order_details
+from services.order_service.consumer_db import OrderDB
+from services.order_service.models import OrderEntry
+from services.order_service.order_event_handler import OrderEventHandler
+
+TOPIC = "orders.events"
+CASES = ("serialize_event", "deserialize_event", "handle", "add_order", "update_status", "create_order", "order_details")
+_STATUSES = [OrderStatus.CONFIRMED, OrderStatus.PROCESSING, OrderStatus.SHIPPED]
+
+# A case's setup builds fresh state and returns (step, calls): step(i) makes call i.
+Setup = Callable[[], Tuple[Callable[[int], Any], int]]
+
+
+def measure(setup: Setup, repeat: int, alloc_samples: int) -> Dict[str, float]:
+    best = float("inf")
+    for _ in range(repeat):
+        step, calls = setup()
+        gc.collect()
+        started = time.perf_counter()
+        for i in range(calls):
+            step(i)
+        best = min(best, time.perf_counter() - started)
+
+    step, calls = setup()
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    transient: List[int] = []
+    keep = []  # results of the sampled calls stay referenced, as they would in a real caller
+    for i in range(calls):
+        if i < alloc_samples:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            keep.append(step(i))
+            transient.append(tracemalloc.get_traced_memory()[1] - before)
+        else:
+            step(i)
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return {
+        "us_per_call": round(best / calls * 1e6, 2),
+        "calls_per_sec": round(calls / best),
+        "retained_bytes_per_call": round(retained / calls),
+        "transient_peak_bytes": round(statistics.median(transient)) if transient else 0,
+    }
+
+
+def build_orders(count: int, items: Callable[[int], int], seed: int) -> List[Order]:
+    generator = OrderGenerator(publisher=None, store=None, seed=seed)
+    return [generator._build_order(f"ORD-{n}", items(n)) for n in range(count)]
+
+
+def created_events(orders: List[Order]) -> List[OrderEvent]:
+    return [OrderCreatedEvent(order_id=o.order_id, order=o) for o in orders]
+
+
+def event_stream(orders: List[Order], out_of_order: float, duplicates: float, seed: int) -> List[OrderEvent]:
+    """ORDER_CREATED + one status update per order, with reordered updates and redelivered events."""
+    rng = random.Random(seed)
+    stream: List[OrderEvent] = []
+    redeliver: List[OrderEvent] = []
+    for order in orders:
+        events: List[OrderEvent] = [
+            OrderCreatedEvent(order_id=order.order_id, order=order),
+            OrderStatusUpdatedEvent(order_id=order.order_id, status=rng.choice(_STATUSES)),
+        ]
+        if rng.random() < out_of_order:
+            events.reverse()
+        stream += events
+        redeliver += [e for e in events if rng.random() < duplicates]
+        # redeliveries show up a little later, as after a consumer restart
+        if len(redeliver) >= 50:
+            stream += redeliver
+            redeliver = []
+    return stream + redeliver
+
+
+def entries(orders: List[Order]) -> List[OrderEntry]:
+    return [OrderEntry(order=o, shipping_cost=OrderEventHandler.calculate_shipping_cost(o.total_amount)) for o in orders]
+
+
+def cases(args: argparse.Namespace) -> Dict[str, Dict[str, Setup]]:
+    out: Dict[str, Dict[str, Setup]] = {name: {} for name in CASES}
+    ops, seed = args.ops, args.seed
+    rng = random.Random(seed)
+    mixed = lambda n: rng.randint(1, 5)  # noqa: E731 - the handler cases' order sizes
+
+    status_event = OrderStatusUpdatedEvent(order_id="ORD-1", status=OrderStatus.SHIPPED)
+    out["serialize_event"]["status_update"] = lambda: (lambda i: serialize_event(status_event), ops)
+    raw_status = serialize_event(status_event)
+    out["deserialize_event"]["status_update"] = lambda: (lambda i: deserialize_event(raw_status), ops)
+
+    for items in args.items:
+        orders = build_orders(ops, lambda n: items, seed)
+        events = created_events(orders)
+        raw = [serialize_event(e) for e in events]
+        out["serialize_event"][f"items={items}"] = lambda events=events: (lambda i: serialize_event(events[i]), len(events))
+        out["deserialize_event"][f"items={items}"] = lambda raw=raw: (lambda i: deserialize_event(raw[i]), len(raw))
+
+        for compact in (False, True):
+            mode = "compact" if compact else "pydantic"
+
+            def add_setup(orders=orders, compact=compact):
+                db = OrderDB(compact=compact)
+                fresh = entries(orders)
+                return (lambda i: db.add_order(fresh[i])), len(fresh)
+
+            def update_setup(orders=orders, compact=compact):
+                db = OrderDB(compact=compact)
+                for entry in entries(orders):
+                    db.add_order(entry)
+                return (lambda i: db.update_status(orders[i].order_id, _STATUSES[i % 3])), len(orders)
+
+            def details_setup(orders=orders, compact=compact):
+                db = OrderDB(compact=compact, response_cache_max_bytes=0)
+                for entry in entries(orders):
+                    db.add_order(entry)
+                return (lambda i: _render_order_details(db, orders[i].order_id)), len(orders)
+
+            out["add_order"][f"items={items},{mode}"] = add_setup
+            out["update_status"][f"items={items},{mode}"] = update_setup
+            out["order_details"][f"items={items},{mode}"] = details_setup
+
+        def create_setup(items=items):
+            publisher = OrderEventPublisher(producer=MemoryProducer(broker=MemoryBroker()))
+            generator = OrderGenerator(publisher=publisher, store=OrderStoreMemory(), seed=seed)
+            return (lambda i: generator.create_order(str(i + 1), items)), max(10, ops // max(1, items // 10))
+
+        out["create_order"][f"items={items}"] = create_setup
+
+    handler_orders = build_orders(ops, mixed, seed)
+    for mix in args.mixes:
+        ooo, _, dup = mix.partition(":")
+        stream = event_stream(handler_orders, float(ooo), float(dup or 0), seed)
+
+        def handle_setup(stream=stream):
+            handler = OrderEventHandler(OrderDB())
+            return (lambda i: handler.handle(stream[i], TOPIC, 0, i)), len(stream)
+
+        out["handle"][f"out_of_order={ooo},duplicates={dup or 0}"] = handle_setup
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--mixes", nargs="+", default=["0:0", "0.1:0.05", "0.3:0.2"], help="handle: out_of_order:duplicates fractions")
+    parser.add_argument("--only", nargs="+", choices=CASES, help="run only these cases")
+    parser.add_argument("--ops", type=int, default=2000, help="calls per measurement")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--alloc-samples", type=int, default=200, help="calls measured one by one for transient peaks")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for name, variants in cases(args).items():
+        if args.only and name not in args.only:
+            continue
+        results[name] = {variant: measure(setup, args.repeat, args.alloc_samples) for variant, setup in variants.items()}
+    emit({"benchmark": "hot_paths", "meta": run_metadata(), "params": vars(args), "results": results}, output=args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+API read throughput and latency while the consumer ingests at full speed:
+
+    PYTHONPATH=. python -m benchmarks.bench_order_db_concurrency --readers 8 --duration 5
+
+One writer thread applies ORDER_CREATED / ORDER_STATUS_UPDATED batches through
+OrderEventHandler.handle_batch (one transaction per batch, as the consumer does). Reader threads
+serve /order-details style reads (get + model_dump) and one received-ids page out of every 50 reads.
+"locked" runs every read under read_locked(), i.e. behind the writer's batch transaction (the
+behaviour before copy-on-write records); "lock-free" reads the way the API now does.
+Each run also checks that every dumped order is internally consistent.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import threading
+import time
+from typing import Any, Dict, List
+
+from benchmarks.bench_order_db_memory import make_entry
+from benchmarks.common import emit, latency_summary
+from libs.kafka_common.events import OrderCreatedEvent, OrderStatusUpdatedEvent
+from libs.kafka_common.models import OrderStatus
+from services.order_service.consumer_db import OrderDB
+from services.order_service.order_event_handler import ConsumedEvent, OrderEventHandler
+
+TOPIC = "orders.events"
+_STATUSES = [OrderStatus.CONFIRMED, OrderStatus.PROCESSING, OrderStatus.SHIPPED]
+
+
+def read_order(db: OrderDB, order_id: str) -> Dict[str, Any]:
+    entry = db.get(order_id)
+    return {"order": entry.order.model_dump(by_alias=True), "shippingCost": entry.shipping_cost}
+
+
+def run(mode: str, args: argparse.Namespace) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    db = OrderDB(compact=args.compact)
+    handler = OrderEventHandler(db)
+    for n in range(args.preload):
+        db.add_order(make_entry(n, rng, 10_000, 1_000))
+    stop = threading.Event()
+    ingested = [0]
+    errors: List[str] = []
+
+    def writer() -> None:
+        n = args.preload
+        offset = 0
+        while not stop.is_set():
+            batch = []
+            for _ in range(args.batch_size // 2):
+                order = make_entry(n, rng, 10_000, 1_000).order
+                batch.append(ConsumedEvent(OrderCreatedEvent(order_id=order.order_id, order=order), TOPIC, 0, offset))
+                target = f"ORD-{rng.randrange(n + 1)}"
+                batch.append(ConsumedEvent(OrderStatusUpdatedEvent(order_id=target, status=rng.choice(_STATUSES)), TOPIC, 0, offset + 1))
+                n += 1
+                offset += 2
+            handler.handle_batch(batch)
+            ingested[0] += len(batch)
+
+    def reader(seed: int, latencies: List[float]) -> None:
+        r = random.Random(seed)
+        reads = 0
+        while not stop.is_set():
+            order_id = f"ORD-{r.randrange(args.preload)}"
+            started = time.perf_counter()
+            if mode == "locked":
+                details = db.read_locked(lambda d: read_order(d, order_id))
+            else:
+                details = read_order(db, order_id)
+            reads += 1
+            if reads % 50 == 0:
+                if mode == "locked":
+                    db.read_locked(lambda d: d.received_ids_page(TOPIC, 0, 100))
+                else:
+                    db.received_ids_page(TOPIC, 0, 100)
+            latencies.append(time.perf_counter() - started)
+            order = details["order"]
+            if order["orderId"] != order_id or len(order["items"]) == 0:
+                errors.append(f"inconsistent read of {order_id}")
+
+    per_reader: List[List[float]] = [[] for _ in range(args.readers)]
+    threads = [threading.Thread(target=writer)]
+    threads += [threading.Thread(target=reader, args=(args.seed + i, per_reader[i])) for i in range(args.readers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(args.duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = [x for reader_latencies in per_reader for x in reader_latencies]
+    return {
+        "read_qps": round(len(latencies) / elapsed),
+        "read_latency": latency_summary(latencies),
+        "ingest_events_per_sec": round(ingested[0] / elapsed),
+        "errors": len(errors),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--preload", type=int, default=50_000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--compact", action="store_true")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    results = {mode: run(mode, args) for mode in ("locked", "lock-free")}
+    emit({"benchmark": "order_db_concurrency", "params": vars(args), "results": results})
+
+
+if __name__ == "__main__":
+    main()
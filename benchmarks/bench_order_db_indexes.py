@@ -0,0 +1,97 @@
+"""
+Cost of maintaining the OrderDB secondary indexes per consumed event, and what they buy on queries:
+
+    PYTHONPATH=. python -m benchmarks.bench_order_db_indexes --orders 200000
+
+Replays ORDER_CREATED events, each followed by a status update of the order created
+`--update-lag` events earlier, with indexes off and on. Then times one page of typical
+ops queries (status, customer, currency in the last hour) against both DBs.
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import random
+import time
+from datetime import timedelta
+from typing import Dict, List
+
+from benchmarks.bench_order_db_memory import make_entry
+from benchmarks.common import emit
+from libs.kafka_common.models import OrderStatus
+from services.order_service.consumer_db import OrderDB
+from services.order_service.models import OrderEntry
+
+_NEXT_STATUS = [OrderStatus.CONFIRMED, OrderStatus.PROCESSING, OrderStatus.SHIPPED, OrderStatus.CANCELLED]
+
+
+def replay(db: OrderDB, entries: List[OrderEntry], update_lag: int, seed: int) -> Dict[str, float]:
+    rng = random.Random(seed)
+    add_sec = update_sec = 0.0
+    updates = 0
+    for n, entry in enumerate(entries):
+        started = time.perf_counter()
+        db.add_order(entry)
+        add_sec += time.perf_counter() - started
+        if n >= update_lag:
+            order_id = entries[n - update_lag].order.order_id
+            status = rng.choice(_NEXT_STATUS)
+            started = time.perf_counter()
+            db.update_status(order_id, status)
+            update_sec += time.perf_counter() - started
+            updates += 1
+    return {
+        "add_order_us": round(add_sec / len(entries) * 1e6, 2),
+        "update_status_us": round(update_sec / max(1, updates) * 1e6, 2),
+    }
+
+
+def time_queries(db: OrderDB, entries: List[OrderEntry], repeat: int) -> Dict[str, float]:
+    last = entries[-1].order
+    queries = {
+        "status_page": dict(status=OrderStatus.NEW),
+        "customer": dict(customer_id=last.customer_id),
+        "currency_last_hour": dict(currency=last.currency, since=last.order_date - timedelta(hours=1)),
+        "rare_status": dict(status=OrderStatus.PENDING),
+    }
+    results = {}
+    for name, query in queries.items():
+        started = time.perf_counter()
+        for _ in range(repeat):
+            db.query_orders(limit=100, **query)
+        results[f"{name}_ms"] = round((time.perf_counter() - started) / repeat * 1000, 3)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=200_000)
+    parser.add_argument("--update-lag", type=int, default=1000)
+    parser.add_argument("--customers", type=int, default=100_000)
+    parser.add_argument("--item-pool", type=int, default=1_000)
+    parser.add_argument("--compact", action="store_true")
+    parser.add_argument("--query-repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    # built once and copied per run, so both runs see identical orders and model construction is not timed
+    entries = [make_entry(n, rng, args.customers, args.item_pool) for n in range(args.orders)]
+
+    results = {}
+    for indexed in (False, True):
+        gc.collect()
+        db = OrderDB(compact=args.compact, indexed=indexed)
+        events = replay(db, [e.model_copy(deep=True) for e in entries], args.update_lag, args.seed)
+        events.update(time_queries(db, entries, args.query_repeat))
+        results["indexed" if indexed else "unindexed"] = events
+    base, indexed = results["unindexed"], results["indexed"]
+    results["index_overhead_us"] = {
+        "add_order": round(indexed["add_order_us"] - base["add_order_us"], 2),
+        "update_status": round(indexed["update_status_us"] - base["update_status_us"], 2),
+    }
+    emit({"benchmark": "order_db_indexes", "params": vars(args), "results": results})
+
+
+if __name__ == "__main__":
+    main()
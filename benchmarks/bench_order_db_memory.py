@@ -0,0 +1,112 @@
+"""
+Memory held by OrderDB per stored order, Pydantic entries vs. compact records:
+
+    PYTHONPATH=. python -m benchmarks.bench_order_db_memory --orders 1000000
+
+Orders look like the cart service's (1-5 items, ids drawn from fixed customer/item pools).
+Each mode runs in a fresh interpreter; memory is its RSS growth while the orders were inserted.
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict
+
+from benchmarks.common import emit
+from libs.kafka_common.models import Currency, Order, OrderItem, OrderStatus
+from services.order_service.consumer_db import OrderDB
+from services.order_service.models import OrderEntry
+
+
+def make_entry(n: int, rng: random.Random, customers: int, item_pool: int) -> OrderEntry:
+    # ids are built per order, as they would be when decoded from separate Kafka messages
+    items = [
+        OrderItem(item_id=f"ITEM-{rng.randrange(item_pool):03d}", quantity=rng.randint(1, 10), price=round(rng.uniform(10.0, 100.0), 2))
+        for _ in range(rng.randint(1, 5))
+    ]
+    total = round(sum(i.quantity * i.price for i in items), 2)
+    order = Order(
+        order_id=f"ORD-{n}",
+        customer_id=f"CUST-{rng.randrange(customers):05d}",
+        order_date=datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(seconds=n),
+        items=items,
+        total_amount=total,
+        currency=rng.choice(list(Currency)),
+        status=OrderStatus.NEW,
+    )
+    return OrderEntry(order=order, shipping_cost=round(total * 0.02, 2))
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:  # not Linux: peak RSS is the best available figure
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def measure(compact: bool, orders: int, seed: int, customers: int, item_pool: int) -> Dict[str, float]:
+    rng = random.Random(seed)
+    make_entry(0, rng, customers, item_pool)  # warm up imports and pydantic caches
+    gc.collect()
+    baseline = rss_bytes()
+    started = time.perf_counter()
+    db = OrderDB(compact=compact)
+    for n in range(orders):
+        db.add_order(make_entry(n, rng, customers, item_pool))
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    grown = rss_bytes() - baseline
+
+    sample = [f"ORD-{rng.randrange(orders)}" for _ in range(10_000)]
+    read_started = time.perf_counter()
+    for order_id in sample:
+        db.get(order_id)
+    get_us = (time.perf_counter() - read_started) / len(sample) * 1e6
+    return {
+        "rss_growth_mb": round(grown / 2**20, 1),
+        "bytes_per_order": round(grown / orders),
+        "insert_sec": round(elapsed, 2),
+        "get_us": round(get_us, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--customers", type=int, default=100_000)
+    parser.add_argument("--item-pool", type=int, default=1_000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--mode", choices=["pydantic", "compact"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        # child process: measure one mode
+        print(json.dumps(measure(args.mode == "compact", args.orders, args.seed, args.customers, args.item_pool)))
+        return
+
+    results = {}
+    for mode in ("pydantic", "compact"):
+        child = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_order_db_memory", "--mode", mode,
+             "--orders", str(args.orders), "--customers", str(args.customers),
+             "--item-pool", str(args.item_pool), "--seed", str(args.seed)],
+            check=True, capture_output=True, text=True,
+        )
+        results[mode] = json.loads(child.stdout)
+    results["ratio"] = round(results["pydantic"]["bytes_per_order"] / results["compact"]["bytes_per_order"], 2)
+    params = {k: v for k, v in vars(args).items() if k != "mode"}
+    emit({"benchmark": "order_db_memory", "params": params, "results": results})
+
+
+if __name__ == "__main__":
+    main()
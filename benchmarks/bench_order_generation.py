@@ -0,0 +1,41 @@
+"""
+Cost of building one order in OrderGenerator, by number of items:
+
+    PYTHONPATH=. python -m benchmarks.bench_order_generation --items 1 10 100 1000 10000
+
+Seeded, so every run generates the same orders.
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+from benchmarks.common import emit
+from services.cart_service.order_generator import OrderGenerator
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, nargs="+", default=[1, 10, 100, 1000, 10000])
+    parser.add_argument("--item-budget", type=int, default=2_000_000, help="items generated per size")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    generator = OrderGenerator(publisher=None, store=None, seed=args.seed)
+    results = {}
+    for items in args.items:
+        orders = max(5, args.item_budget // items)
+        started = time.perf_counter()
+        for n in range(orders):
+            generator._build_order(f"ORD-{n}", items)
+        elapsed = time.perf_counter() - started
+        results[str(items)] = {
+            "us_per_order": round(elapsed / orders * 1e6, 1),
+            "orders_per_sec": round(orders / elapsed),
+            "items_per_sec": round(orders * items / elapsed),
+        }
+    emit({"benchmark": "order_generation", "params": vars(args), "results": results})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Helpers shared by the benchmark scripts. Run benchmarks from the repo root: python -m benchmarks.<name>"""
+from __future__ import annotations
+
+import json
+import os
+import platform
+import subprocess
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile, q in [0, 100]."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(q / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def latency_summary(latencies_sec: Sequence[float]) -> Dict[str, float]:
+    return {
+        "p50_ms": round(percentile(latencies_sec, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies_sec, 99) * 1000, 3),
+        "p999_ms": round(percentile(latencies_sec, 99.9) * 1000, 3),
+        "max_ms": round(max(latencies_sec, default=0.0) * 1000, 3),
+    }
+
+
+def emit(results: Dict[str, Any], output: Optional[str] = None) -> None:
+    """Prints results as JSON so runs can be diffed and tracked; also writes them to `output` if given."""
+    text = json.dumps(results, indent=2, default=str)
+    print(text)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+
+
+def run_metadata() -> Dict[str, Any]:
+    """Where and on what code a benchmark ran, to tell result files of different versions apart."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+class SlowProducer:
+    """
+    confluent_kafka.Producer stand-in whose deliveries complete `latency_sec` after produce(),
+    emulating the broker round-trip with acks=all. Thread-safe; flush() waits for the whole queue.
+    """
+
+    def __init__(self, latency_sec: float = 0.02) -> None:
+        self.latency_sec = latency_sec
+        self._cond = threading.Condition()
+        self._pending: Deque[Tuple[float, Optional[Callable[[Any, Any], None]]]] = deque()
+
+    def produce(self, topic: str, key: Any = None, value: Any = None, on_delivery: Any = None, **kwargs: Any) -> None:
+        with self._cond:
+            self._pending.append((time.monotonic() + self.latency_sec, on_delivery))
+            self._cond.notify_all()
+
+    def poll(self, timeout: Optional[float] = 0) -> int:
+        deadline = time.monotonic() + (timeout or 0)
+        due: List[Callable[[Any, Any], None]] = []
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                while self._pending and self._pending[0][0] <= now:
+                    cb = self._pending.popleft()[1]
+                    if cb is not None:
+                        due.append(cb)
+                if due or now >= deadline:
+                    break
+                wake = min(deadline, self._pending[0][0]) if self._pending else deadline
+                self._cond.wait(max(0.0, wake - now))
+        for cb in due:
+            cb(None, None)
+        return len(due)
+
+    def flush(self, timeout: Optional[float] = None) -> int:
+        end = time.monotonic() + (timeout if timeout is not None else 3600.0)
+        while len(self) and time.monotonic() < end:
+            self.poll(min(0.005, max(0.0, end - time.monotonic())))
+        return len(self)
+
+    def __len__(self) -> int:
+        return len(self._pending)
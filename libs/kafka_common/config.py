@@ -2,3 +2,65 @@ import os
 
 KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "localhost:9092")
 ORDERS_TOPIC = os.getenv("ORDERS_TOPIC", "orders.events")
+# "kafka" or "memory": an in-process broker stand-in (memory_broker.py) for tests and benchmarks,
+# with N partitions per topic, an injected delivery latency and a random delivery failure rate.
+KAFKA_BACKEND = os.getenv("KAFKA_BACKEND", "kafka")
+KAFKA_MEMORY_PARTITIONS = int(os.getenv("KAFKA_MEMORY_PARTITIONS", "6"))
+KAFKA_MEMORY_LATENCY_MS = float(os.getenv("KAFKA_MEMORY_LATENCY_MS", "0"))
+KAFKA_MEMORY_FAILURE_RATE = float(os.getenv("KAFKA_MEMORY_FAILURE_RATE", "0"))
+
+# Cart service: when enabled, the publisher polls delivery reports from a background thread
+# instead of flushing the producer queue on every request.
+PUBLISHER_PIPELINED = os.getenv("PUBLISHER_PIPELINED", "false").lower() in ("1", "true", "yes")
+# Lock stripes of the cart service's in-memory order store.
+CART_STORE_SHARDS = int(os.getenv("CART_STORE_SHARDS", "64"))
+# Transactional outbox file of the cart service (empty = publish within the request). Events are
+# appended to it with the store write, fsynced unless disabled, and relayed to Kafka in batches.
+CART_OUTBOX_PATH = os.getenv("CART_OUTBOX_PATH", "")
+CART_OUTBOX_FSYNC = os.getenv("CART_OUTBOX_FSYNC", "true").lower() in ("1", "true", "yes")
+CART_OUTBOX_BATCH_SIZE = int(os.getenv("CART_OUTBOX_BATCH_SIZE", "1000"))
+# Admission control on the cart publish path: requests beyond an adaptive in-flight limit (AIMD on
+# delivery latency vs. the target) or while the producer queue holds more than N undelivered
+# messages get 429 + Retry-After instead of waiting for Kafka.
+CART_ADMISSION_CONTROL = os.getenv("CART_ADMISSION_CONTROL", "false").lower() in ("1", "true", "yes")
+CART_ADMISSION_INITIAL_LIMIT = int(os.getenv("CART_ADMISSION_INITIAL_LIMIT", "64"))
+CART_ADMISSION_TARGET_LATENCY_MS = float(os.getenv("CART_ADMISSION_TARGET_LATENCY_MS", "250"))
+CART_ADMISSION_MAX_QUEUE_DEPTH = int(os.getenv("CART_ADMISSION_MAX_QUEUE_DEPTH", "50000"))
+
+# Order service consumer: messages fetched and applied per batch (1 = poll one message at a time)
+# and how long to wait for a batch to fill.
+ORDER_CONSUMER_BATCH_SIZE = int(os.getenv("ORDER_CONSUMER_BATCH_SIZE", "1"))
+ORDER_CONSUMER_BATCH_TIMEOUT_SEC = float(os.getenv("ORDER_CONSUMER_BATCH_TIMEOUT_SEC", "1.0"))
+# Worker processes decoding each batch's payloads (0 = decode on the consumer thread); needs ORDER_DB_COMPACT.
+ORDER_CONSUMER_DECODE_PROCESSES = int(os.getenv("ORDER_CONSUMER_DECODE_PROCESSES", "0"))
+# "auto": Kafka auto-commit (offsets stored as messages are handled).
+# "manual": commit after handling, every N messages or T ms, and synchronously on stop/revoke.
+ORDER_CONSUMER_COMMIT_STRATEGY = os.getenv("ORDER_CONSUMER_COMMIT_STRATEGY", "auto")
+ORDER_CONSUMER_COMMIT_EVERY_MESSAGES = int(os.getenv("ORDER_CONSUMER_COMMIT_EVERY_MESSAGES", "1000"))
+ORDER_CONSUMER_COMMIT_INTERVAL_MS = int(os.getenv("ORDER_CONSUMER_COMMIT_INTERVAL_MS", "5000"))
+# Header-based routing: only apply these event types (comma-separated, empty = all) and drop
+# event ids already seen among the last N messages (0 = no deduplication).
+ORDER_CONSUMER_EVENT_TYPES = [t.strip() for t in os.getenv("ORDER_CONSUMER_EVENT_TYPES", "").split(",") if t.strip()]
+ORDER_CONSUMER_DEDUPE_WINDOW = int(os.getenv("ORDER_CONSUMER_DEDUPE_WINDOW", "10000"))
+# Status updates waiting for their ORDER_CREATED: max buffered orders and seconds before one is dropped.
+ORDER_PENDING_STATUS_MAX = int(os.getenv("ORDER_PENDING_STATUS_MAX", "100000"))
+ORDER_PENDING_STATUS_TTL_SEC = float(os.getenv("ORDER_PENDING_STATUS_TTL_SEC", "3600"))
+
+# Store orders as compact slot records instead of Pydantic models (much smaller RSS for large order counts).
+ORDER_DB_COMPACT = os.getenv("ORDER_DB_COMPACT", "false").lower() in ("1", "true", "yes")
+# Secondary indexes (status, customer, currency, order date buckets of N seconds) behind GET /orders.
+ORDER_DB_INDEXES = os.getenv("ORDER_DB_INDEXES", "true").lower() in ("1", "true", "yes")
+ORDER_DB_DATE_BUCKET_SEC = int(os.getenv("ORDER_DB_DATE_BUCKET_SEC", "3600"))
+# Memory for serialized /order-details responses, LRU-evicted (0 = no caching).
+ORDER_DETAILS_CACHE_MAX_BYTES = int(os.getenv("ORDER_DETAILS_CACHE_MAX_BYTES", str(64 * 2**20)))
+# Retention of the per-topic received order id log (GET /getAllOrderIdsFromTopic): max entries
+# per topic and max age in seconds (0 = no limit).
+ORDER_DB_RECEIVED_IDS_MAX_ENTRIES = int(os.getenv("ORDER_DB_RECEIVED_IDS_MAX_ENTRIES", "1000000"))
+ORDER_DB_RECEIVED_IDS_MAX_AGE_SEC = float(os.getenv("ORDER_DB_RECEIVED_IDS_MAX_AGE_SEC", "0"))
+# Snapshot file of the order service state (empty = no snapshots) and how often it is rewritten.
+# On startup the snapshot is loaded and consumption resumes at its offsets.
+ORDER_SNAPSHOT_PATH = os.getenv("ORDER_SNAPSHOT_PATH", "")
+ORDER_SNAPSHOT_INTERVAL_SEC = float(os.getenv("ORDER_SNAPSHOT_INTERVAL_SEC", "60"))
+
+# Event codec used by serialize_event/deserialize_event (see serdes_json.available_codecs()).
+EVENT_CODEC = os.getenv("EVENT_CODEC", "json")
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import time
+from typing import List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from .events import EventType, OrderEvent
+from .serdes_json import deserialize_event
+
+# Kafka message headers set by the publisher next to the encoded event, so consumers can route,
+# filter and dedupe without decoding the payload.
+HEADER_EVENT_TYPE = "event_type"
+HEADER_EVENT_ID = "event_id"
+HEADER_SCHEMA_VERSION = "schema_version"
+HEADER_PRODUCED_AT = "produced_at_ms"
+
+# Version of the event models (events.py); bump when a field changes meaning.
+EVENT_SCHEMA_VERSION = 1
+
+RawBytes = Union[bytes, bytearray, memoryview]
+KafkaHeaders = Optional[Sequence[Tuple[str, Optional[bytes]]]]
+
+_EVENT_TYPES = {t.value: t for t in EventType}
+
+
+class EventHeaders(NamedTuple):
+    event_type: EventType
+    event_id: Optional[str]
+    schema_version: Optional[int]
+    produced_at_ms: Optional[int]
+
+
+def event_headers(event: OrderEvent, produced_at_ms: Optional[int] = None) -> List[Tuple[str, bytes]]:
+    """Headers describing an event, in the form Producer.produce(headers=...) accepts."""
+    if produced_at_ms is None:
+        produced_at_ms = int(time.time() * 1000)
+    return [
+        (HEADER_EVENT_TYPE, event.event_type.value.encode("ascii")),
+        (HEADER_EVENT_ID, event.event_id.encode("utf-8")),
+        (HEADER_SCHEMA_VERSION, str(EVENT_SCHEMA_VERSION).encode("ascii")),
+        (HEADER_PRODUCED_AT, str(produced_at_ms).encode("ascii")),
+    ]
+
+
+def _int_or_none(value: Optional[bytes]) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def read_event_headers(headers: KafkaHeaders) -> Optional[EventHeaders]:
+    """
+    Parses the publisher headers of a consumed message (Message.headers()).
+    Returns None when there are none or the event type is missing/unknown (e.g. older producers).
+    """
+    if not headers:
+        return None
+    values = {}
+    for name, value in headers:
+        values.setdefault(name, value)
+
+    raw_type = values.get(HEADER_EVENT_TYPE)
+    event_type = _EVENT_TYPES.get(raw_type.decode("ascii", "replace")) if raw_type else None
+    if event_type is None:
+        return None
+    raw_id = values.get(HEADER_EVENT_ID)
+    return EventHeaders(
+        event_type=event_type,
+        event_id=raw_id.decode("utf-8", "replace") if raw_id else None,
+        schema_version=_int_or_none(values.get(HEADER_SCHEMA_VERSION)),
+        produced_at_ms=_int_or_none(values.get(HEADER_PRODUCED_AT)),
+    )
+
+
+class LazyOrderEvent:
+    """
+    An event known only by its headers and message key; the payload is decoded on first decode().
+    Exposes the BaseEvent fields needed for routing (event_type, event_id, order_id).
+    """
+
+    __slots__ = ("event_type", "event_id", "order_id", "produced_at_ms", "_raw", "_event")
+
+    def __init__(self, raw: RawBytes, headers: EventHeaders, order_id: str) -> None:
+        self.event_type = headers.event_type
+        self.event_id = headers.event_id
+        self.order_id = order_id
+        self.produced_at_ms = headers.produced_at_ms
+        self._raw = raw
+        self._event: Optional[OrderEvent] = None
+
+    @property
+    def decoded(self) -> bool:
+        return self._event is not None
+
+    @property
+    def payload(self) -> RawBytes:
+        """The undecoded message value (empty once decoded)."""
+        return self._raw
+
+    def decode(self) -> OrderEvent:
+        """Decodes the payload once. Raises ValueError if it is invalid or contradicts the headers."""
+        if self._event is None:
+            event = deserialize_event(self._raw)
+            if event.event_type != self.event_type or event.order_id != self.order_id:
+                raise ValueError(
+                    f"Payload ({event.event_type.value}, {event.order_id}) does not match "
+                    f"headers ({self.event_type.value}, {self.order_id})"
+                )
+            self._event = event
+            self._raw = b""
+        return self._event
+
+    def __repr__(self) -> str:
+        return f"LazyOrderEvent(event_type={self.event_type.value}, order_id={self.order_id!r}, decoded={self.decoded})"
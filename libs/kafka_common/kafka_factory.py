@@ -1,5 +1,8 @@
+from typing import Any, Dict, Optional
+
 from confluent_kafka import Producer, Consumer
-from .config import KAFKA_BOOTSTRAP_SERVERS
+from .config import KAFKA_BACKEND, KAFKA_BOOTSTRAP_SERVERS
+from .memory_broker import MemoryConsumer, MemoryProducer
 
 def create_producer() -> Producer:
     conf = {
@@ -10,13 +13,18 @@ def create_producer() -> Producer:
         "linger.ms": 5,
         "enable.idempotence": True,
     }
+    if KAFKA_BACKEND == "memory":
+        return MemoryProducer(conf)
     return Producer(conf)
 
-def create_consumer(group_id: str, auto_offset_reset: str = "earliest") -> Consumer:
+def create_consumer(group_id: str, auto_offset_reset: str = "earliest", extra_config: Optional[Dict[str, Any]] = None) -> Consumer:
     conf = {
         "bootstrap.servers": KAFKA_BOOTSTRAP_SERVERS,
         "group.id": group_id,
         "auto.offset.reset": auto_offset_reset,
         "enable.auto.commit": True,
     }
+    conf.update(extra_config or {})
+    if KAFKA_BACKEND == "memory":
+        return MemoryConsumer(conf)
     return Consumer(conf)
@@ -0,0 +1,529 @@
+"""
+In-process stand-in for a Kafka cluster, for tests and benchmarks (KAFKA_BACKEND=memory, see
+kafka_factory). MemoryProducer and MemoryConsumer implement the part of the confluent_kafka
+Producer/Consumer API this repo uses, on top of a MemoryBroker shared within the process:
+
+- topics are created on first use with the broker's partition count; keyed messages go to
+  crc32(key) % partitions, unkeyed ones round-robin
+- produce() queues the message; poll()/flush() append due messages to the partition logs and fire
+  the delivery callbacks, as librdkafka does. latency_ms delays delivery, failure_rate and
+  fail_deliveries() make deliveries fail with a KafkaError instead
+- consumers of a group split the partitions of their topics between them. Joining or leaving
+  triggers an eager rebalance that starts a new group generation: every member gets on_revoke
+  for its old partitions on its next poll()/consume(), and no member gets its new partitions
+  (on_assign) until all of them have revoked, so a partition is never fetched by two members at
+  once. A member that stops polling holds the rebalance up, as in Kafka until
+  max.poll.interval.ms. If on_assign doesn't call assign(), the partitions are assigned
+  automatically. Positions come from the group's committed offsets, else auto.offset.reset
+- enable.auto.offset.store / enable.auto.commit behave like librdkafka's, except that auto-commit
+  happens on every poll instead of every auto.commit.interval.ms
+- fail_fetches() makes the next poll()/consume() calls return an error message
+
+Messages are built once on delivery and handed to consumers as is, so a fetch costs a list slice.
+Everything is only visible within one process.
+"""
+from __future__ import annotations
+
+import itertools
+import random
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from confluent_kafka import (
+    OFFSET_BEGINNING,
+    OFFSET_END,
+    OFFSET_INVALID,
+    TIMESTAMP_CREATE_TIME,
+    KafkaError,
+    KafkaException,
+    TopicPartition,
+)
+
+from .config import KAFKA_MEMORY_FAILURE_RATE, KAFKA_MEMORY_LATENCY_MS, KAFKA_MEMORY_PARTITIONS
+
+_Key = Tuple[str, int]
+
+
+class MemoryMessage:
+    """Same accessors as confluent_kafka.Message."""
+
+    __slots__ = ("_topic", "_partition", "_offset", "_key", "_value", "_headers", "_timestamp", "_error")
+
+    def __init__(self, topic, partition, offset, key, value, headers, timestamp_ms, error=None) -> None:
+        self._topic = topic
+        self._partition = partition
+        self._offset = offset
+        self._key = key
+        self._value = value
+        self._headers = headers
+        self._timestamp = timestamp_ms
+        self._error = error
+
+    def topic(self) -> Optional[str]:
+        return self._topic
+
+    def partition(self) -> Optional[int]:
+        return self._partition
+
+    def offset(self) -> Optional[int]:
+        return self._offset
+
+    def key(self) -> Optional[bytes]:
+        return self._key
+
+    def value(self) -> Optional[bytes]:
+        return self._value
+
+    def headers(self) -> Optional[List[Tuple[str, bytes]]]:
+        return self._headers
+
+    def timestamp(self) -> Tuple[int, int]:
+        return TIMESTAMP_CREATE_TIME, self._timestamp
+
+    def error(self) -> Optional[KafkaError]:
+        return self._error
+
+    def __len__(self) -> int:
+        return len(self._value) if self._value is not None else 0
+
+
+class _Group:
+    __slots__ = ("members", "committed", "generation", "assignments", "unrevoked")
+
+    def __init__(self) -> None:
+        self.members: List["MemoryConsumer"] = []
+        self.committed: Dict[_Key, int] = {}
+        # the assignments of the current generation are handed out once `unrevoked` is empty
+        self.generation = 0
+        self.assignments: Dict[str, List[TopicPartition]] = {}
+        self.unrevoked: Set[str] = set()
+
+
+class MemoryBroker:
+    def __init__(self, num_partitions: int = 6, latency_ms: float = 0.0, failure_rate: float = 0.0, seed: Optional[int] = None) -> None:
+        self.num_partitions = num_partitions
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self._cond = threading.Condition()
+        self._logs: Dict[str, List[List[MemoryMessage]]] = {}
+        self._groups: Dict[str, _Group] = {}
+        self._rng = random.Random(seed)
+        self._round_robin = itertools.count()
+        self._delivery_faults: Deque[int] = deque()
+        self._fetch_faults: Deque[int] = deque()
+
+    # -- topics ---------------------------------------------------------------------------
+
+    def create_topic(self, topic: str, num_partitions: Optional[int] = None) -> None:
+        with self._cond:
+            self._topic_logs(topic, num_partitions)
+
+    def _topic_logs(self, topic: str, num_partitions: Optional[int] = None) -> List[List[MemoryMessage]]:
+        logs = self._logs.get(topic)
+        if logs is None:
+            logs = self._logs[topic] = [[] for _ in range(num_partitions or self.num_partitions)]
+            for group in self._groups.values():
+                if any(topic in m._topics for m in group.members):
+                    self._rebalance(group)
+        return logs
+
+    def partitions(self, topic: str) -> int:
+        with self._cond:
+            return len(self._topic_logs(topic))
+
+    def partition_for(self, topic: str, key: Optional[bytes]) -> int:
+        count = len(self._logs.get(topic) or ()) or self.partitions(topic)
+        if key is None:
+            return next(self._round_robin) % count
+        return zlib.crc32(key) % count
+
+    def high_watermark(self, topic: str, partition: int) -> int:
+        with self._cond:
+            return len(self._topic_logs(topic)[partition])
+
+    def messages(self, topic: str, partition: int) -> List[MemoryMessage]:
+        with self._cond:
+            return list(self._topic_logs(topic)[partition])
+
+    def lag(self, group_id: str, topic: str) -> int:
+        """Messages of the topic not yet committed by the group."""
+        with self._cond:
+            group = self._groups.get(group_id)
+            committed = group.committed if group else {}
+            return sum(len(log) - committed.get((topic, p), 0) for p, log in enumerate(self._topic_logs(topic)))
+
+    # -- fault injection ------------------------------------------------------------------
+
+    def fail_deliveries(self, count: int = 1, code: int = KafkaError._MSG_TIMED_OUT) -> None:
+        """The next `count` produced messages fail delivery with `code` and are not appended."""
+        with self._cond:
+            self._delivery_faults.extend([code] * count)
+
+    def fail_fetches(self, count: int = 1, code: int = KafkaError._TRANSPORT) -> None:
+        """The next `count` poll()/consume() calls return an error message with `code`."""
+        with self._cond:
+            self._fetch_faults.extend([code] * count)
+
+    def _take_fetch_fault(self) -> Optional[int]:
+        if not self._fetch_faults:
+            return None
+        with self._cond:
+            return self._fetch_faults.popleft() if self._fetch_faults else None
+
+    # -- produce side ---------------------------------------------------------------------
+
+    def _append(self, records: List[tuple]) -> List[Tuple[Optional[KafkaError], MemoryMessage]]:
+        """Appends (topic, partition, key, value, headers, timestamp_ms) records, or fails them."""
+        results = []
+        with self._cond:
+            for topic, partition, key, value, headers, timestamp_ms in records:
+                code = None
+                if self._delivery_faults:
+                    code = self._delivery_faults.popleft()
+                elif self.failure_rate and self._rng.random() < self.failure_rate:
+                    code = KafkaError._MSG_TIMED_OUT
+                if code is not None:
+                    msg = MemoryMessage(topic, partition, OFFSET_INVALID, key, value, headers, timestamp_ms)
+                    results.append((KafkaError(code), msg))
+                    continue
+                log = self._topic_logs(topic)[partition]
+                msg = MemoryMessage(topic, partition, len(log), key, value, headers, timestamp_ms)
+                log.append(msg)
+                results.append((None, msg))
+            self._cond.notify_all()
+        return results
+
+    # -- consumer groups ------------------------------------------------------------------
+
+    def _join(self, consumer: "MemoryConsumer") -> None:
+        with self._cond:
+            for topic in consumer._topics:
+                self._topic_logs(topic)
+            group = consumer._group = self._groups.setdefault(consumer.group_id, _Group())
+            if consumer not in group.members:
+                group.members.append(consumer)
+            self._rebalance(group)
+
+    def _leave(self, consumer: "MemoryConsumer") -> None:
+        with self._cond:
+            group = self._groups.get(consumer.group_id)
+            if group is not None and consumer in group.members:
+                group.members.remove(consumer)
+                self._rebalance(group)
+
+    def _rebalance(self, group: _Group) -> None:
+        """Spreads each topic's partitions round-robin over the members subscribed to it."""
+        assignments: Dict[str, List[TopicPartition]] = {m.member_id: [] for m in group.members}
+        topics = sorted({t for m in group.members for t in m._topics})
+        for topic in topics:
+            members = sorted((m for m in group.members if topic in m._topics), key=lambda m: m.member_id)
+            for p in range(len(self._topic_logs(topic))):
+                assignments[members[p % len(members)].member_id].append(TopicPartition(topic, p))
+        group.generation += 1
+        group.assignments = assignments
+        group.unrevoked = set(assignments)
+        self._cond.notify_all()
+
+    def _revoked(self, consumer: "MemoryConsumer", generation: int) -> None:
+        """The member has given up its partitions for `generation`."""
+        with self._cond:
+            group = consumer._group
+            if group is not None and group.generation == generation:
+                group.unrevoked.discard(consumer.member_id)
+                if not group.unrevoked:
+                    self._cond.notify_all()
+
+    def _assignment(self, consumer: "MemoryConsumer", generation: int) -> Optional[List[TopicPartition]]:
+        """The member's partitions for `generation`, or None while other members still hold theirs."""
+        with self._cond:
+            group = consumer._group
+            if group is None or group.generation != generation or group.unrevoked:
+                return None
+            return group.assignments.get(consumer.member_id, [])
+
+    def _committed(self, group_id: str, topic: str, partition: int) -> Optional[int]:
+        group = self._groups.get(group_id)
+        return group.committed.get((topic, partition)) if group else None
+
+    def _commit(self, group_id: str, offsets: Dict[_Key, int]) -> None:
+        with self._cond:
+            self._groups.setdefault(group_id, _Group()).committed.update(offsets)
+
+    def _fetch(self, positions: Dict[_Key, int], max_messages: int, start: int) -> List[MemoryMessage]:
+        out: List[MemoryMessage] = []
+        keys = list(positions)
+        with self._cond:
+            for i in range(len(keys)):
+                topic, partition = key = keys[(start + i) % len(keys)]
+                log = self._logs[topic][partition]
+                pos = positions[key]
+                if pos < len(log):
+                    batch = log[pos:pos + max_messages - len(out)]
+                    positions[key] = pos + len(batch)
+                    out += batch
+                    if len(out) >= max_messages:
+                        break
+        return out
+
+    def _wait(self, timeout: float) -> None:
+        with self._cond:
+            self._cond.wait(timeout)
+
+
+_default_broker: Optional[MemoryBroker] = None
+_default_lock = threading.Lock()
+
+
+def default_broker() -> MemoryBroker:
+    """The process-wide broker used by kafka_factory, configured from KAFKA_MEMORY_*."""
+    global _default_broker
+    with _default_lock:
+        if _default_broker is None:
+            _default_broker = MemoryBroker(KAFKA_MEMORY_PARTITIONS, KAFKA_MEMORY_LATENCY_MS, KAFKA_MEMORY_FAILURE_RATE)
+        return _default_broker
+
+
+def _as_bytes(value: Any) -> Optional[bytes]:
+    return value.encode("utf-8") if isinstance(value, str) else value
+
+
+def _flag(config: Dict[str, Any], name: str, default: bool) -> bool:
+    value = config.get(name, default)
+    return value.lower() in ("1", "true", "yes") if isinstance(value, str) else bool(value)
+
+
+class MemoryProducer:
+    def __init__(self, config: Optional[Dict[str, Any]] = None, broker: Optional[MemoryBroker] = None) -> None:
+        config = config or {}
+        self.broker = broker if broker is not None else default_broker()
+        self.max_messages = int(config.get("queue.buffering.max.messages", 100_000))
+        self._cond = threading.Condition()
+        # (due, topic, partition, key, value, headers, timestamp_ms, on_delivery), in due order
+        self._queue: Deque[tuple] = deque()
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def produce(self, topic: str, value: Any = None, key: Any = None, partition: int = -1, on_delivery: Optional[Callable] = None,
+                callback: Optional[Callable] = None, timestamp: int = 0, headers: Any = None) -> None:
+        if len(self._queue) >= self.max_messages:
+            raise BufferError("Local: Queue full")
+        key = _as_bytes(key)
+        if isinstance(headers, dict):
+            headers = list(headers.items())
+        if partition < 0:
+            partition = self.broker.partition_for(topic, key)
+        now = time.time()
+        due = time.monotonic() + self.broker.latency_ms / 1000.0
+        record = (due, topic, partition, key, _as_bytes(value), headers or None, timestamp or int(now * 1000), on_delivery or callback)
+        with self._cond:
+            self._queue.append(record)
+            self._cond.notify()
+
+    def poll(self, timeout: Optional[float] = None) -> int:
+        """Delivers every message that is due, waiting up to timeout for the first one; returns callbacks served."""
+        deadline = time.monotonic() + (timeout or 0.0)
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                due = 0
+                for record in self._queue:
+                    if record[0] > now:
+                        break
+                    due += 1
+                if due or now >= deadline:
+                    break
+                wake = deadline if not self._queue else min(deadline, self._queue[0][0])
+                self._cond.wait(max(0.0, wake - now))
+            records = [self._queue.popleft() for _ in range(due)]
+            # appended while holding the producer lock, so concurrent pollers keep produce order
+            results = self.broker._append([r[1:7] for r in records]) if records else []
+        for record, (err, msg) in zip(records, results):
+            if record[7] is not None:
+                record[7](err, msg)
+        return len(records)
+
+    def flush(self, timeout: Optional[float] = None) -> int:
+        deadline = None if timeout is None or timeout < 0 else time.monotonic() + timeout
+        while self._queue:
+            remaining = 0.1 if deadline is None else deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self.poll(remaining)
+        return len(self._queue)
+
+
+class MemoryConsumer:
+    _member_ids = itertools.count()
+
+    def __init__(self, config: Dict[str, Any], broker: Optional[MemoryBroker] = None) -> None:
+        if "group.id" not in config:
+            raise KafkaException(KafkaError(KafkaError._INVALID_ARG, "group.id must be set"))
+        self.broker = broker if broker is not None else default_broker()
+        self.group_id = config["group.id"]
+        self.member_id = f"{self.group_id}-{next(self._member_ids):06d}"
+        self.auto_offset_reset = config.get("auto.offset.reset", "latest")
+        self.auto_commit = _flag(config, "enable.auto.commit", True)
+        self.auto_store = _flag(config, "enable.auto.offset.store", True)
+        self._topics: List[str] = []
+        self._on_assign: Optional[Callable] = None
+        self._on_revoke: Optional[Callable] = None
+        self._positions: Dict[_Key, int] = {}
+        self._stored: Dict[_Key, int] = {}
+        self._group: Optional[_Group] = None
+        self._generation = 0
+        self._revoked_generation = 0
+        self._assigned_in_callback = False
+        self._fetch_start = 0
+        self._closed = False
+
+    def subscribe(self, topics: List[str], on_assign: Optional[Callable] = None, on_revoke: Optional[Callable] = None, on_lost: Optional[Callable] = None) -> None:
+        self._topics = list(topics)
+        self._on_assign = on_assign
+        self._on_revoke = on_revoke
+        self.broker._join(self)
+
+    def unsubscribe(self) -> None:
+        # revoke before leaving: the rest of the group may take the partitions as soon as it's gone
+        self._revoke()
+        self._topics = []
+        self.broker._leave(self)
+
+    def _resolve(self, tp: TopicPartition) -> int:
+        if tp.offset >= 0:
+            return tp.offset
+        end = self.broker.high_watermark(tp.topic, tp.partition)
+        if tp.offset == OFFSET_BEGINNING:
+            return 0
+        if tp.offset == OFFSET_END:
+            return end
+        committed = self.broker._committed(self.group_id, tp.topic, tp.partition)
+        if committed is not None:
+            return committed
+        return 0 if self.auto_offset_reset in ("earliest", "smallest", "beginning") else end
+
+    def assign(self, partitions: List[TopicPartition]) -> None:
+        self._assigned_in_callback = True
+        self._positions = {(tp.topic, tp.partition): self._resolve(tp) for tp in partitions}
+
+    def unassign(self) -> None:
+        self._positions = {}
+
+    def assignment(self) -> List[TopicPartition]:
+        return [TopicPartition(t, p) for t, p in self._positions]
+
+    def position(self, partitions: List[TopicPartition]) -> List[TopicPartition]:
+        return [TopicPartition(tp.topic, tp.partition, self._positions.get((tp.topic, tp.partition), OFFSET_INVALID)) for tp in partitions]
+
+    def get_watermark_offsets(self, partition: TopicPartition, timeout: Optional[float] = None, cached: bool = False) -> Tuple[int, int]:
+        return 0, self.broker.high_watermark(partition.topic, partition.partition)
+
+    def committed(self, partitions: List[TopicPartition], timeout: Optional[float] = None) -> List[TopicPartition]:
+        out = []
+        for tp in partitions:
+            offset = self.broker._committed(self.group_id, tp.topic, tp.partition)
+            out.append(TopicPartition(tp.topic, tp.partition, OFFSET_INVALID if offset is None else offset))
+        return out
+
+    def _revoke(self) -> None:
+        if self._positions and self._on_revoke:
+            self._on_revoke(self, self.assignment())
+        if self.auto_commit:
+            self._commit_stored()
+        self._positions = {}
+        self._stored = {}
+
+    def _rebalance_pending(self) -> bool:
+        group = self._group
+        return group is not None and group.generation != self._generation
+
+    def _maybe_rebalance(self) -> None:
+        """Revokes for a new generation, then takes the new assignment once the whole group has revoked."""
+        if not self._rebalance_pending():
+            return
+        generation = self._group.generation  # type: ignore[union-attr]
+        if self._revoked_generation != generation:
+            self._revoke()
+            self._revoked_generation = generation
+            self.broker._revoked(self, generation)
+        partitions = self.broker._assignment(self, generation)
+        if partitions is None:
+            return
+        self._generation = generation
+        self._assigned_in_callback = False
+        if self._on_assign:
+            self._on_assign(self, partitions)
+        if not self._assigned_in_callback:
+            self.assign(partitions)
+
+    def consume(self, num_messages: int = 1, timeout: float = -1) -> List[MemoryMessage]:
+        if self._closed:
+            raise RuntimeError("Consumer closed")
+        self._maybe_rebalance()
+        code = self.broker._take_fetch_fault()
+        if code is not None:
+            return [MemoryMessage(None, None, None, None, None, None, 0, KafkaError(code))]
+        deadline = None if timeout is None or timeout < 0 else time.monotonic() + timeout
+        out: List[MemoryMessage] = []
+        while True:
+            if self._positions:
+                out += self.broker._fetch(self._positions, num_messages - len(out), self._fetch_start)
+                self._fetch_start += 1
+            if len(out) >= num_messages:
+                break
+            if self._rebalance_pending():
+                # hand back what was fetched before revoking; with nothing fetched, wait out the rebalance here
+                if out:
+                    break
+                self._maybe_rebalance()
+                if self._positions:
+                    continue
+            remaining = 0.1 if deadline is None else deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self.broker._wait(remaining)
+        if out and self.auto_store:
+            for msg in out:
+                self._stored[(msg._topic, msg._partition)] = msg._offset + 1
+        if self.auto_commit:
+            self._commit_stored()
+        return out
+
+    def poll(self, timeout: Optional[float] = None) -> Optional[MemoryMessage]:
+        messages = self.consume(1, -1 if timeout is None else timeout)
+        return messages[0] if messages else None
+
+    def store_offsets(self, message: Optional[MemoryMessage] = None, offsets: Optional[List[TopicPartition]] = None) -> None:
+        if message is not None:
+            self._stored[(message.topic(), message.partition())] = message.offset() + 1
+        for tp in offsets or []:
+            self._stored[(tp.topic, tp.partition)] = tp.offset
+
+    def _commit_stored(self) -> None:
+        if self._stored:
+            self.broker._commit(self.group_id, self._stored)
+
+    def commit(self, message: Optional[MemoryMessage] = None, offsets: Optional[List[TopicPartition]] = None, asynchronous: bool = True) -> Optional[List[TopicPartition]]:
+        if message is not None:
+            commits = {(message.topic(), message.partition()): message.offset() + 1}
+        elif offsets is not None:
+            commits = {(tp.topic, tp.partition): tp.offset for tp in offsets}
+        else:
+            commits = dict(self._stored)
+        if not commits:
+            raise KafkaException(KafkaError(KafkaError._NO_OFFSET, "No offset stored"))
+        self.broker._commit(self.group_id, commits)
+        if asynchronous:
+            return None
+        return [TopicPartition(t, p, o) for (t, p), o in commits.items()]
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        if self.auto_commit:
+            self._commit_stored()
+        self._closed = True
+        self.broker._leave(self)
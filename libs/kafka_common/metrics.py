@@ -0,0 +1,266 @@
+"""
+Low-overhead metrics with Prometheus text output (GET /metrics in both services).
+
+Counters and histograms are sharded per thread: every thread that records gets its own cell (a
+plain list) on first use, and afterwards only ever writes to that cell, so recording takes no lock
+and two threads never race on the same value. A scrape sums the cells; it may miss a value that is
+being added concurrently, never corrupt one. Cells of finished threads are kept, so their counts
+stay in the totals.
+
+Gauges, and counters owned by another component (e.g. ConsumerRunner.duplicates), are callbacks
+evaluated at scrape time and cost nothing in between. Rates such as events/sec are left to the
+scraper (rate() over the _total counters).
+"""
+from __future__ import annotations
+
+import abc
+import bisect
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+# what a callback returns: a number, or one number per label values tuple
+Sample = Union[float, Dict[LabelValues, float]]
+
+
+def log_buckets(low: float, high: float) -> Tuple[float, ...]:
+    """1 / 2.5 / 5 steps per decade from low up to high, e.g. log_buckets(1e-3, 1) = (0.001, 0.0025, ..., 1.0)."""
+    out: List[float] = []
+    for exponent in range(math.floor(math.log10(low)), math.floor(math.log10(high)) + 1):
+        for step in (1.0, 2.5, 5.0):
+            bound = float(f"{step}e{exponent}")
+            if low <= bound <= high:
+                out.append(bound)
+    return tuple(out)
+
+
+# per-event work (decoding, applying) and per-message publishing
+EVENT_BUCKETS_SEC = log_buckets(1e-6, 1.0)
+PUBLISH_BUCKETS_SEC = log_buckets(1e-4, 30.0)
+
+
+class _Cells:
+    """Per-thread cells of `size` numbers; each thread writes only its own."""
+
+    def __init__(self, size: int) -> None:
+        self._size = size
+        self._local = threading.local()
+        self._cells: List[List[float]] = []
+        self._lock = threading.Lock()
+
+    def cell(self) -> List[float]:
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell: List[float] = [0] * self._size
+            with self._lock:
+                self._cells.append(cell)
+            self._local.cell = cell
+            return cell
+
+    def totals(self) -> List[float]:
+        with self._lock:
+            cells = list(self._cells)
+        return [sum(c[i] for c in cells) for i in range(self._size)]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric(abc.ABC):
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    @abc.abstractmethod
+    def _render(self, lines: List[str]) -> None:
+        """Append the sample lines (everything after # HELP / # TYPE)."""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        self._render(lines)
+        return "\n".join(lines) + "\n"
+
+
+class _Labelled(_Metric):
+    """Children per label values, created on first use; hot paths keep the child they need."""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._children: Dict[LabelValues, "_Labelled"] = {}
+        self._children_lock = threading.Lock()
+
+    @abc.abstractmethod
+    def _child(self) -> "_Labelled":
+        """A new unlabelled metric of the same kind, for one set of label values."""
+
+    def labels(self, *values: str) -> "_Labelled":
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is not None:
+            return child
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {key}")
+        with self._children_lock:
+            return self._children.setdefault(key, self._child())
+
+    def _series(self) -> List[Tuple[LabelValues, "_Labelled"]]:
+        if not self.labelnames:
+            return [((), self)]
+        with self._children_lock:
+            return sorted(self._children.items())
+
+
+class Counter(_Labelled):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._cells = _Cells(1)
+
+    def _child(self) -> "Counter":
+        return Counter(self.name, self.help)
+
+    def inc(self, amount: float = 1) -> None:
+        self._cells.cell()[0] += amount
+
+    @property
+    def value(self) -> float:
+        return self._cells.totals()[0]
+
+    def _render(self, lines: List[str]) -> None:
+        for values, child in self._series():
+            lines.append(f"{self.name}{_labels(self.labelnames, values)} {_number(child.value)}")
+
+
+class Histogram(_Labelled):
+    """Cumulative buckets (upper bounds, in the unit observed), plus _sum and _count."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = EVENT_BUCKETS_SEC) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # one count per bucket, one for +Inf, then the sum
+        self._cells = _Cells(len(self.buckets) + 2)
+
+    def _child(self) -> "Histogram":
+        return Histogram(self.name, self.help, buckets=self.buckets)
+
+    def observe(self, value: float) -> None:
+        cell = self._cells.cell()
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    def snapshot(self) -> Tuple[List[float], float, float]:
+        """(cumulative bucket counts including +Inf, sum, count)."""
+        totals = self._cells.totals()
+        cumulative: List[float] = []
+        running = 0.0
+        for n in totals[:-1]:
+            running += n
+            cumulative.append(running)
+        return cumulative, totals[-1], running
+
+    @property
+    def count(self) -> float:
+        return self.snapshot()[2]
+
+    def _render(self, lines: List[str]) -> None:
+        bounds = [_number(b) for b in self.buckets] + ["+Inf"]
+        for values, child in self._series():
+            cumulative, total, count = child.snapshot()
+            for bound, n in zip(bounds, cumulative):
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, le)} {_number(n)}")
+            labels = _labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_number(total)}")
+            lines.append(f"{self.name}_count{labels} {_number(count)}")
+
+
+class Callback(_Metric):
+    """A gauge (or a counter kept elsewhere) read by calling fn at scrape time."""
+
+    def __init__(self, name: str, help: str, fn: Callable[[], Sample], labelnames: Sequence[str] = (), type: str = "gauge") -> None:
+        super().__init__(name, help, labelnames)
+        self.type = type
+        self.fn = fn
+
+    def samples(self) -> Dict[LabelValues, float]:
+        value = self.fn()
+        return dict(value) if isinstance(value, dict) else {(): value}
+
+    def _render(self, lines: List[str]) -> None:
+        for values, value in sorted(self.samples().items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, values)} {_number(value)}")
+
+
+class Registry:
+    """
+    The metrics of one service. Asking for a name that exists returns the existing metric (so a
+    component rebuilt on reconnect keeps its series); asking for it as a different type raises.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_add(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.setdefault(metric.name, metric)
+        if type(existing) is not type(metric) or existing.type != metric.type or existing.labelnames != metric.labelnames:
+            raise ValueError(f"metric {metric.name} is already registered as a {existing.type} with labels {existing.labelnames}")
+        return existing
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_add(Counter(name, help, labelnames))  # type: ignore[return-value]
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = EVENT_BUCKETS_SEC) -> Histogram:
+        return self._get_or_add(Histogram(name, help, labelnames, buckets))  # type: ignore[return-value]
+
+    def gauge(self, name: str, help: str, fn: Callable[[], Sample], labelnames: Sequence[str] = ()) -> Callback:
+        return self._get_or_add(Callback(name, help, fn, labelnames))  # type: ignore[return-value]
+
+    def counter_fn(self, name: str, help: str, fn: Callable[[], Sample], labelnames: Sequence[str] = ()) -> Callback:
+        """A counter whose value is kept by its owner, e.g. an int attribute of the consumer thread."""
+        return self._get_or_add(Callback(name, help, fn, labelnames, type="counter"))  # type: ignore[return-value]
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def names(self) -> Iterable[str]:
+        return sorted(self._metrics)
+
+    def render(self) -> str:
+        """Prometheus text exposition format (CONTENT_TYPE). A failing callback is reported and skipped."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        out: List[str] = []
+        for metric in metrics:
+            try:
+                out.append(metric.render())
+            except Exception as e:
+                print(f"Failed to collect metric {metric.name}: {e}")
+        return "".join(out)
@@ -0,0 +1,268 @@
+"""
+Compact binary wire format for order events.
+
+Layout (little-endian), version 1:
+
+    u8  format version (BINARY_FORMAT_VERSION; JSON payloads start with '{' so the two never collide)
+    u8  event type code
+    id  event_id          (u8 kind: 0 = u16-length UTF-8 string, 1 = 16-byte UUID)
+    ts  timestamp         (i64 epoch microseconds + i32 UTC offset seconds, NAIVE_OFFSET if naive)
+    str order_id          (u16 length + UTF-8)
+
+    ORDER_CREATED:
+        str order.order_id, str customer_id, ts order_date, f64 total_amount,
+        u8 currency code, u8 status code, u32 item count n,
+        n x u16 item_id byte length, item_id bytes (concatenated UTF-8),
+        n x i32 quantity, n x f64 price                    (items packed column by column)
+
+    ORDER_STATUS_UPDATED:
+        u8 status code
+
+Enum codes are indexes into the code tables below. They are part of the wire format:
+only ever append to them.
+"""
+from __future__ import annotations
+
+import struct
+from datetime import datetime, timedelta, timezone
+from typing import List, Tuple, Union
+from uuid import UUID
+
+from pydantic import ValidationError
+
+from .events import EventType, OrderCreatedEvent, OrderStatusUpdatedEvent, OrderEvent
+from .models import Currency, OrderStatus
+
+BINARY_FORMAT_VERSION = 1
+
+EVENT_TYPE_CODES: Tuple[EventType, ...] = (EventType.ORDER_CREATED, EventType.ORDER_STATUS_UPDATED)
+CURRENCY_CODES: Tuple[Currency, ...] = (
+    Currency.USD, Currency.EUR, Currency.GBP, Currency.JPY, Currency.KRW, Currency.CNY,
+    Currency.INR, Currency.BRL, Currency.MXN, Currency.ARS, Currency.COP,
+)
+STATUS_CODES: Tuple[OrderStatus, ...] = (
+    OrderStatus.NEW, OrderStatus.PENDING, OrderStatus.CONFIRMED,
+    OrderStatus.PROCESSING, OrderStatus.SHIPPED, OrderStatus.CANCELLED,
+)
+
+NAIVE_OFFSET = -(2 ** 31)
+
+_EVENT_TYPE_INDEX = {v: i for i, v in enumerate(EVENT_TYPE_CODES)}
+_CURRENCY_INDEX = {v: i for i, v in enumerate(CURRENCY_CODES)}
+_STATUS_INDEX = {v: i for i, v in enumerate(STATUS_CODES)}
+
+_EPOCH_NAIVE = datetime(1970, 1, 1)
+_EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+_HEADER = struct.Struct("<BB")
+_U8 = struct.Struct("<B")
+_U16 = struct.Struct("<H")
+_TS = struct.Struct("<qi")
+_CREATED_FIXED = struct.Struct("<dBBI")
+
+_ID_STR = 0
+_ID_UUID = 1
+
+RawBytes = Union[bytes, bytearray, memoryview]
+
+
+def _put_str(out: List[bytes], value: str) -> None:
+    data = value.encode("utf-8")
+    if len(data) > 0xFFFF:
+        raise ValueError("string field longer than 65535 bytes")
+    out.append(_U16.pack(len(data)))
+    out.append(data)
+
+
+def _put_ts(out: List[bytes], value: datetime) -> None:
+    offset = value.utcoffset()
+    if offset is None:
+        micros = (value - _EPOCH_NAIVE) // timedelta(microseconds=1)
+        out.append(_TS.pack(micros, NAIVE_OFFSET))
+    else:
+        micros = (value - _EPOCH_UTC) // timedelta(microseconds=1)
+        out.append(_TS.pack(micros, int(offset.total_seconds())))
+
+
+def _put_event_id(out: List[bytes], value: str) -> None:
+    try:
+        uuid = UUID(value)
+    except ValueError:
+        uuid = None
+    if uuid is not None and str(uuid) == value:
+        out.append(_U8.pack(_ID_UUID))
+        out.append(uuid.bytes)
+    else:
+        out.append(_U8.pack(_ID_STR))
+        _put_str(out, value)
+
+
+class _Reader:
+    __slots__ = ("buf", "pos")
+
+    def __init__(self, buf: memoryview) -> None:
+        self.buf = buf
+        self.pos = 0
+
+    def unpack(self, st: struct.Struct) -> tuple:
+        values = st.unpack_from(self.buf, self.pos)
+        self.pos += st.size
+        return values
+
+    def str(self) -> str:
+        (n,) = self.unpack(_U16)
+        end = self.pos + n
+        if end > len(self.buf):
+            raise ValueError("truncated string field")
+        value = str(self.buf[self.pos:end], "utf-8")
+        self.pos = end
+        return value
+
+    def str_column(self, n: int) -> List[str]:
+        """n strings stored as n x u16 byte lengths followed by their concatenated UTF-8 bytes."""
+        lengths = self.array("H", n)
+        end = self.pos + sum(lengths)
+        if end > len(self.buf):
+            raise ValueError("truncated string column")
+        blob = self.buf[self.pos:end]
+        self.pos = end
+        text = str(blob, "utf-8")
+        values: List[str] = []
+        start = 0
+        if len(text) == len(blob):
+            # ASCII: byte offsets are character offsets, slice the decoded text
+            for length in lengths:
+                values.append(text[start:start + length])
+                start += length
+        else:
+            for length in lengths:
+                values.append(str(blob[start:start + length], "utf-8"))
+                start += length
+        return values
+
+    def ts(self) -> datetime:
+        micros, offset = self.unpack(_TS)
+        if offset == NAIVE_OFFSET:
+            return _EPOCH_NAIVE + timedelta(microseconds=micros)
+        value = _EPOCH_UTC + timedelta(microseconds=micros)
+        return value if offset == 0 else value.astimezone(timezone(timedelta(seconds=offset)))
+
+    def event_id(self) -> str:
+        (kind,) = self.unpack(_U8)
+        if kind == _ID_UUID:
+            value = str(UUID(bytes=bytes(self.buf[self.pos:self.pos + 16])))
+            self.pos += 16
+            return value
+        return self.str()
+
+    def array(self, fmt: str, n: int) -> tuple:
+        st = struct.Struct(f"<{n}{fmt}")
+        return self.unpack(st)
+
+
+def _code(table: dict, value, what: str) -> int:
+    try:
+        return table[value]
+    except KeyError:
+        raise ValueError(f"{what} {value!r} has no binary code") from None
+
+
+def _lookup(table: tuple, code: int, what: str):
+    if code >= len(table):
+        raise ValueError(f"Unknown {what} code: {code}")
+    return table[code]
+
+
+class BinaryCodec:
+    """Versioned compact binary codec; see the module docstring for the layout."""
+
+    name = "binary"
+    magic = BINARY_FORMAT_VERSION
+
+    def encode(self, event: OrderEvent) -> bytes:
+        out: List[bytes] = [_HEADER.pack(BINARY_FORMAT_VERSION, _code(_EVENT_TYPE_INDEX, event.event_type, "event_type"))]
+        _put_event_id(out, event.event_id)
+        _put_ts(out, event.timestamp)
+        _put_str(out, event.order_id)
+
+        if isinstance(event, OrderCreatedEvent):
+            order = event.order
+            items = order.items
+            n = len(items)
+            _put_str(out, order.order_id)
+            _put_str(out, order.customer_id)
+            _put_ts(out, order.order_date)
+            out.append(_CREATED_FIXED.pack(
+                order.total_amount,
+                _code(_CURRENCY_INDEX, order.currency, "currency"),
+                _code(_STATUS_INDEX, order.status, "status"),
+                n,
+            ))
+            encoded_ids = [item.item_id.encode("utf-8") for item in items]
+            try:
+                out.append(struct.pack(f"<{n}H", *[len(b) for b in encoded_ids]))
+            except struct.error as e:
+                raise ValueError(f"item_id does not fit the binary format: {e}") from e
+            out.extend(encoded_ids)
+            try:
+                out.append(struct.pack(f"<{n}i", *[item.quantity for item in items]))
+            except struct.error as e:
+                raise ValueError(f"item quantity does not fit the binary format: {e}") from e
+            out.append(struct.pack(f"<{n}d", *[item.price for item in items]))
+        else:
+            out.append(_U8.pack(_code(_STATUS_INDEX, event.status, "status")))
+        return b"".join(out)
+
+    def decode(self, raw: RawBytes) -> OrderEvent:
+        try:
+            return self._decode(_Reader(memoryview(raw)))
+        except (struct.error, UnicodeDecodeError, IndexError) as e:
+            raise ValueError(f"Invalid binary event payload: {e}") from e
+
+    @staticmethod
+    def _decode(r: _Reader) -> OrderEvent:
+        version, type_code = r.unpack(_HEADER)
+        if version != BINARY_FORMAT_VERSION:
+            raise ValueError(f"Unsupported binary event format version: {version}")
+        event_type = _lookup(EVENT_TYPE_CODES, type_code, "event_type")
+        event_id = r.event_id()
+        timestamp = r.ts()
+        order_id = r.str()
+
+        # One validation call per event: pydantic-core builds the nested models faster than
+        # model_construct() can in Python
+        if event_type == EventType.ORDER_CREATED:
+            inner_order_id = r.str()
+            customer_id = r.str()
+            order_date = r.ts()
+            total_amount, currency_code, status_code, n = r.unpack(_CREATED_FIXED)
+            item_ids = r.str_column(n)
+            quantities = r.array("i", n)
+            prices = r.array("d", n)
+            data = {
+                "event_id": event_id, "event_type": event_type, "timestamp": timestamp, "order_id": order_id,
+                "order": {
+                    "order_id": inner_order_id,
+                    "customer_id": customer_id,
+                    "order_date": order_date,
+                    "items": [{"item_id": i, "quantity": q, "price": p} for i, q, p in zip(item_ids, quantities, prices)],
+                    "total_amount": total_amount,
+                    "currency": _lookup(CURRENCY_CODES, currency_code, "currency"),
+                    "status": _lookup(STATUS_CODES, status_code, "status"),
+                },
+            }
+            model = OrderCreatedEvent
+        else:
+            (status_code,) = r.unpack(_U8)
+            data = {
+                "event_id": event_id, "event_type": event_type, "timestamp": timestamp, "order_id": order_id,
+                "status": _lookup(STATUS_CODES, status_code, "status"),
+            }
+            model = OrderStatusUpdatedEvent
+
+        if r.pos != len(r.buf):
+            raise ValueError(f"Trailing bytes in binary event payload ({len(r.buf) - r.pos})")
+        try:
+            return model.model_validate(data)
+        except ValidationError as e:
+            raise ValueError(f"Event validation failed for type={event_type.value}: {e}") from e
@@ -1,10 +1,12 @@
 from __future__ import annotations
 
 import json
-from typing import Any, Dict, Type, Union
+from typing import Annotated, Any, Dict, List, Optional, Type, Union
 
-from pydantic import ValidationError
+from pydantic import Field, TypeAdapter, ValidationError
 
+from .config import EVENT_CODEC
+from .serdes_binary import BinaryCodec
 from .events import (
     EventType,
     OrderCreatedEvent,
@@ -12,30 +14,31 @@ from .events import (
     OrderEvent,
 )
 
+try:  # optional dependency
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+RawBytes = Union[bytes, bytearray, memoryview]
+
 _EVENT_MODEL_BY_TYPE: Dict[str, Type[Any]] = {
     EventType.ORDER_CREATED.value: OrderCreatedEvent,
     EventType.ORDER_STATUS_UPDATED.value: OrderStatusUpdatedEvent,
 }
 
 
-def serialize_event(event: OrderEvent) -> bytes:
-    """
-    Converts an OrderEvent (Pydantic model) to bytes (JSON-encoded) for Kafka value.
-    """
-    return event.model_dump_json().encode("utf-8")
+def _as_bytes(raw: RawBytes) -> Union[bytes, bytearray]:
+    """Returns raw as bytes/bytearray, reusing the buffer behind a memoryview when it spans all of it."""
+    if isinstance(raw, memoryview):
+        obj = raw.obj
+        if isinstance(obj, (bytes, bytearray)) and raw.contiguous and raw.nbytes == len(obj):
+            return obj
+        return raw.tobytes()
+    return raw
 
 
-def deserialize_event(raw: Union[bytes, bytearray, memoryview]) -> OrderEvent:
-    """
-    Converts bytes (Kafka value) into a typed OrderEvent.
-    Uses event_type as a discriminator.
-    """
-    try:
-        payload = bytes(raw).decode("utf-8")
-        data = json.loads(payload)
-    except Exception as e:
-        raise ValueError(f"Invalid JSON event payload: {e}") from e
-
+def _validate_dict(data: Any) -> OrderEvent:
+    """Dispatches a decoded JSON object on event_type and validates it into its event model."""
     if not isinstance(data, dict):
         raise ValueError(f"Expected JSON object (dict), got: {type(data).__name__}")
 
@@ -53,3 +56,125 @@ def deserialize_event(raw: Union[bytes, bytearray, memoryview]) -> OrderEvent:
         return model_cls.model_validate(data)
     except ValidationError as e:
         raise ValueError(f"Event validation failed for type={et_str}: {e}") from e
+
+
+class JsonCodec:
+    """The original codec: stdlib json.loads, then Pydantic validation of the decoded dict."""
+
+    name = "json"
+    magic = None
+
+    def encode(self, event: OrderEvent) -> bytes:
+        return event.model_dump_json().encode("utf-8")
+
+    def decode(self, raw: RawBytes) -> OrderEvent:
+        try:
+            # json.loads detects UTF-8 in bytes itself, no str copy needed
+            data = json.loads(_as_bytes(raw))
+        except Exception as e:
+            raise ValueError(f"Invalid JSON event payload: {e}") from e
+        return _validate_dict(data)
+
+
+class PydanticJsonCodec:
+    """
+    Same JSON wire format, parsed and validated in one pass by pydantic-core (no intermediate
+    dict), with event_type as the union discriminator.
+    """
+
+    name = "pydantic-json"
+    magic = None
+
+    def __init__(self) -> None:
+        self._adapter: TypeAdapter[OrderEvent] = TypeAdapter(
+            Annotated[Union[OrderCreatedEvent, OrderStatusUpdatedEvent], Field(discriminator="event_type")]
+        )
+
+    def encode(self, event: OrderEvent) -> bytes:
+        return event.model_dump_json().encode("utf-8")
+
+    def decode(self, raw: RawBytes) -> OrderEvent:
+        try:
+            return self._adapter.validate_json(_as_bytes(raw))
+        except ValidationError as e:
+            raise ValueError(f"Invalid event payload: {e}") from e
+
+
+class OrjsonCodec:
+    """Same JSON wire format; orjson parses straight from the memoryview. Requires `orjson`."""
+
+    name = "orjson"
+    magic = None
+
+    def encode(self, event: OrderEvent) -> bytes:
+        return event.model_dump_json().encode("utf-8")
+
+    def decode(self, raw: RawBytes) -> OrderEvent:
+        try:
+            data = orjson.loads(raw)
+        except Exception as e:
+            raise ValueError(f"Invalid JSON event payload: {e}") from e
+        return _validate_dict(data)
+
+
+_CODECS: Dict[str, Any] = {}
+_CODECS_BY_MAGIC: Dict[int, Any] = {}
+
+
+def register_codec(codec: Any) -> None:
+    """
+    Makes a codec selectable by name. A codec has name, encode(event), decode(raw) and magic:
+    the leading byte that identifies its payloads (None for JSON codecs, whose payloads start with '{').
+    """
+    _CODECS[codec.name] = codec
+    if codec.magic is not None:
+        _CODECS_BY_MAGIC[codec.magic] = codec
+
+
+def get_codec(name: Optional[str] = None) -> Any:
+    """Returns the named codec, or the configured default (EVENT_CODEC)."""
+    name = name or EVENT_CODEC
+    codec = _CODECS.get(name)
+    if codec is None:
+        raise ValueError(f"Unknown event codec: {name} (available: {', '.join(available_codecs())})")
+    return codec
+
+
+def available_codecs() -> List[str]:
+    return sorted(_CODECS)
+
+
+def detect_codec(raw: RawBytes) -> Any:
+    """
+    Picks the codec for a payload from its leading byte: a registered binary format version,
+    otherwise JSON (decoded with the default codec when that is a JSON codec).
+    """
+    codec = _CODECS_BY_MAGIC.get(raw[0]) if len(raw) else None
+    if codec is not None:
+        return codec
+    default = get_codec()
+    return default if default.magic is None else _CODECS[JsonCodec.name]
+
+
+register_codec(JsonCodec())
+register_codec(PydanticJsonCodec())
+register_codec(BinaryCodec())
+if orjson is not None:
+    register_codec(OrjsonCodec())
+
+
+def serialize_event(event: OrderEvent, codec: Optional[str] = None) -> bytes:
+    """
+    Converts an OrderEvent (Pydantic model) to bytes for Kafka value, using the given or default codec.
+    """
+    return get_codec(codec).encode(event)
+
+
+def deserialize_event(raw: RawBytes, codec: Optional[str] = None) -> OrderEvent:
+    """
+    Converts bytes (Kafka value) into a typed OrderEvent.
+    Uses event_type as a discriminator. Raises ValueError for payloads that cannot be decoded.
+    Without an explicit codec the wire format is auto-detected, so JSON and binary producers can
+    be mixed during a rolling upgrade.
+    """
+    return (get_codec(codec) if codec else detect_codec(raw)).decode(raw)
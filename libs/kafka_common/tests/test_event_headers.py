@@ -0,0 +1,46 @@
+import pytest
+
+from libs.kafka_common.event_headers import (
+    EVENT_SCHEMA_VERSION,
+    LazyOrderEvent,
+    event_headers,
+    read_event_headers,
+)
+from libs.kafka_common.events import EventType, OrderStatusUpdatedEvent
+from libs.kafka_common.models import OrderStatus
+from libs.kafka_common.serdes_json import serialize_event
+
+
+def test_headers_round_trip():
+    event = OrderStatusUpdatedEvent(order_id="ORD-1", status=OrderStatus.SHIPPED)
+
+    headers = read_event_headers(event_headers(event, produced_at_ms=1_700_000_000_000))
+
+    assert headers.event_type == EventType.ORDER_STATUS_UPDATED
+    assert headers.event_id == event.event_id
+    assert headers.schema_version == EVENT_SCHEMA_VERSION
+    assert headers.produced_at_ms == 1_700_000_000_000
+
+
+@pytest.mark.parametrize("headers", [None, [], [("event_id", b"x")], [("event_type", b"ORDER_DELETED")]])
+def test_missing_or_unknown_event_type_means_no_headers(headers):
+    assert read_event_headers(headers) is None
+
+
+@pytest.mark.parametrize("codec", ["json", "binary"])
+def test_lazy_event_decodes_once_on_demand(codec):
+    event = OrderStatusUpdatedEvent(order_id="ORD-1", status=OrderStatus.SHIPPED)
+    lazy = LazyOrderEvent(serialize_event(event, codec=codec), read_event_headers(event_headers(event)), "ORD-1")
+
+    assert (lazy.event_type, lazy.event_id, lazy.order_id) == (event.event_type, event.event_id, "ORD-1")
+    assert not lazy.decoded
+    assert lazy.decode() == event
+    assert lazy.decode() is lazy.decode()
+
+
+def test_lazy_event_rejects_payload_that_contradicts_headers():
+    event = OrderStatusUpdatedEvent(order_id="ORD-1", status=OrderStatus.SHIPPED)
+    lazy = LazyOrderEvent(serialize_event(event), read_event_headers(event_headers(event)), "ORD-2")
+
+    with pytest.raises(ValueError, match="does not match headers"):
+        lazy.decode()
@@ -0,0 +1,145 @@
+import threading
+import time
+import zlib
+
+import pytest
+from confluent_kafka import KafkaError
+
+from libs.kafka_common.memory_broker import MemoryBroker, MemoryConsumer, MemoryProducer
+
+
+def consumer(broker, group="g", **config):
+    return MemoryConsumer({"group.id": group, "auto.offset.reset": "earliest", **config}, broker=broker)
+
+
+def produce_all(producer, topic, keys):
+    reports = []
+    for n, key in enumerate(keys):
+        producer.produce(topic, value=f"v{n}".encode(), key=key, on_delivery=lambda err, msg: reports.append((err, msg)))
+    assert producer.flush(1) == 0
+    return reports
+
+
+def drain(c, expected, timeout=2.0):
+    out = []
+    deadline = time.monotonic() + timeout
+    while len(out) < expected and time.monotonic() < deadline:
+        out += c.consume(num_messages=100, timeout=0.05)
+    return out
+
+
+def test_keyed_messages_are_partitioned_by_crc32_and_consumed_in_order():
+    broker = MemoryBroker(num_partitions=4)
+    reports = produce_all(MemoryProducer(broker=broker), "t", [b"ORD-1", b"ORD-2", b"ORD-1", "ORD-3"])
+
+    assert all(err is None for err, _ in reports)
+    assert [msg.partition() for _, msg in reports] == [zlib.crc32(k) % 4 for k in (b"ORD-1", b"ORD-2", b"ORD-1", b"ORD-3")]
+    c = consumer(broker)
+    c.subscribe(["t"])
+    messages = drain(c, 4)
+    ord1 = [m.value() for m in messages if m.key() == b"ORD-1"]
+    assert ord1 == [b"v0", b"v2"]
+    assert len(messages) == 4
+
+
+def test_group_members_split_partitions_and_take_over_on_leave():
+    broker = MemoryBroker(num_partitions=4)
+    produce_all(MemoryProducer(broker=broker), "t", [f"K{n}".encode() for n in range(40)])
+    events = []
+    a, b = consumer(broker), consumer(broker)
+    a.subscribe(["t"], on_assign=lambda c, ps: events.append(("a", sorted(tp.partition for tp in ps))))
+    b.subscribe(["t"], on_revoke=lambda c, ps: events.append(("b-revoked", len(ps))))
+
+    # a revokes and waits for b; once b has joined the generation, b fetches, then a takes its half
+    first = a.consume(100, 0.01) + b.consume(100, 0.01) + a.consume(100, 0)
+    assert ("a", [0, 2]) in events
+    b.close()
+    rest = drain(a, 1, timeout=0.2)
+
+    # auto-commit on consume and close: nothing is consumed twice
+    assert len(first) + len(rest) == 40
+    assert len({(m.partition(), m.offset()) for m in first + rest}) == 40
+    assert sorted(tp.partition for tp in a.assignment()) == [0, 1, 2, 3]
+    assert broker.lag("g", "t") == 0
+
+
+def test_a_joining_member_never_fetches_what_the_old_owner_is_still_consuming():
+    broker = MemoryBroker(num_partitions=4)
+    produce_all(MemoryProducer(broker=broker), "t", [f"K{n}".encode() for n in range(4000)])
+    seen = []
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def run(c):
+        c.subscribe(["t"])
+        while not done.is_set():
+            batch = c.consume(50, 0.01)
+            with lock:
+                seen.extend((m.partition(), m.offset()) for m in batch)
+                if len(seen) >= 4000:
+                    done.set()
+            time.sleep(0.002)  # processing: the batch is committed only afterwards, as ConsumerRunner does
+            if batch:
+                c.commit(asynchronous=False)
+        c.close()
+
+    a = threading.Thread(target=run, args=(consumer(broker, **{"enable.auto.commit": False}),))
+    a.start()
+    while len(seen) < 200:
+        time.sleep(0.001)
+    b = threading.Thread(target=run, args=(consumer(broker, **{"enable.auto.commit": False}),))
+    b.start()
+    done.wait(5)
+    done.set()
+    a.join()
+    b.join()
+
+    assert len(seen) == len(set(seen)) == 4000
+
+
+def test_on_assign_can_override_start_offsets_and_manual_commits_are_kept():
+    broker = MemoryBroker(num_partitions=1)
+    produce_all(MemoryProducer(broker=broker), "t", [b"k"] * 5)
+
+    def on_assign(c, partitions):
+        for tp in partitions:
+            tp.offset = 3
+        c.assign(partitions)
+
+    c = consumer(broker, **{"enable.auto.commit": False})
+    c.subscribe(["t"], on_assign=on_assign)
+    assert [m.offset() for m in drain(c, 2)] == [3, 4]
+    c.commit(offsets=c.position(c.assignment()), asynchronous=False)
+    c.close()
+
+    c = consumer(broker)
+    c.subscribe(["t"])
+    assert c.consume(10, 0.05) == []
+    assert broker.lag("g", "t") == 0
+
+
+def test_injected_latency_and_faults():
+    broker = MemoryBroker(num_partitions=1, latency_ms=50)
+    producer = MemoryProducer(broker=broker)
+    broker.fail_deliveries(1)
+    reports = []
+    for n in range(2):
+        producer.produce("t", value=b"x", key=b"k", on_delivery=lambda err, msg: reports.append(err))
+
+    assert producer.poll(0) == 0 and len(producer) == 2
+    assert producer.flush(1) == 0
+    assert reports[0].code() == KafkaError._MSG_TIMED_OUT and reports[1] is None
+    assert broker.high_watermark("t", 0) == 1
+
+    broker.fail_fetches(1)
+    c = consumer(broker)
+    c.subscribe(["t"])
+    assert c.poll(0.01).error().code() == KafkaError._TRANSPORT
+    assert c.poll(0.5).value() == b"x"
+
+
+def test_queue_full_raises_buffer_error():
+    producer = MemoryProducer({"queue.buffering.max.messages": 1}, broker=MemoryBroker())
+    producer.produce("t", value=b"x")
+    with pytest.raises(BufferError):
+        producer.produce("t", value=b"y")
@@ -0,0 +1,84 @@
+import threading
+
+import pytest
+
+from libs.kafka_common.metrics import Registry, _Labelled, log_buckets
+
+
+def test_counter_shards_per_thread_and_sums_on_read():
+    registry = Registry()
+    counter = registry.counter("events_total", "Events", ("event_type",))
+    created = counter.labels("ORDER_CREATED")
+
+    def work():
+        for _ in range(10_000):
+            created.inc()
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # finished threads keep their counts
+    assert created.value == 40_000
+    assert 'events_total{event_type="ORDER_CREATED"} 40000' in registry.render()
+
+
+def test_histogram_renders_cumulative_buckets_sum_and_count():
+    registry = Registry()
+    h = registry.histogram("handle_seconds", "Handle time", buckets=(0.001, 0.01))
+    for value in (0.0005, 0.001, 0.005, 2.0):
+        h.observe(value)
+
+    lines = registry.render().splitlines()
+
+    assert lines[:2] == ["# HELP handle_seconds Handle time", "# TYPE handle_seconds histogram"]
+    assert lines[2:] == [
+        'handle_seconds_bucket{le="0.001"} 2',
+        'handle_seconds_bucket{le="0.01"} 3',
+        'handle_seconds_bucket{le="+Inf"} 4',
+        "handle_seconds_sum 2.0065",
+        "handle_seconds_count 4",
+    ]
+
+
+def test_callbacks_are_read_at_scrape_time_and_failures_are_skipped(capsys):
+    registry = Registry()
+    lag = {("orders.events", "0"): 5}
+    registry.gauge("consumer_lag", "Lag", lambda: dict(lag), ("topic", "partition"))
+    registry.counter_fn("duplicates_total", "Duplicates", lambda: 1 / 0)
+
+    lag[("orders.events", "1")] = 0
+    text = registry.render()
+
+    assert 'consumer_lag{topic="orders.events",partition="0"} 5' in text
+    assert 'consumer_lag{topic="orders.events",partition="1"} 0' in text
+    assert "duplicates_total" not in text
+    assert "Failed to collect metric duplicates_total" in capsys.readouterr().out
+
+
+def test_registering_a_name_again_returns_the_same_metric_unless_the_type_differs():
+    registry = Registry()
+    counter = registry.counter("x_total", "X")
+
+    assert registry.counter("x_total", "X") is counter
+    with pytest.raises(ValueError):
+        registry.histogram("x_total", "X")
+    with pytest.raises(ValueError):
+        registry.counter("x_total", "X", ("label",))
+
+
+def test_log_buckets():
+    assert log_buckets(1e-3, 1.0) == (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def test_a_metric_kind_missing_its_hooks_cannot_be_built():
+    class Gauge(_Labelled):
+        type = "gauge"
+
+        def _render(self, lines):
+            pass
+
+    with pytest.raises(TypeError):
+        Gauge("g", "G")
@@ -0,0 +1,45 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from libs.kafka_common.events import OrderCreatedEvent, OrderStatusUpdatedEvent
+from libs.kafka_common.models import Order, OrderItem, Currency, OrderStatus
+from libs.kafka_common.serdes_json import available_codecs, deserialize_event, get_codec, serialize_event
+
+
+def make_created(n_items=3):
+    order = Order(
+        order_id="ORD-1",
+        customer_id="CUST-00001",
+        order_date=datetime(2024, 1, 18, 12, 0, tzinfo=timezone.utc),
+        items=[OrderItem(item_id=f"ITEM-{i:03d}", quantity=i + 1, price=10.5) for i in range(n_items)],
+        total_amount=63.0,
+        currency=Currency.GBP,
+        status=OrderStatus.NEW,
+    )
+    return OrderCreatedEvent(order_id="ORD-1", order=order)
+
+
+@pytest.mark.parametrize("codec", available_codecs())
+@pytest.mark.parametrize("wrap", [bytes, bytearray, memoryview])
+def test_codecs_round_trip_all_buffer_types(codec, wrap):
+    for event in (make_created(), OrderStatusUpdatedEvent(order_id="ORD-1", status=OrderStatus.SHIPPED)):
+        raw = wrap(serialize_event(event, codec=codec))
+        assert deserialize_event(raw, codec=codec) == event
+
+
+@pytest.mark.parametrize("codec", available_codecs())
+def test_codecs_reject_bad_payloads_with_value_error(codec):
+    for raw in (b"{not json", b"[]", b'{"order_id": "ORD-1"}', b'{"event_type": "NOPE", "order_id": "x"}'):
+        with pytest.raises(ValueError):
+            deserialize_event(raw, codec=codec)
+
+
+def test_json_codecs_share_the_wire_format():
+    raw = serialize_event(make_created(), codec="json")
+    assert deserialize_event(raw, codec="pydantic-json") == deserialize_event(raw, codec="json")
+
+
+def test_unknown_codec_name():
+    with pytest.raises(ValueError):
+        get_codec("nope")
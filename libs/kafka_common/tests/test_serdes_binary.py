@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from libs.kafka_common.events import OrderCreatedEvent, OrderStatusUpdatedEvent
+from libs.kafka_common.models import Order, OrderItem, Currency, OrderStatus
+from libs.kafka_common.serdes_binary import BINARY_FORMAT_VERSION
+from libs.kafka_common.serdes_json import deserialize_event, serialize_event
+
+
+def make_created(order_date, n_items=20, event_id=None):
+    order = Order(
+        order_id="ORD-42",
+        customer_id="CUST-04242",
+        order_date=order_date,
+        items=[OrderItem(item_id=f"ITEM-{i:03d}", quantity=i % 10 + 1, price=10.0 + i / 100) for i in range(n_items)],
+        total_amount=1234.56,
+        currency=Currency.COP,
+        status=OrderStatus.PROCESSING,
+    )
+    kwargs = {"event_id": event_id} if event_id else {}
+    return OrderCreatedEvent(order_id="ORD-42", order=order, **kwargs)
+
+
+@pytest.mark.parametrize("order_date", [
+    datetime(2024, 1, 18, 12, 0, 0, 123456),
+    datetime(2024, 1, 18, 12, 0, tzinfo=timezone.utc),
+    datetime(2024, 1, 18, 12, 0, tzinfo=timezone(timedelta(hours=5, minutes=30))),
+])
+def test_binary_round_trip_preserves_timestamps_exactly(order_date):
+    event = make_created(order_date)
+    decoded = deserialize_event(serialize_event(event, codec="binary"))
+
+    assert decoded == event
+    assert decoded.order.order_date.utcoffset() == order_date.utcoffset()
+
+
+def test_binary_keeps_non_uuid_event_ids_and_status_updates():
+    created = make_created(datetime.now(), event_id="replayed-17")
+    status = OrderStatusUpdatedEvent(order_id="ORD-42", status=OrderStatus.CANCELLED)
+
+    for event in (created, status):
+        assert deserialize_event(serialize_event(event, codec="binary")) == event
+
+
+def test_format_is_auto_detected_and_smaller_than_json():
+    event = make_created(datetime.now(timezone.utc))
+    as_json = serialize_event(event, codec="json")
+    as_binary = serialize_event(event, codec="binary")
+
+    assert as_binary[0] == BINARY_FORMAT_VERSION
+    assert len(as_binary) < len(as_json) / 2
+    assert deserialize_event(memoryview(as_binary)) == deserialize_event(as_json) == event
+
+
+def test_corrupt_binary_payloads_raise_value_error():
+    raw = serialize_event(make_created(datetime.now()), codec="binary")
+
+    for bad in (raw[:-3], raw + b"\x00", bytes([BINARY_FORMAT_VERSION, 9]) + raw[2:]):
+        with pytest.raises(ValueError):
+            deserialize_event(bad)
+
+
+def test_non_ascii_item_ids_round_trip():
+    event = make_created(datetime.now(), n_items=3)
+    event.order.items[1].item_id = "ITEM-ü€-1"
+
+    assert deserialize_event(serialize_event(event, codec="binary")) == event
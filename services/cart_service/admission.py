@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import math
+import threading
+import time
+from typing import Dict, Optional
+
+from services.cart_service.publisher import KafkaPublishError, OrderEventPublisher
+
+
+class Overloaded(RuntimeError):
+    """Raised when a request is shed by admission control; retry after retry_after_sec."""
+
+    def __init__(self, message: str, retry_after_sec: int) -> None:
+        super().__init__(message)
+        self.retry_after_sec = retry_after_sec
+
+
+class AdmissionController:
+    """
+    Concurrency limit on requests publishing to Kafka, adapted to observed delivery latency (AIMD):
+    every publish that is delivered within target_latency_ms raises the limit by cost/limit
+    (about +1 per limit's worth of deliveries), a slower or failed one cuts it to
+    limit * backoff_ratio, at most once per smoothed latency so one slow burst isn't counted
+    many times. Requests over the limit, or arriving while the producer queue or the number of
+    undelivered messages is above max_queue_depth, are rejected with Overloaded instead of
+    waiting for room in the producer queue.
+
+    A request whose cost exceeds the whole limit (a large batch) is still admitted when nothing
+    else is in flight, so it can't be starved.
+    """
+
+    def __init__(
+        self,
+        publisher: OrderEventPublisher,
+        initial_limit: int = 64,
+        min_limit: int = 4,
+        max_limit: int = 4096,
+        target_latency_ms: float = 250.0,
+        max_queue_depth: int = 50_000,
+        backoff_ratio: float = 0.7,
+        smoothing: float = 0.2,
+    ) -> None:
+        self.publisher = publisher
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency_sec = target_latency_ms / 1000.0
+        self.max_queue_depth = max_queue_depth
+        self.backoff_ratio = backoff_ratio
+        self.smoothing = smoothing
+
+        self._lock = threading.Lock()
+        self._limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self._active = 0
+        self._latency_sec: Optional[float] = None
+        self._last_decrease = 0.0
+        self.admitted = 0
+        self.rejected = 0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def queue_depth(self) -> int:
+        """Messages in the producer queue or awaiting their delivery report."""
+        return max(len(self.publisher.producer), self.publisher.in_flight)
+
+    def retry_after_sec(self) -> int:
+        latency = self._latency_sec if self._latency_sec is not None else self.target_latency_sec
+        return max(1, math.ceil(latency))
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "active": self._active,
+                "latency_ms": round((self._latency_sec or 0.0) * 1000, 2),
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+            }
+
+    def acquire(self, cost: int = 1) -> None:
+        """Admits a request publishing `cost` events, or raises Overloaded."""
+        depth = self.queue_depth()
+        with self._lock:
+            if depth + cost > self.max_queue_depth and depth > 0:
+                reason = f"producer queue holds {depth} undelivered message(s)"
+            elif self._active + cost > self._limit and self._active > 0:
+                reason = f"{self._active} publish(es) in flight, limit {self.limit}"
+            else:
+                self._active += cost
+                self.admitted += 1
+                return
+            self.rejected += 1
+        raise Overloaded(f"Cart service overloaded: {reason}", self.retry_after_sec())
+
+    def release(self, cost: int, latency_sec: Optional[float] = None, failed: bool = False) -> None:
+        """Ends an admitted request and adapts the limit to how its publish went (no latency: it didn't publish)."""
+        now = time.monotonic()
+        with self._lock:
+            self._active -= cost
+            if latency_sec is None:
+                return
+            if self._latency_sec is None:
+                self._latency_sec = latency_sec
+            else:
+                self._latency_sec += self.smoothing * (latency_sec - self._latency_sec)
+            if failed or latency_sec > self.target_latency_sec:
+                if now - self._last_decrease >= max(self._latency_sec, self.target_latency_sec):
+                    self._limit = max(float(self.min_limit), self._limit * self.backoff_ratio)
+                    self._last_decrease = now
+            else:
+                self._limit = min(float(self.max_limit), self._limit + cost / self._limit)
+
+    def admit(self, cost: int = 1) -> "_Permit":
+        """`with controller.admit(n): publish...` — acquire, then release with the block's duration."""
+        self.acquire(cost)
+        return _Permit(self, cost)
+
+
+class _Permit:
+    """
+    Released when the block exits, or earlier with release(). The latency runs from start() (or
+    from admission) to the release: call start() once the request begins publishing, so local
+    work before it (validation, storing) isn't taken for Kafka latency.
+    """
+
+    __slots__ = ("controller", "cost", "started", "released")
+
+    def __init__(self, controller: AdmissionController, cost: int) -> None:
+        self.controller = controller
+        self.cost = cost
+        self.started = time.monotonic()
+        self.released = False
+
+    def start(self) -> None:
+        self.started = time.monotonic()
+
+    def release(self, failed: Optional[bool] = None) -> None:
+        """Ends the permit; failed=None means nothing was published (no latency sample)."""
+        if self.released:
+            return
+        self.released = True
+        if failed is None:
+            self.controller.release(self.cost)
+        else:
+            self.controller.release(self.cost, time.monotonic() - self.started, failed)
+
+    def __enter__(self) -> "_Permit":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self.released:
+            return
+        self.released = True
+        if exc_type is not None and not issubclass(exc_type, KafkaPublishError):
+            # rejected before publishing (409, 404, ...): says nothing about Kafka
+            self.controller.release(self.cost)
+            return
+        self.controller.release(self.cost, time.monotonic() - self.started, exc_type is not None)
+
+
+class _NoPermit:
+    """What OrderGenerator holds when there is no admission control: every call is a no-op."""
+
+    def start(self) -> None:
+        pass
+
+    def release(self, failed: Optional[bool] = None) -> None:
+        pass
+
+    def __enter__(self) -> "_NoPermit":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+NO_PERMIT = _NoPermit()
@@ -1,9 +1,11 @@
 from pydantic import BaseModel, Field, ConfigDict, field_validator
+from typing import List
 import re
 
 from libs.kafka_common.models import OrderStatus
 
 ORDER_ID_RE = re.compile(r"^(ORD-)?\d+$")
+MAX_ORDERS_PER_BATCH = 10_000
 
 class CreateOrderRequest(BaseModel):
     model_config = ConfigDict(populate_by_name=True)
@@ -19,6 +21,12 @@ class CreateOrderRequest(BaseModel):
         return v
 
 
+class CreateOrdersRequest(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    orders: List[CreateOrderRequest] = Field(..., min_length=1, max_length=MAX_ORDERS_PER_BATCH)
+
+
 class UpdateOrderRequest(BaseModel):
     model_config = ConfigDict(populate_by_name=True)
 
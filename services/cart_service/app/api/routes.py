@@ -1,7 +1,14 @@
+from typing import Optional
+
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import Response
+
+from libs.kafka_common.metrics import CONTENT_TYPE, Registry
 
-from services.cart_service.app.api.models import CreateOrderRequest, UpdateOrderRequest
+from services.cart_service.app.api.models import CreateOrderRequest, CreateOrdersRequest, UpdateOrderRequest
+from services.cart_service.admission import Overloaded
 from services.cart_service.order_generator import OrderGenerator, OrderAlreadyExists, OrderNotFound
+from services.cart_service.outbox import OutboxError
 from services.cart_service.publisher import KafkaPublishError, KafkaBrokersUnavailable, KafkaTimeout, ProducerQueueFull
 
 router = APIRouter()
@@ -14,26 +21,87 @@ def get_order_generator() -> OrderGenerator:
     raise RuntimeError("OrderGenerator dependency is not configured")
 
 
+def get_metrics() -> Registry:
+    """
+    Overridden in main.py with the registry the publisher records into.
+    """
+    raise RuntimeError("Metrics registry dependency is not configured")
+
+
+def _overloaded(e: Overloaded) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after_sec)})
+
+
+def _outcome(order_generator: OrderGenerator) -> str:
+    # with an outbox the event is durably queued, and published by the relay after the response
+    return "queued for publishing" if order_generator.outbox is not None else "published successfully"
+
+
 @router.post("/create-order")
-def create_order(request: CreateOrderRequest, order_generator: OrderGenerator = Depends(get_order_generator)):
+async def create_order(request: CreateOrderRequest, order_generator: OrderGenerator = Depends(get_order_generator)):
     try:
-        order_id = order_generator.create_order(request.order_id, request.number_of_items)
-        return {"message": "order created and published successfully", "orderId": order_id}
+        order_id = await order_generator.create_order_async(request.order_id, request.number_of_items)
+        return {"message": f"order created and {_outcome(order_generator)}", "orderId": order_id}
     except OrderAlreadyExists as e:
         raise HTTPException(status_code=409, detail=str(e))
+    except Overloaded as e:
+        raise _overloaded(e)
+    except OutboxError as e:
+        raise HTTPException(status_code=503, detail=f"Failed to record order event: {str(e)}")
     except (KafkaPublishError, KafkaBrokersUnavailable, KafkaTimeout, ProducerQueueFull) as e:
         raise HTTPException(status_code=503, detail=f"Failed to publish order event: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _batch_result(order_id: str, err: Optional[Exception], outcome: str) -> dict:
+    if err is None:
+        return {"orderId": order_id, "status": 200, "detail": f"order created and {outcome}"}
+    if isinstance(err, OrderAlreadyExists):
+        return {"orderId": order_id, "status": 409, "detail": str(err)}
+    if isinstance(err, OutboxError):
+        return {"orderId": order_id, "status": 503, "detail": f"Failed to record order event: {str(err)}"}
+    if isinstance(err, KafkaPublishError):
+        return {"orderId": order_id, "status": 503, "detail": f"Failed to publish order event: {str(err)}"}
+    return {"orderId": order_id, "status": 500, "detail": str(err)}
+
+
+@router.post("/create-orders")
+async def create_orders(request: CreateOrdersRequest, order_generator: OrderGenerator = Depends(get_order_generator)):
+    try:
+        outcomes = await order_generator.create_orders_async((o.order_id, o.number_of_items) for o in request.orders)
+    except Overloaded as e:
+        raise _overloaded(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    outcome = _outcome(order_generator)
+    results = [_batch_result(order_id, err, outcome) for order_id, err in outcomes]
+    created = sum(1 for r in results if r["status"] == 200)
+    return {
+        "message": f"{created} of {len(results)} order(s) created and {outcome}",
+        "created": created,
+        "failed": len(results) - created,
+        "results": results,
+    }
+
 @router.put("/update-order")
-def update_order(request: UpdateOrderRequest, order_generator: OrderGenerator = Depends(get_order_generator)):
+async def update_order(request: UpdateOrderRequest, order_generator: OrderGenerator = Depends(get_order_generator)):
     try:
-        order_generator.update_order_status(request.order_id, request.status)
-        return {"message": "order status updated and published successfully", "orderId": request.order_id}
+        await order_generator.update_order_status_async(request.order_id, request.status)
+        return {"message": f"order status updated and {_outcome(order_generator)}", "orderId": request.order_id}
     except OrderNotFound as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except Overloaded as e:
+        raise _overloaded(e)
+    except OutboxError as e:
+        raise HTTPException(status_code=503, detail=f"Failed to record order status update event: {str(e)}")
     except (KafkaPublishError, KafkaBrokersUnavailable, KafkaTimeout, ProducerQueueFull) as e:
         raise HTTPException(status_code=503, detail=f"Failed to publish order status update event: {str(e)}")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/metrics")
+async def metrics(registry: Registry = Depends(get_metrics)):
+    """Publish latency, retries, failed deliveries and producer queue depth, in Prometheus text format."""
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
@@ -1,11 +1,35 @@
-
+from libs.kafka_common.config import (
+    CART_ADMISSION_CONTROL,
+    CART_ADMISSION_INITIAL_LIMIT,
+    CART_ADMISSION_MAX_QUEUE_DEPTH,
+    CART_ADMISSION_TARGET_LATENCY_MS,
+    CART_OUTBOX_BATCH_SIZE,
+    CART_OUTBOX_FSYNC,
+    CART_OUTBOX_PATH,
+    CART_STORE_SHARDS,
+    PUBLISHER_PIPELINED,
+)
+from libs.kafka_common.metrics import Registry
+from services.cart_service.admission import AdmissionController
 from services.cart_service.store_memory  import OrderStoreMemory
 from services.cart_service.order_generator import OrderGenerator
+from services.cart_service.outbox import Outbox, OutboxRelay
 from services.cart_service.publisher import OrderEventPublisher
 
-order_store = OrderStoreMemory()
-publisher = OrderEventPublisher()
+order_store = OrderStoreMemory(shards=CART_STORE_SHARDS)
+metrics = Registry()
+publisher = OrderEventPublisher(pipelined=PUBLISHER_PIPELINED, metrics=metrics)
+outbox = Outbox(CART_OUTBOX_PATH, fsync=CART_OUTBOX_FSYNC) if CART_OUTBOX_PATH else None
+outbox_relay = OutboxRelay(outbox, publisher, batch_size=CART_OUTBOX_BATCH_SIZE) if outbox else None
+admission = AdmissionController(
+    publisher,
+    initial_limit=CART_ADMISSION_INITIAL_LIMIT,
+    target_latency_ms=CART_ADMISSION_TARGET_LATENCY_MS,
+    max_queue_depth=CART_ADMISSION_MAX_QUEUE_DEPTH,
+) if CART_ADMISSION_CONTROL else None
 order_generator = OrderGenerator(
     store=order_store,
     publisher=publisher,
-)
\ No newline at end of file
+    outbox=outbox,
+    admission=admission,
+)
@@ -1,10 +1,38 @@
 # services/cart_service/app/main.py
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from services.cart_service.app.api.routes import router, get_order_generator
-from services.cart_service.init_services import order_generator
+from services.cart_service.app.api.routes import router, get_metrics, get_order_generator
+from services.cart_service.init_services import metrics, order_generator, outbox, outbox_relay, publisher
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if outbox_relay:
+        outbox_relay.start()
+    yield
+    # Shutdown: relay what the outbox still holds (the rest goes out on the next start),
+    # then stop the delivery poller and flush whatever is still queued
+    if outbox_relay:
+        outbox_relay.stop()
+        outbox.close()
+    publisher.close()
+
+
+app = FastAPI(lifespan=lifespan)
 app.include_router(router)
 
-app.dependency_overrides[get_order_generator] = lambda: order_generator
+
+async def _shared_order_generator():
+    # async so FastAPI resolves it on the event loop instead of the threadpool
+    return order_generator
+
+
+app.dependency_overrides[get_order_generator] = _shared_order_generator
+
+
+async def _metrics():
+    return metrics
+
+
+app.dependency_overrides[get_metrics] = _metrics
@@ -1,13 +1,34 @@
 from __future__ import annotations
 
+from concurrent.futures import Future
+from contextlib import ExitStack, contextmanager
 from datetime import datetime
-from typing import Dict, List
+from itertools import repeat
+from operator import mul, truediv
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+import asyncio
 import random
+import sys
+import threading
 
+from libs.kafka_common.events import OrderCreatedEvent, OrderStatusUpdatedEvent
 from libs.kafka_common.models import Order, OrderItem, Currency, OrderStatus
+from services.cart_service.admission import NO_PERMIT, AdmissionController
+from services.cart_service.outbox import Outbox
 from services.cart_service.store_memory import OrderStoreMemory
 
 
+# Value pools the item fields are drawn from in one rng.choices() call each: same values as
+# f"ITEM-{randint(1, 999):03d}", randint(1, 10) and round(uniform(10.0, 100.0), 2).
+_ITEM_IDS = tuple(sys.intern(f"ITEM-{n:03d}") for n in range(1, 1000))
+_QUANTITIES = range(1, 11)
+_PRICE_CENTS = range(1000, 10001)
+_CURRENCIES = tuple(Currency)
+
+# stripes of the per-order locks held across a store change and its outbox append
+_OUTBOX_LOCK_STRIPES = 64
+
+
 class OrderAlreadyExists(ValueError):
     pass
 
@@ -16,48 +37,269 @@ class OrderNotFound(ValueError):
 
 
 
+class _BatchPublish:
+    """
+    The publishing half of a create_orders batch, shared by the sync and async paths: which staged
+    orders were enqueued, their outcomes, and how the admission permit is released.
+    """
+
+    __slots__ = ("results", "staged", "permit", "indexes", "futures", "failed")
+
+    def __init__(self, results: List[Tuple[str, Optional[Exception]]], staged: List[Tuple[int, Order]], permit) -> None:
+        self.results = results
+        self.staged = staged
+        self.permit = permit
+        self.indexes: List[int] = []
+        self.futures: List[Future] = []
+        self.failed = False
+        if staged:
+            # the permit measures the publish: staging is local work, not Kafka latency
+            permit.start()
+
+    def enqueued(self, index: int, future: Future) -> None:
+        self.indexes.append(index)
+        self.futures.append(future)
+
+    def enqueue_failed(self, index: int, err: Exception) -> None:
+        self.results[index] = (self.results[index][0], err)
+        self.failed = True
+
+    def delivered(self, outcomes: List[Optional[BaseException]]) -> None:
+        for index, err in zip(self.indexes, outcomes):
+            if err is not None:
+                self.results[index] = (self.results[index][0], err)  # type: ignore[assignment]
+                self.failed = True
+
+    def finish(self) -> List[Tuple[str, Optional[Exception]]]:
+        # per-order errors are returned, not raised, so the permit wouldn't see them on exit;
+        # a batch that published nothing releases without a latency sample
+        self.permit.release(failed=self.failed if self.staged else None)
+        return self.results
+
+
 class OrderGenerator:
-    def __init__(self, publisher, store: OrderStoreMemory) -> None:
+    def __init__(self, publisher, store: OrderStoreMemory, seed: Optional[int] = None, outbox: Optional[Outbox] = None, admission: Optional[AdmissionController] = None) -> None:
+        """
+        seed makes the generated customers, currencies and items reproducible (benchmarks, tests).
+        With an outbox, events are written to it together with the store change instead of being
+        published in the request; an OutboxRelay publishes them. The store change and the append
+        happen under the order's lock, so the outbox holds each order's events in store order.
+        With admission control, requests that would publish while Kafka is slow are rejected
+        with Overloaded before anything is stored.
+        """
         self.publisher = publisher
         self.store = store
+        self.outbox = outbox
+        self.admission = admission
+        self._rng = random.Random(seed)
+        self._outbox_locks = [threading.Lock() for _ in range(_OUTBOX_LOCK_STRIPES)]
 
     @staticmethod
     def _normalize_order_id(order_id: str) -> str:
         return f"ORD-{order_id}" if order_id.isdigit() else order_id
 
-    def create_order(self, order_id: str, num_of_items: int) -> str:
+    def _build_order(self, order_id: str, num_of_items: int) -> Order:
+        rng = self._rng
+        customer_id = f"CUST-{rng.randint(1, 99999):05d}"
+        order_date = datetime.now()
+        currency = rng.choice(_CURRENCIES)
+
+        # each column drawn in one call, the total summed in bulk (same rounding as per item)
+        item_ids = rng.choices(_ITEM_IDS, k=num_of_items)
+        quantities = rng.choices(_QUANTITIES, k=num_of_items)
+        price_cents = rng.choices(_PRICE_CENTS, k=num_of_items)
+        prices = list(map(truediv, price_cents, repeat(100)))
+        # q * cents / 100 is exactly round(q * price, 2), without the slow round()
+        total_amount = sum(map(truediv, map(mul, quantities, price_cents), repeat(100)), 0.0)
+
+        # One strict validation call for the whole order: pydantic-core builds the OrderItems from
+        # already-typed values faster than OrderItem(...) per item, or model_construct() in Python
+        return Order.model_validate({
+            "order_id": order_id,
+            "customer_id": customer_id,
+            "order_date": order_date,
+            "items": [{"item_id": i, "quantity": q, "price": p} for i, q, p in zip(item_ids, quantities, prices)],
+            "total_amount": total_amount,
+            "currency": currency,
+            "status": OrderStatus.NEW,
+        }, strict=True)
+
+    def _stage_order(self, order_id: str, num_of_items: int) -> Order:
+        """Validates and stores a new order; publishing is left to the caller."""
         order_id = self._normalize_order_id(order_id)
         if self.store.exists(order_id):
             raise OrderAlreadyExists(f"Order {order_id} already exists.")
 
-        customer_id = f"CUST-{random.randint(1, 99999):05d}"
-        order_date = datetime.now()
-        items: List[OrderItem] = []
-        total_amount = 0.0
-        currency = random.choice(list(Currency)).value
-        status = OrderStatus.NEW
-
-        for _ in range(num_of_items): # type: ignore[arg-type]
-            item_id = f"ITEM-{random.randint(1, 999):03d}"
-            quantity = random.randint(1, 10)
-            price = round(random.uniform(10.0, 100.0), 2)
-            item = OrderItem(item_id=item_id, quantity=quantity, price=price)
-            items.append(item)
-            total_amount += round(quantity * price, 2)
-
-        order = Order(order_id=order_id, customer_id=customer_id, order_date=order_date, items=items,
-                      total_amount=total_amount, currency=currency, status=status)
-
-        self.store.add(order)
-        self.publisher.publish_order_created(order)
-        return order_id
+        order = self._build_order(order_id, num_of_items)
 
-    def update_order_status(self, order_id: str, new_status: OrderStatus) -> None:
+        # the exists() check above only saves building the order; this one is atomic, so of two
+        # concurrent requests for the same id exactly one stores (and publishes) it
+        if not self.store.add_if_absent(order):
+            raise OrderAlreadyExists(f"Order {order_id} already exists.")
+        return order
+
+    def _stage_orders(self, requests: Iterable[Tuple[str, int]]) -> Tuple[List[Tuple[str, Optional[Exception]]], List[Tuple[int, Order]]]:
+        """Stages a batch; returns per-request results so far and the (result index, order) pairs to publish."""
+        results: List[Tuple[str, Optional[Exception]]] = []
+        staged: List[Tuple[int, Order]] = []
+        seen: Set[str] = set()
+
+        for raw_order_id, num_of_items in requests:
+            order_id = self._normalize_order_id(raw_order_id)
+            if order_id in seen:
+                results.append((order_id, OrderAlreadyExists(f"Order {order_id} already exists.")))
+                continue
+            seen.add(order_id)
+            try:
+                order = self._stage_order(order_id, num_of_items)
+            except OrderAlreadyExists as e:
+                results.append((order_id, e))
+                continue
+            staged.append((len(results), order))
+            results.append((order_id, None))
+        return results, staged
+
+    def _write_created_batch(self, results: List[Tuple[str, Optional[Exception]]], staged: List[Tuple[int, Order]]) -> None:
+        if not staged:
+            return
+        try:
+            self._write_created([order for _, order in staged])
+        except Exception as e:
+            for index, order in staged:
+                results[index] = (order.order_id, e)
+
+    def _stage_status_update(self, order_id: str, new_status: OrderStatus) -> Tuple[str, Order]:
+        """Applies the status change to the store; returns the order id and the order as it was before."""
         order_id = self._normalize_order_id(order_id)
-        order = self.store.get(order_id)
-        if order is None:
-            raise OrderNotFound(f"Order {order_id} not found.")
-        order.status = new_status
-        self.store.update(order)
-        self.publisher.publish_order_status_updated(order_id, new_status)
+        while True:
+            order = self.store.get(order_id)
+            if order is None:
+                raise OrderNotFound(f"Order {order_id} not found.")
+            # retried if another request changed the status between get() and here
+            if self.store.compare_and_set_status(order_id, order.status, new_status):
+                return order_id, order
+
+    @contextmanager
+    def _outbox_order_locks(self, order_ids: Iterable[str]) -> Iterator[None]:
+        """Holds the outbox locks of the given (normalized) order ids; stripes are taken in index order, so batches can't deadlock."""
+        stripes = sorted({hash(order_id) % len(self._outbox_locks) for order_id in order_ids})
+        with ExitStack() as stack:
+            for stripe in stripes:
+                stack.enter_context(self._outbox_locks[stripe])
+            yield
+
+    def _write_created(self, orders: List[Order]) -> None:
+        """
+        Writes ORDER_CREATED events to the outbox; the staged orders are removed again if that
+        fails. Called under the orders' outbox locks, so nothing else has changed them since.
+        """
+        try:
+            self.outbox.append_events(OrderCreatedEvent(order_id=o.order_id, order=o) for o in orders)
+        except BaseException:
+            for order in orders:
+                self.store.remove(order.order_id)
+            raise
+
+    def _write_status_updated(self, order_id: str, new_status: OrderStatus, previous: Order) -> None:
+        """Like _write_created: on failure the order is put back as it was, under its outbox lock."""
+        try:
+            self.outbox.append_events([OrderStatusUpdatedEvent(order_id=order_id, status=new_status)])
+        except BaseException:
+            self.store.update(previous)
+            raise
+
+    def _create_via_outbox(self, order_id: str, num_of_items: int) -> Order:
+        with self._outbox_order_locks([self._normalize_order_id(order_id)]):
+            order = self._stage_order(order_id, num_of_items)
+            self._write_created([order])
+        return order
+
+    def _create_batch_via_outbox(self, requests: List[Tuple[str, int]]) -> List[Tuple[str, Optional[Exception]]]:
+        with self._outbox_order_locks(self._normalize_order_id(order_id) for order_id, _ in requests):
+            results, staged = self._stage_orders(requests)
+            self._write_created_batch(results, staged)
+        return results
+
+    def _update_status_via_outbox(self, order_id: str, new_status: OrderStatus) -> None:
+        with self._outbox_order_locks([self._normalize_order_id(order_id)]):
+            order_id, previous = self._stage_status_update(order_id, new_status)
+            self._write_status_updated(order_id, new_status, previous)
+
+    def _admit(self, cost: int = 1):
+        """Admission permit for a request publishing `cost` events (not used with an outbox)."""
+        if self.admission is None:
+            return NO_PERMIT
+        return self.admission.admit(cost)
+
+    def create_order(self, order_id: str, num_of_items: int) -> str:
+        if self.outbox is not None:
+            return self._create_via_outbox(order_id, num_of_items).order_id
+        with self._admit() as permit:
+            order = self._stage_order(order_id, num_of_items)
+            permit.start()
+            self.publisher.publish_order_created(order)
+        return order.order_id
+
+    async def create_order_async(self, order_id: str, num_of_items: int) -> str:
+        if self.outbox is not None:
+            # the append may fsync; keep it (and the order lock held across it) off the event loop
+            order = await asyncio.to_thread(self._create_via_outbox, order_id, num_of_items)
+            return order.order_id
+        with self._admit() as permit:
+            order = self._stage_order(order_id, num_of_items)
+            permit.start()
+            await self.publisher.publish_order_created_async(order)
+        return order.order_id
+
+    def create_orders(self, requests: Iterable[Tuple[str, int]]) -> List[Tuple[str, Optional[Exception]]]:
+        """
+        Creates a batch of orders and publishes all ORDER_CREATED events with a single delivery wait
+        (or writes them to the outbox in one append).
+        Returns (order_id, error) per request, in request order; error is None on success.
+        """
+        requests = list(requests)
+        if self.outbox is not None:
+            return self._create_batch_via_outbox(requests)
+        with self._admit(len(requests)) as permit:
+            batch = _BatchPublish(*self._stage_orders(requests), permit)
+            for index, order in batch.staged:
+                try:
+                    batch.enqueued(index, self.publisher.enqueue_order_created(order))
+                except Exception as e:
+                    batch.enqueue_failed(index, e)
+            if batch.futures:
+                batch.delivered(self.publisher.wait_for_delivery(batch.futures, return_exceptions=True))
+            return batch.finish()
+
+    async def create_orders_async(self, requests: Iterable[Tuple[str, int]]) -> List[Tuple[str, Optional[Exception]]]:
+        requests = list(requests)
+        if self.outbox is not None:
+            return await asyncio.to_thread(self._create_batch_via_outbox, requests)
+        with self._admit(len(requests)) as permit:
+            batch = _BatchPublish(*self._stage_orders(requests), permit)
+            for index, order in batch.staged:
+                try:
+                    batch.enqueued(index, await self.publisher.enqueue_order_created_async(order))
+                except Exception as e:
+                    batch.enqueue_failed(index, e)
+            if batch.futures:
+                batch.delivered(await self.publisher.wait_for_delivery_async(batch.futures, return_exceptions=True))
+            return batch.finish()
+
+    def update_order_status(self, order_id: str, new_status: OrderStatus) -> None:
+        if self.outbox is not None:
+            self._update_status_via_outbox(order_id, new_status)
+            return
+        with self._admit() as permit:
+            order_id, _ = self._stage_status_update(order_id, new_status)
+            permit.start()
+            self.publisher.publish_order_status_updated(order_id, new_status)
 
+    async def update_order_status_async(self, order_id: str, new_status: OrderStatus) -> None:
+        if self.outbox is not None:
+            await asyncio.to_thread(self._update_status_via_outbox, order_id, new_status)
+            return
+        with self._admit() as permit:
+            order_id, _ = self._stage_status_update(order_id, new_status)
+            permit.start()
+            await self.publisher.publish_order_status_updated_async(order_id, new_status)
@@ -0,0 +1,389 @@
+"""
+Transactional outbox for the cart service: events are appended to a local file in the same step
+as the store write, and OutboxRelay publishes them to Kafka in the background.
+
+The outbox file is a sequence of records, each `u32 payload length, u32 CRC-32, payload`, with
+payload = `u16 key length, key, u8 header count, (u8 name length, name, u16 value length,
+value) per header, event bytes`. `<path>.cursor` holds the file position up to which every
+record has been delivered; it is replaced atomically after each relayed batch. On open, a torn
+record at the end of the file (crash mid-append) is cut off. Once everything is delivered and
+the file has grown past compact_bytes, it is truncated back to empty.
+
+Delivery is at-least-once: records past the cursor are sent again after a crash. They keep
+their event_id, so the order service's dedupe window drops the copies.
+"""
+from __future__ import annotations
+
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from libs.kafka_common.event_headers import event_headers
+from libs.kafka_common.events import OrderEvent
+from libs.kafka_common.serdes_json import serialize_event
+
+from .publisher import OrderEventPublisher
+
+_FRAME = struct.Struct("<II")
+_U8 = struct.Struct("<B")
+_U16 = struct.Struct("<H")
+
+
+class OutboxError(RuntimeError):
+    """Raised when events could not be written to the outbox."""
+
+
+class OutboxCorrupt(OutboxError):
+    """Raised when a record in the outbox fails its CRC check; the relay can't get past it."""
+
+
+class OutboxRecord(NamedTuple):
+    key: str
+    value: bytes
+    headers: List[Tuple[str, bytes]]
+
+
+def event_record(event: OrderEvent) -> OutboxRecord:
+    """The Kafka message publish_* would send for the event, as an outbox record."""
+    return OutboxRecord(event.order_id, serialize_event(event), event_headers(event))
+
+
+def _encode(record: OutboxRecord) -> bytes:
+    key = record.key.encode("utf-8")
+    parts = [_U16.pack(len(key)), key, _U8.pack(len(record.headers))]
+    for name, value in record.headers:
+        raw_name = name.encode("utf-8")
+        parts += [_U8.pack(len(raw_name)), raw_name, _U16.pack(len(value)), value]
+    parts.append(record.value)
+    payload = b"".join(parts)
+    return _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _decode(payload: bytes) -> OutboxRecord:
+    pos = 0
+    (key_len,) = _U16.unpack_from(payload, pos)
+    pos += _U16.size
+    key = payload[pos:pos + key_len].decode("utf-8")
+    pos += key_len
+    (count,) = _U8.unpack_from(payload, pos)
+    pos += _U8.size
+    headers = []
+    for _ in range(count):
+        (name_len,) = _U8.unpack_from(payload, pos)
+        pos += _U8.size
+        name = payload[pos:pos + name_len].decode("utf-8")
+        pos += name_len
+        (value_len,) = _U16.unpack_from(payload, pos)
+        pos += _U16.size
+        headers.append((name, payload[pos:pos + value_len]))
+        pos += value_len
+    return OutboxRecord(key, payload[pos:], headers)
+
+
+class Outbox:
+    """
+    Append-only event log plus its delivered-position cursor (see module docstring).
+    Thread-safe: request threads append, the relay reads and commits.
+    fsync=True makes every append durable before it returns (one fsync per append() call,
+    however many records it holds).
+    """
+
+    def __init__(self, path: str, fsync: bool = True, compact_bytes: int = 64 * 2**20) -> None:
+        self.path = path
+        self.cursor_path = f"{path}.cursor"
+        self.fsync = fsync
+        self.compact_bytes = compact_bytes
+        self._cond = threading.Condition()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._committed = self._read_cursor()
+        self._file = open(path, "ab+")
+        self._end = self._recover()
+        if self._committed > self._end:
+            self._committed = self._end
+        self.appended = 0
+
+    def _read_cursor(self) -> int:
+        try:
+            with open(self.cursor_path) as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _write_cursor(self, pos: int) -> None:
+        tmp = f"{self.cursor_path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(str(pos))
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, self.cursor_path)
+
+    def _recover(self) -> int:
+        """End of the last complete record after the cursor; anything after it is cut off."""
+        size = os.path.getsize(self.path)
+        pos = min(self._committed, size)
+        with open(self.path, "rb") as f:
+            f.seek(pos)
+            while True:
+                frame = f.read(_FRAME.size)
+                if len(frame) < _FRAME.size:
+                    break
+                length, crc = _FRAME.unpack(frame)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    break
+                pos += _FRAME.size + length
+        if pos < size:
+            print(f"Outbox {self.path}: dropping {size - pos} bytes of a torn record")
+            self._file.truncate(pos)
+        return pos
+
+    @property
+    def committed(self) -> int:
+        """File position up to which every record has been delivered."""
+        return self._committed
+
+    @property
+    def end(self) -> int:
+        return self._end
+
+    @property
+    def pending_bytes(self) -> int:
+        return self._end - self._committed
+
+    def append(self, records: Sequence[OutboxRecord]) -> None:
+        """Appends records as one write; durable on return when fsync is on. Raises OutboxError."""
+        data = b"".join(_encode(r) for r in records)
+        with self._cond:
+            self._file.seek(0, os.SEEK_END)
+            try:
+                self._file.write(data)
+                self._file.flush()
+                if self.fsync:
+                    os.fsync(self._file.fileno())
+            except OSError as e:
+                # don't leave a partial record in front of later appends
+                self._file.truncate(self._end)
+                raise OutboxError(f"Could not write to outbox {self.path}: {e}") from e
+            self._end += len(data)
+            self.appended += len(records)
+            self._cond.notify_all()
+
+    def append_events(self, events: Iterable[OrderEvent]) -> None:
+        self.append([event_record(e) for e in events])
+
+    def read(self, pos: int, max_records: int) -> List[Tuple[int, OutboxRecord]]:
+        """Up to max_records records from file position pos, each with the position after it."""
+        end = self._end
+        out: List[Tuple[int, OutboxRecord]] = []
+        if pos >= end or max_records <= 0:
+            return out
+        with open(self.path, "rb") as f:
+            f.seek(pos)
+            while pos < end and len(out) < max_records:
+                length, crc = _FRAME.unpack(f.read(_FRAME.size))
+                payload = f.read(length)
+                if zlib.crc32(payload) != crc:
+                    raise OutboxCorrupt(f"Outbox {self.path}: corrupt record at {pos}")
+                pos += _FRAME.size + length
+                out.append((pos, _decode(payload)))
+        return out
+
+    def wait(self, pos: int, timeout: float) -> bool:
+        """Waits until there are records past pos; False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._end > pos, timeout)
+
+    def notify(self) -> None:
+        with self._cond:
+            self._cond.notify_all()
+
+    def commit(self, pos: int) -> int:
+        """
+        Records that everything before pos is delivered. Returns the position to continue reading
+        from, which is 0 when the drained file was compacted.
+        """
+        with self._cond:
+            if pos == self._end and self._end >= self.compact_bytes:
+                self._file.truncate(0)
+                self._end = 0
+                pos = 0
+            if pos != self._committed:
+                self._write_cursor(pos)
+                self._committed = pos
+            return pos
+
+    def close(self) -> None:
+        with self._cond:
+            self._file.close()
+
+
+class OutboxRelay:
+    """
+    Background thread publishing outbox records through OrderEventPublisher in batches of up to
+    batch_size, committing the outbox cursor after each batch.
+
+    Per-order ordering: a batch carries at most one record per order, the oldest undelivered one,
+    so a record is only sent after every earlier record of its order was delivered. An order
+    whose record failed is left out of batches for an exponential backoff (up to max_backoff_sec)
+    while the other orders keep going at full speed; the whole relay only backs off when a batch
+    delivered nothing (the broker is down). The cursor only advances up to the oldest
+    undelivered record.
+
+    Only undelivered records are kept in memory, up to max_window_bytes of them, so an order
+    whose events keep failing holds the cursor back but not the delivery of later records.
+    A corrupt record (OutboxCorrupt) stops the relay: it is kept in `error`, and the records
+    from it on stay in the outbox for an operator to deal with.
+    """
+
+    def __init__(
+        self,
+        outbox: Outbox,
+        publisher: OrderEventPublisher,
+        batch_size: int = 1000,
+        retry_backoff_ms: int = 200,
+        max_backoff_sec: float = 5.0,
+        idle_wait_sec: float = 0.5,
+        max_window_bytes: int = 16 * 2**20,
+    ) -> None:
+        self.outbox = outbox
+        self.publisher = publisher
+        self.batch_size = batch_size
+        self.retry_backoff_ms = retry_backoff_ms
+        self.max_backoff_sec = max_backoff_sec
+        self.idle_wait_sec = idle_wait_sec
+        self.max_window_bytes = max_window_bytes
+        # (file position of the record, position after it, record) for records read but not yet
+        # delivered, in file order
+        self._pending: List[Tuple[int, int, OutboxRecord]] = []
+        self._pending_bytes = 0
+        # order id -> (monotonic time of its next attempt, consecutive failures)
+        self._retry_at: Dict[str, Tuple[float, int]] = {}
+        self._read_pos = outbox.committed
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.delivered = 0
+        self.failed = 0
+        self.error: Optional[OutboxCorrupt] = None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="cart-outbox-relay", daemon=True)
+        self._thread.start()
+
+    def stop(self, drain_timeout_sec: float = 5.0) -> None:
+        """Stops the relay after trying to deliver what is pending for up to drain_timeout_sec."""
+        deadline = time.monotonic() + drain_timeout_sec
+        while self.outbox.pending_bytes and time.monotonic() < deadline and self._thread and self._thread.is_alive():
+            time.sleep(0.01)
+        self._stop.set()
+        self.outbox.notify()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        failures = 0
+        while not self._stop.is_set():
+            try:
+                sent, failed = self.relay_once()
+            except OutboxCorrupt as e:
+                self.error = e
+                print(f"Outbox relay stopped: {e}")
+                return
+            except Exception as e:
+                print(f"Outbox relay failed: {e}")
+                sent, failed = 0, 1
+            if failed and not sent:
+                failures += 1
+                self._stop.wait(self._backoff_sec(failures))
+            else:
+                failures = 0
+                if not sent:
+                    self._idle()
+
+    def _backoff_sec(self, failures: int) -> float:
+        return min(self.max_backoff_sec, self.retry_backoff_ms * 2 ** (failures - 1) / 1000.0)
+
+    def _idle(self) -> None:
+        """Nothing could be sent: waits for new records, or until the first order in backoff is due."""
+        timeout = self.idle_wait_sec
+        if self._retry_at:
+            timeout = max(0.0, min(timeout, min(at for at, _ in self._retry_at.values()) - time.monotonic()))
+        if self._read_pos < self.outbox.end:
+            # unread records, but the window is full of orders in backoff
+            self._stop.wait(timeout)
+        else:
+            self.outbox.wait(self._read_pos, timeout)
+
+    def _refill(self) -> None:
+        while self._pending_bytes < self.max_window_bytes:
+            records = self.outbox.read(self._read_pos, self.batch_size)
+            if not records:
+                return
+            for pos, record in records:
+                self._pending.append((self._read_pos, pos, record))
+                self._pending_bytes += pos - self._read_pos
+                self._read_pos = pos
+
+    def relay_once(self) -> Tuple[int, int]:
+        """Publishes one batch and waits for it. Returns (delivered, failed) record counts."""
+        self._refill()
+        now = time.monotonic()
+        batch: List[Tuple[int, int, OutboxRecord]] = []
+        keys: Set[str] = set()
+        for entry in self._pending:
+            key = entry[2].key
+            if key in keys:
+                continue
+            keys.add(key)
+            retry = self._retry_at.get(key)
+            if retry is not None and retry[0] > now:
+                continue  # in backoff; its later records wait too
+            batch.append(entry)
+            if len(batch) == self.batch_size:
+                break
+        if not batch:
+            return 0, 0
+
+        futures = []
+        sent: List[Tuple[int, int, OutboxRecord]] = []
+        for entry in batch:
+            record = entry[2]
+            try:
+                futures.append(self.publisher.enqueue_serialized(record.key, record.value, record.headers))
+            except Exception as e:
+                print(f"Outbox relay could not enqueue: {e}")
+                break
+            sent.append(entry)
+        outcomes = self.publisher.wait_for_delivery(futures, return_exceptions=True) if futures else []
+
+        done: Set[int] = set()
+        retry_at = self._retry_at
+        for (start, end, record), err in zip(sent, outcomes):
+            if err is None:
+                done.add(start)
+                self._pending_bytes -= end - start
+                retry_at.pop(record.key, None)
+            else:
+                failures = retry_at[record.key][1] + 1 if record.key in retry_at else 1
+                retry_at[record.key] = (now + self._backoff_sec(failures), failures)
+        delivered = len(done)
+        failed = len(batch) - delivered
+        self.delivered += delivered
+        self.failed += failed
+
+        if done:
+            self._pending = [entry for entry in self._pending if entry[0] not in done]
+            # everything before the oldest undelivered record (or everything read) is delivered
+            committed = self._pending[0][0] if self._pending else self._read_pos
+            if committed > self.outbox.committed:
+                restart = self.outbox.commit(committed)
+                if restart != committed:
+                    self._read_pos = restart  # compacted; nothing is pending at this point
+        return delivered, failed
@@ -1,14 +1,19 @@
 from __future__ import annotations
 
+import asyncio
+import threading
 import time
-from typing import Optional
+from concurrent.futures import Future, InvalidStateError, wait
+from typing import Any, Iterable, List, Optional, Tuple
 
-from confluent_kafka import Producer, KafkaException
+from confluent_kafka import Producer, KafkaError, KafkaException
 
 from libs.kafka_common.config import ORDERS_TOPIC
 from libs.kafka_common.kafka_factory import create_producer
 from libs.kafka_common.serdes_json import serialize_event
-from libs.kafka_common.events import OrderCreatedEvent, OrderStatusUpdatedEvent
+from libs.kafka_common.event_headers import event_headers
+from libs.kafka_common.events import OrderCreatedEvent, OrderStatusUpdatedEvent, OrderEvent
+from libs.kafka_common.metrics import PUBLISH_BUCKETS_SEC, Registry
 from libs.kafka_common.models import Order, OrderStatus
 
 
@@ -28,54 +33,258 @@ class ProducerQueueFull(KafkaPublishError):
     """Raised when local producer queue is full (BufferError)."""
 
 
+_TIMEOUT_ERROR_CODES = {KafkaError._MSG_TIMED_OUT, KafkaError._TIMED_OUT, KafkaError.REQUEST_TIMED_OUT}
+_BROKER_ERROR_CODES = {KafkaError._ALL_BROKERS_DOWN, KafkaError._TRANSPORT, KafkaError._RESOLVE}
+
+
+def _delivery_error(err: KafkaError) -> KafkaPublishError:
+    """Maps a delivery report error onto the publisher's exception hierarchy."""
+    if err.code() in _TIMEOUT_ERROR_CODES:
+        return KafkaTimeout(f"Delivery timeout: {err.str()}")
+    if err.code() in _BROKER_ERROR_CODES:
+        return KafkaBrokersUnavailable(err.str())
+    return KafkaPublishError(f"Delivery failed: {err.str()}")
+
+
 class OrderEventPublisher:
-    def __init__(self, producer: Optional[Producer] = None,topic: str = ORDERS_TOPIC,max_retries: int = 3,retry_backoff_ms: int = 200,flush_timeout_sec: float = 10.0):
-        self.producer = producer or create_producer()
+    """
+    Publishes order events to Kafka.
+
+    Every message is produced with a delivery callback that resolves a Future, so callers can
+    either block on the delivery (publish_*) or enqueue and track it themselves (enqueue_*).
+    In pipelined mode a background thread services producer.poll() and waiting callers never
+    flush the whole producer queue, which lets linger.ms batch concurrent requests together.
+
+    Publish latency (produce() to delivery report), retries, failed deliveries, the producer queue
+    depth and the messages in flight are recorded in metrics.
+    """
+
+    def __init__(self, producer: Optional[Producer] = None,topic: str = ORDERS_TOPIC,max_retries: int = 3,retry_backoff_ms: int = 200,flush_timeout_sec: float = 10.0,pipelined: bool = False,poll_interval_sec: float = 0.05,metrics: Optional[Registry] = None):
+        self.producer = producer if producer is not None else create_producer()
         self.topic = topic
         self.max_retries = max_retries
         self.retry_backoff_ms = retry_backoff_ms
         self.flush_timeout_sec = flush_timeout_sec
+        self.pipelined = pipelined
+        self.poll_interval_sec = poll_interval_sec
 
+        self._in_flight = 0
+        self._in_flight_lock = threading.Lock()
+        self._poller: Optional[threading.Thread] = None
+        self._poller_stop = threading.Event()
 
-    def _produce(self,*, key: str,value: bytes) -> None:
+        self.metrics = metrics if metrics is not None else Registry()
+        self._publish_seconds = self.metrics.histogram(
+            "cart_publish_latency_seconds", "Time from produce() to the delivery report", buckets=PUBLISH_BUCKETS_SEC
+        )
+        self._delivery_failures = self.metrics.counter("cart_publish_delivery_failures_total", "Delivery reports with an error")
+        self._retries = self.metrics.counter("cart_publish_retries_total", "produce() attempts retried after BufferError or KafkaException")
+        self.metrics.gauge("cart_producer_queue_depth", "Messages in the producer queue (len(producer))", lambda: len(self.producer))
+        self.metrics.gauge("cart_publish_in_flight", "Messages produced whose delivery report has not arrived", lambda: self._in_flight)
+        if pipelined:
+            self.start()
+
+    @property
+    def in_flight(self) -> int:
+        """Number of messages handed to the producer whose delivery report has not arrived yet."""
+        return self._in_flight
+
+    def start(self) -> None:
+        """Starts the background poller thread (idempotent)."""
+        if self._poller and self._poller.is_alive():
+            return
+        self._poller_stop.clear()
+        self._poller = threading.Thread(target=self._poll_loop, name="order-publisher-poller", daemon=True)
+        self._poller.start()
+
+    def close(self, timeout: Optional[float] = None) -> int:
+        """Stops the poller and flushes outstanding messages. Returns the number still queued."""
+        self._poller_stop.set()
+        if self._poller:
+            self._poller.join(timeout=5)
+            self._poller = None
+        return self.producer.flush(self.flush_timeout_sec if timeout is None else timeout)
+
+    def _poller_running(self) -> bool:
+        return self._poller is not None and self._poller.is_alive()
+
+    def _poll_loop(self) -> None:
+        while not self._poller_stop.is_set():
+            try:
+                self.producer.poll(self.poll_interval_sec)
+            except Exception as e:
+                print(f"Producer poll failed: {e}")
+                self._poller_stop.wait(self.retry_backoff_ms / 1000.0)
+
+    def _on_delivery(self, future: Future, result: Any, started: float, err: Optional[KafkaError], msg: Any) -> None:
+        with self._in_flight_lock:
+            self._in_flight -= 1
+        self._publish_seconds.observe(time.perf_counter() - started)
+        try:
+            if err is not None:
+                self._delivery_failures.inc()
+                future.set_exception(_delivery_error(err))
+            else:
+                future.set_result(result)
+        except InvalidStateError:
+            # The caller cancelled the future; nothing left to report.
+            pass
+
+    def _try_enqueue(self, key: str, value: bytes, result: Any, headers: Optional[List[Tuple[str, bytes]]] = None) -> Future:
+        """Single produce attempt; raises BufferError/KafkaException for the retry loops."""
+        future: Future = Future()
+        if not self._poller_running():
+            self.producer.poll(0)
+        with self._in_flight_lock:
+            self._in_flight += 1
+        started = time.perf_counter()
+        try:
+            self.producer.produce(
+                topic=self.topic,
+                key=key.encode("utf-8"),
+                value=value,
+                headers=headers,
+                on_delivery=lambda err, msg: self._on_delivery(future, result, started, err, msg),
+            )
+        except BaseException:
+            with self._in_flight_lock:
+                self._in_flight -= 1
+            raise
+        return future
+
+    @staticmethod
+    def _retries_exhausted(last_err: Optional[Exception]) -> KafkaPublishError:
+        if isinstance(last_err, BufferError):
+            return ProducerQueueFull(str(last_err))
+        if isinstance(last_err, KafkaException):
+            return KafkaBrokersUnavailable(str(last_err))
+        return KafkaPublishError(f"Failed to publish after retries: {last_err}")
+
+    def _enqueue(self, *, key: str, value: bytes, result: Any = None, headers: Optional[List[Tuple[str, bytes]]] = None) -> Future:
+        """
+        Hands one message to the producer without waiting for the broker.
+        The returned Future resolves to `result` once the delivery report arrives.
+        """
         last_err: Optional[Exception] = None
         for attempt in range(1, (self.max_retries + 1)):
             try:
-                self.producer.poll(0)
-                self.producer.produce(topic=self.topic,key=key.encode("utf-8"),value=value)
-                remaining = self.producer.flush(self.flush_timeout_sec)
-                if remaining != 0:
-                    raise KafkaTimeout(f"Flush timeout: {remaining} message(s) pending")
-                return
-            except BufferError as e:
-                last_err = e
-                time.sleep(self.retry_backoff_ms * attempt / 1000.0)
-            except KafkaException as e:
+                return self._try_enqueue(key, value, result, headers)
+            except Exception as e:
                 last_err = e
-                time.sleep(self.retry_backoff_ms * attempt / 1000.0)
-            except KafkaPublishError:
-                raise
+                if attempt < self.max_retries:
+                    self._retries.inc()
+                    time.sleep(self.retry_backoff_ms * attempt / 1000.0)
+        raise self._retries_exhausted(last_err) from last_err
+
+    async def _enqueue_async(self, *, key: str, value: bytes, result: Any = None, headers: Optional[List[Tuple[str, bytes]]] = None) -> Future:
+        """Like _enqueue, but backs off with asyncio.sleep so the event loop is never blocked."""
+        last_err: Optional[Exception] = None
+        for attempt in range(1, (self.max_retries + 1)):
+            try:
+                return self._try_enqueue(key, value, result, headers)
             except Exception as e:
                 last_err = e
-                time.sleep(self.retry_backoff_ms * attempt / 1000.0)
+                if attempt < self.max_retries:
+                    self._retries.inc()
+                    await asyncio.sleep(self.retry_backoff_ms * attempt / 1000.0)
+        raise self._retries_exhausted(last_err) from last_err
 
-        if isinstance(last_err, BufferError):
-            raise ProducerQueueFull(str(last_err)) from last_err
-        if isinstance(last_err, KafkaException):
-            raise KafkaBrokersUnavailable(str(last_err)) from last_err
-        raise KafkaPublishError(f"Failed to publish after retries: {last_err}") from last_err
+    @staticmethod
+    def _outcomes(futures: List[Future], return_exceptions: bool) -> List[Optional[BaseException]]:
+        pending = sum(1 for f in futures if not f.done())
+        outcomes: List[Optional[BaseException]] = [
+            f.exception() if f.done() else KafkaTimeout("Delivery timeout: message still pending")
+            for f in futures
+        ]
+        if not return_exceptions:
+            if pending:
+                raise KafkaTimeout(f"Delivery timeout: {pending} message(s) pending")
+            for err in outcomes:
+                if err is not None:
+                    raise err
+        return outcomes
 
-    def publish_order_created(self, order: Order) -> OrderCreatedEvent:
-        event = OrderCreatedEvent(order_id = order.order_id, order=order)
-        self._produce(key=event.order_id,value=serialize_event(event))
-        return event
+    def wait_for_delivery(self, futures: Iterable[Future], timeout: Optional[float] = None, return_exceptions: bool = False) -> List[Optional[BaseException]]:
+        """
+        Blocks until every future has a delivery report or the timeout expires.
+        Without a running poller this falls back to producer.flush() to serve the callbacks.
 
-    def publish_order_status_updated(self, order_id: str, status: OrderStatus) -> OrderStatusUpdatedEvent:
-        event = OrderStatusUpdatedEvent(order_id=order_id, status=status)
-        self._produce(key=event.order_id,value=serialize_event(event))
-        return event
+        By default the first failure is raised. With return_exceptions=True the per-future
+        outcome is returned instead (None on success, KafkaTimeout for undelivered messages).
+        """
+        futures = list(futures)
+        timeout = self.flush_timeout_sec if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        if not self._poller_running():
+            remaining = self.producer.flush(timeout)
+            if remaining != 0 and not return_exceptions and not all(f.done() for f in futures):
+                raise KafkaTimeout(f"Flush timeout: {remaining} message(s) pending")
+
+        wait(futures, timeout=max(0.0, deadline - time.monotonic()))
 
+        return self._outcomes(futures, return_exceptions)
 
+    async def wait_for_delivery_async(self, futures: Iterable[Future], timeout: Optional[float] = None, return_exceptions: bool = False) -> List[Optional[BaseException]]:
+        """
+        Awaitable counterpart of wait_for_delivery. In pipelined mode the background poller serves
+        the delivery reports; otherwise wait_for_delivery (and its producer.flush()) runs on a
+        worker thread, so the event loop is never blocked.
+        """
+        futures = list(futures)
+        timeout = self.flush_timeout_sec if timeout is None else timeout
+        if not self._poller_running():
+            return await asyncio.to_thread(self.wait_for_delivery, futures, timeout, return_exceptions)
 
+        if futures:
+            await asyncio.wait([asyncio.wrap_future(f) for f in futures], timeout=timeout)
+
+        return self._outcomes(futures, return_exceptions)
+
+    def _produce(self,*, key: str,value: bytes) -> None:
+        self.wait_for_delivery([self._enqueue(key=key, value=value)])
+
+    def _enqueue_event(self, event: OrderEvent) -> Future:
+        """Enqueues an event keyed by order_id, with its routing headers (see event_headers)."""
+        return self._enqueue(key=event.order_id, value=serialize_event(event), result=event, headers=event_headers(event))
+
+    async def _enqueue_event_async(self, event: OrderEvent) -> Future:
+        return await self._enqueue_async(key=event.order_id, value=serialize_event(event), result=event, headers=event_headers(event))
+
+    def enqueue_serialized(self, key: str, value: bytes, headers: Optional[List[Tuple[str, bytes]]] = None) -> Future:
+        """Enqueues an already serialized event (e.g. read back from the outbox); the Future resolves to None."""
+        return self._enqueue(key=key, value=value, headers=headers)
+
+    def enqueue_order_created(self, order: Order) -> Future:
+        """Fire-and-track variant of publish_order_created; the Future resolves to the event."""
+        return self._enqueue_event(OrderCreatedEvent(order_id = order.order_id, order=order))
+
+    def enqueue_order_status_updated(self, order_id: str, status: OrderStatus) -> Future:
+        """Fire-and-track variant of publish_order_status_updated; the Future resolves to the event."""
+        return self._enqueue_event(OrderStatusUpdatedEvent(order_id=order_id, status=status))
+
+    async def enqueue_order_created_async(self, order: Order) -> Future:
+        return await self._enqueue_event_async(OrderCreatedEvent(order_id = order.order_id, order=order))
+
+    async def enqueue_order_status_updated_async(self, order_id: str, status: OrderStatus) -> Future:
+        return await self._enqueue_event_async(OrderStatusUpdatedEvent(order_id=order_id, status=status))
+
+    def publish_order_created(self, order: Order) -> OrderCreatedEvent:
+        future = self.enqueue_order_created(order)
+        self.wait_for_delivery([future])
+        return future.result()
+
+    def publish_order_status_updated(self, order_id: str, status: OrderStatus) -> OrderStatusUpdatedEvent:
+        future = self.enqueue_order_status_updated(order_id, status)
+        self.wait_for_delivery([future])
+        return future.result()
 
+    async def publish_order_created_async(self, order: Order) -> OrderCreatedEvent:
+        future = await self.enqueue_order_created_async(order)
+        await self.wait_for_delivery_async([future])
+        return future.result()
 
+    async def publish_order_status_updated_async(self, order_id: str, status: OrderStatus) -> OrderStatusUpdatedEvent:
+        future = await self.enqueue_order_status_updated_async(order_id, status)
+        await self.wait_for_delivery_async([future])
+        return future.result()
@@ -1,20 +1,74 @@
 from __future__ import annotations
-from typing import Dict, Optional
 
-from libs.kafka_common.models import Order
+import threading
+from typing import Dict, List, Optional
+
+from libs.kafka_common.models import Order, OrderStatus
+
+
+class _Shard:
+    __slots__ = ("lock", "orders")
 
-class OrderStoreMemory:
     def __init__(self) -> None:
-        self._orders: Dict[str, Order] = {}
+        self.lock = threading.Lock()
+        self.orders: Dict[str, Order] = {}
+
+
+class OrderStoreMemory:
+    """
+    In-memory cart orders, split into `shards` dicts with one lock each (lock striping), so
+    threadpool workers touching different orders rarely contend. Check-then-act operations
+    (add_if_absent, compare_and_set_status) are atomic per order. Stored orders are replaced,
+    never mutated, by the status operations, so an order returned by get() doesn't change
+    while it is being published.
+    """
+
+    def __init__(self, shards: int = 64) -> None:
+        if shards < 1:
+            raise ValueError("shards must be >= 1")
+        self._shards: List[_Shard] = [_Shard() for _ in range(shards)]
+
+    def _shard(self, order_id: str) -> _Shard:
+        return self._shards[hash(order_id) % len(self._shards)]
 
     def add(self, order: Order) -> None:
-        self._orders[order.order_id] = order
+        shard = self._shard(order.order_id)
+        with shard.lock:
+            shard.orders[order.order_id] = order
+
+    def add_if_absent(self, order: Order) -> bool:
+        """Stores the order unless one with its id exists; True if it was stored."""
+        shard = self._shard(order.order_id)
+        with shard.lock:
+            if order.order_id in shard.orders:
+                return False
+            shard.orders[order.order_id] = order
+            return True
 
     def get(self, order_id: str) -> Optional[Order]:
-        return self._orders.get(order_id)
+        # a single dict lookup is atomic; no lock needed
+        return self._shard(order_id).orders.get(order_id)
 
     def exists(self, order_id: str) -> bool:
-        return order_id in self._orders
+        return order_id in self._shard(order_id).orders
+
+    def remove(self, order_id: str) -> None:
+        shard = self._shard(order_id)
+        with shard.lock:
+            shard.orders.pop(order_id, None)
 
     def update(self, order: Order) -> None:
-        self._orders[order.order_id] = order
+        self.add(order)
+
+    def compare_and_set_status(self, order_id: str, expected: OrderStatus, new_status: OrderStatus) -> bool:
+        """Sets the status only if it is still `expected` (stores an updated copy); True on success."""
+        shard = self._shard(order_id)
+        with shard.lock:
+            order = shard.orders.get(order_id)
+            if order is None or order.status != expected:
+                return False
+            shard.orders[order_id] = order.model_copy(update={"status": new_status})
+            return True
+
+    def __len__(self) -> int:
+        return sum(len(shard.orders) for shard in self._shards)
@@ -0,0 +1,42 @@
+"""Test doubles shared by the cart service tests."""
+import time
+
+
+class FakeProducer:
+    """Queues messages and fires delivery callbacks on poll()/flush(), like librdkafka."""
+
+    def __init__(self, deliver=True, error=None, buffer_full=False):
+        self.deliver = deliver
+        self.error = error
+        self.buffer_full = buffer_full
+        self.produced = []
+        self.headers = []
+        self._pending = []
+        self.flush_calls = 0
+
+    def produce(self, topic, key=None, value=None, on_delivery=None, headers=None, **kwargs):
+        if self.buffer_full:
+            raise BufferError("Local: Queue full")
+        self.produced.append((topic, key, value))
+        self.headers.append(headers)
+        self._pending.append(on_delivery)
+
+    def poll(self, timeout=None):
+        if not self.deliver or not self._pending:
+            if timeout:
+                time.sleep(timeout)
+            return 0
+        served = 0
+        while self._pending:
+            cb = self._pending.pop(0)
+            cb(self.error, None)
+            served += 1
+        return served
+
+    def flush(self, timeout=None):
+        self.flush_calls += 1
+        self.poll(0)
+        return len(self._pending)
+
+    def __len__(self):
+        return len(self._pending)
@@ -0,0 +1,124 @@
+import asyncio
+import time
+
+import pytest
+from confluent_kafka import KafkaError
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from libs.kafka_common.models import OrderStatus
+from services.cart_service.admission import AdmissionController, Overloaded
+from services.cart_service.app.api.routes import router, get_order_generator
+from services.cart_service.order_generator import OrderGenerator
+from services.cart_service.publisher import KafkaTimeout, OrderEventPublisher
+from services.cart_service.store_memory import OrderStoreMemory
+from services.cart_service.tests.fakes import FakeProducer
+
+
+def make_controller(producer=None, **kwargs):
+    publisher = OrderEventPublisher(producer=producer if producer is not None else FakeProducer(), retry_backoff_ms=0, flush_timeout_sec=0.05)
+    return AdmissionController(publisher, **kwargs)
+
+
+def test_requests_over_the_limit_are_rejected_until_a_slot_frees():
+    controller = make_controller(initial_limit=4, min_limit=1)
+    for _ in range(4):
+        controller.acquire()
+
+    with pytest.raises(Overloaded) as e:
+        controller.acquire()
+    assert e.value.retry_after_sec >= 1
+
+    controller.release(1, latency_sec=0.01, failed=False)
+    controller.acquire()
+    assert controller.active == 4
+    assert controller.rejected == 1
+
+
+def test_limit_grows_on_fast_deliveries_and_shrinks_on_slow_ones():
+    controller = make_controller(initial_limit=10, min_limit=2, target_latency_ms=100)
+    for _ in range(20):
+        controller.acquire()
+        controller.release(1, latency_sec=0.01, failed=False)
+    assert controller.limit == 11
+
+    controller.acquire()
+    controller.release(1, latency_sec=0.5, failed=False)
+    assert controller.limit == 8
+    # a second slow delivery right away belongs to the same slowdown
+    controller.acquire()
+    controller.release(1, latency_sec=0.5, failed=False)
+    assert controller.limit == 8
+
+
+def test_full_producer_queue_sheds_load():
+    producer = FakeProducer(deliver=False)
+    controller = make_controller(producer, max_queue_depth=3)
+    for n in range(3):
+        controller.publisher.enqueue_order_status_updated(f"ORD-{n}", OrderStatus.CONFIRMED)
+
+    with pytest.raises(Overloaded, match="3 undelivered"):
+        controller.acquire()
+
+
+def test_publish_failures_count_as_slow_and_other_errors_are_neutral():
+    controller = make_controller(initial_limit=10, target_latency_ms=1000)
+    with pytest.raises(KafkaTimeout):
+        with controller.admit():
+            raise KafkaTimeout("slow broker")
+    assert controller.limit == 7
+
+    with pytest.raises(ValueError):
+        with controller.admit():
+            raise ValueError("409")
+    assert controller.limit == 7 and controller.active == 0
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_failed_deliveries_in_a_batch_count_as_failures(use_async):
+    publisher = OrderEventPublisher(producer=FakeProducer(error=KafkaError(KafkaError._ALL_BROKERS_DOWN)), retry_backoff_ms=0)
+    controller = AdmissionController(publisher, initial_limit=10, target_latency_ms=1000)
+    generator = OrderGenerator(publisher=publisher, store=OrderStoreMemory(), admission=controller)
+    requests = [("1", 1), ("2", 1)]
+
+    results = asyncio.run(generator.create_orders_async(requests)) if use_async else generator.create_orders(requests)
+
+    assert all(err is not None for _, err in results)
+    assert controller.limit == 7 and controller.active == 0
+
+
+def test_batch_latency_is_measured_from_enqueue_not_from_staging():
+    publisher = OrderEventPublisher(producer=FakeProducer(), retry_backoff_ms=0)
+    controller = AdmissionController(publisher, initial_limit=10, target_latency_ms=50)
+    generator = OrderGenerator(publisher=publisher, store=OrderStoreMemory(), admission=controller)
+    stage_order = generator._stage_order
+
+    def slow_stage_order(order_id, num_of_items):
+        time.sleep(0.1)
+        return stage_order(order_id, num_of_items)
+
+    generator._stage_order = slow_stage_order
+    generator.create_orders([("1", 1)])
+
+    assert controller.limit == 10 and controller.stats()["latency_ms"] < 50
+
+
+def test_api_returns_429_with_retry_after_and_stores_nothing():
+    producer = FakeProducer(deliver=False)
+    publisher = OrderEventPublisher(producer=producer, retry_backoff_ms=0, flush_timeout_sec=0.05)
+    store = OrderStoreMemory()
+    generator = OrderGenerator(publisher=publisher, store=store, admission=AdmissionController(publisher, max_queue_depth=1))
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_order_generator] = lambda: generator
+    client = TestClient(app)
+
+    # the first order is admitted but never delivered, so it stays in the producer queue
+    assert client.post("/create-order", json={"orderId": "1", "numberOfItems": 1}).status_code == 503
+    r = client.post("/create-order", json={"orderId": "2", "numberOfItems": 1})
+    batch = client.post("/create-orders", json={"orders": [{"orderId": "3", "numberOfItems": 1}]})
+
+    assert r.status_code == 429
+    assert int(r.headers["Retry-After"]) >= 1
+    assert batch.status_code == 429
+    assert not store.exists("ORD-2") and not store.exists("ORD-3")
@@ -0,0 +1,82 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from libs.kafka_common.serdes_json import deserialize_event
+from services.cart_service.app.api.routes import router, get_metrics, get_order_generator
+from services.cart_service.order_generator import OrderGenerator
+from services.cart_service.publisher import OrderEventPublisher
+from services.cart_service.store_memory import OrderStoreMemory
+from services.cart_service.tests.fakes import FakeProducer
+
+
+def make_client(producer=None, flush_timeout_sec=1.0):
+    producer = producer if producer is not None else FakeProducer()
+    generator = OrderGenerator(
+        publisher=OrderEventPublisher(
+            producer=producer, retry_backoff_ms=0, flush_timeout_sec=flush_timeout_sec, poll_interval_sec=0.001,
+        ),
+        store=OrderStoreMemory(),
+    )
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_order_generator] = lambda: generator
+    return TestClient(app), producer, generator
+
+
+def test_create_order_publishes_event():
+    client, producer, _ = make_client()
+
+    r = client.post("/create-order", json={"orderId": "12", "numberOfItems": 2})
+
+    assert r.status_code == 200
+    assert r.json()["orderId"] == "ORD-12"
+    assert deserialize_event(producer.produced[0][2]).order.order_id == "ORD-12"
+
+
+def test_create_orders_reports_duplicates():
+    client, producer, generator = make_client()
+    client.post("/create-order", json={"orderId": "1", "numberOfItems": 1})
+
+    r = client.post("/create-orders", json={"orders": [
+        {"orderId": "1", "numberOfItems": 1},
+        {"orderId": "2", "numberOfItems": 3},
+        {"orderId": "ORD-2", "numberOfItems": 1},
+        {"orderId": "3", "numberOfItems": 2},
+    ]})
+
+    assert r.status_code == 200
+    body = r.json()
+    assert [(x["orderId"], x["status"]) for x in body["results"]] == [
+        ("ORD-1", 409), ("ORD-2", 200), ("ORD-2", 409), ("ORD-3", 200),
+    ]
+    assert body["created"] == 2 and body["failed"] == 2
+    assert len(producer.produced) == 3
+    assert generator.store.exists("ORD-3")
+
+
+def test_create_orders_reports_undelivered_as_503():
+    client, _, _ = make_client(FakeProducer(deliver=False), flush_timeout_sec=0.01)
+
+    r = client.post("/create-orders", json={"orders": [{"orderId": "7", "numberOfItems": 1}]})
+
+    assert r.status_code == 200
+    assert r.json()["results"][0]["status"] == 503
+
+
+def test_create_orders_rejects_empty_batch():
+    client, _, _ = make_client()
+
+    r = client.post("/create-orders", json={"orders": []})
+    assert r.status_code == 422
+
+
+def test_metrics_endpoint_reports_the_publisher_metrics():
+    client, _, generator = make_client()
+    client.app.dependency_overrides[get_metrics] = lambda: generator.publisher.metrics
+    client.post("/create-order", json={"orderId": "1", "numberOfItems": 1})
+
+    r = client.get("/metrics")
+
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "cart_publish_latency_seconds_count 1" in r.text
@@ -0,0 +1,15 @@
+from services.cart_service.order_generator import OrderGenerator
+
+
+def test_seeded_generation_is_reproducible_and_consistent():
+    first = OrderGenerator(publisher=None, store=None, seed=42)._build_order("ORD-1", 500)
+    second = OrderGenerator(publisher=None, store=None, seed=42)._build_order("ORD-1", 500)
+
+    assert first.model_dump(exclude={"order_date"}) == second.model_dump(exclude={"order_date"})
+    assert len(first.items) == 500
+    assert all(1 <= i.quantity <= 10 and 10.0 <= i.price <= 100.0 for i in first.items)
+    assert all(i.item_id.startswith("ITEM-") and len(i.item_id) == 8 for i in first.items)
+    expected_total = 0.0
+    for item in first.items:
+        expected_total += round(item.quantity * item.price, 2)
+    assert first.total_amount == expected_total
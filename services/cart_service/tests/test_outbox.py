@@ -0,0 +1,277 @@
+import threading
+import time
+
+import pytest
+from confluent_kafka import KafkaError
+
+from libs.kafka_common.events import EventType, OrderStatusUpdatedEvent
+from libs.kafka_common.models import OrderStatus
+from libs.kafka_common.serdes_json import deserialize_event
+from services.cart_service.order_generator import OrderGenerator, OrderNotFound
+from services.cart_service.outbox import Outbox, OutboxCorrupt, OutboxError, OutboxRelay, event_record
+from services.cart_service.publisher import OrderEventPublisher
+from services.cart_service.store_memory import OrderStoreMemory
+from services.cart_service.tests.fakes import FakeProducer
+
+
+def status_record(order_id, status):
+    return event_record(OrderStatusUpdatedEvent(order_id=order_id, status=status))
+
+
+def make_relay(outbox, producer=None, batch_size=100, **kwargs):
+    producer = producer if producer is not None else FakeProducer()
+    publisher = OrderEventPublisher(producer=producer, retry_backoff_ms=0, flush_timeout_sec=0.1)
+    kwargs.setdefault("retry_backoff_ms", 0)
+    return OutboxRelay(outbox, publisher, batch_size=batch_size, **kwargs), producer
+
+
+def published(producer):
+    return [(key.decode(), deserialize_event(value).status) for _, key, value in producer.produced]
+
+
+class FailFirstProducer(FakeProducer):
+    """Fails the first delivery of every message for order_id, delivers everything else."""
+
+    def __init__(self, order_id):
+        super().__init__()
+        self.order_id = order_id.encode()
+        self.failed_values = set()
+        self.delivered = []
+
+    def produce(self, topic, key=None, value=None, on_delivery=None, headers=None, **kwargs):
+        fail = key == self.order_id and value not in self.failed_values
+        if fail:
+            self.failed_values.add(value)
+
+        def report(err, msg):
+            if fail:
+                on_delivery(KafkaError(KafkaError._MSG_TIMED_OUT), None)
+            else:
+                self.delivered.append((key.decode(), deserialize_event(value).status))
+                on_delivery(None, None)
+
+        super().produce(topic, key=key, value=value, on_delivery=report, headers=headers)
+
+
+def test_relay_delivers_appended_events_and_commits_the_cursor(tmp_path):
+    path = str(tmp_path / "cart.outbox")
+    outbox = Outbox(path, fsync=False)
+    outbox.append([status_record("ORD-1", OrderStatus.CONFIRMED), status_record("ORD-2", OrderStatus.CONFIRMED)])
+    outbox.append([status_record("ORD-1", OrderStatus.SHIPPED)])
+    relay, producer = make_relay(outbox)
+
+    # one record per order per batch: ORD-1's second event waits for its first
+    assert relay.relay_once() == (2, 0)
+    assert relay.relay_once() == (1, 0)
+    assert relay.relay_once() == (0, 0)
+
+    assert published(producer) == [("ORD-1", OrderStatus.CONFIRMED), ("ORD-2", OrderStatus.CONFIRMED), ("ORD-1", OrderStatus.SHIPPED)]
+    assert producer.headers[0] is not None
+    assert outbox.pending_bytes == 0
+    outbox.close()
+    assert Outbox(path, fsync=False).pending_bytes == 0
+
+
+def test_failed_deliveries_are_retried_in_order_per_order(tmp_path):
+    outbox = Outbox(str(tmp_path / "cart.outbox"), fsync=False)
+    outbox.append([
+        status_record("ORD-1", OrderStatus.CONFIRMED),
+        status_record("ORD-2", OrderStatus.CONFIRMED),
+        status_record("ORD-1", OrderStatus.SHIPPED),
+        status_record("ORD-2", OrderStatus.SHIPPED),
+    ])
+    producer = FailFirstProducer("ORD-1")
+    relay, _ = make_relay(outbox, producer)
+
+    for _ in range(10):
+        relay.relay_once()
+
+    ord1 = [status for key, status in producer.delivered if key == "ORD-1"]
+    ord2 = [status for key, status in producer.delivered if key == "ORD-2"]
+    assert ord1 == [OrderStatus.CONFIRMED, OrderStatus.SHIPPED]
+    assert ord2 == [OrderStatus.CONFIRMED, OrderStatus.SHIPPED]
+    # ORD-2 was not held back by ORD-1's failures
+    assert producer.delivered[0] == ("ORD-2", OrderStatus.CONFIRMED)
+    assert relay.failed == 2
+    assert outbox.pending_bytes == 0
+
+
+class FailingKeyProducer(FakeProducer):
+    """Fails every delivery for order_id while `failing` is set."""
+
+    def __init__(self, order_id):
+        super().__init__()
+        self.order_id = order_id.encode()
+        self.failing = True
+
+    def produce(self, topic, key=None, value=None, on_delivery=None, headers=None, **kwargs):
+        fail = self.failing and key == self.order_id
+
+        def report(err, msg):
+            on_delivery(KafkaError(KafkaError._MSG_TIMED_OUT) if fail else None, None)
+
+        super().produce(topic, key=key, value=value, on_delivery=report, headers=headers)
+
+
+def test_an_order_that_keeps_failing_holds_the_cursor_but_not_the_other_orders(tmp_path):
+    outbox = Outbox(str(tmp_path / "cart.outbox"), fsync=False)
+    outbox.append([status_record("ORD-0", OrderStatus.CONFIRMED)])
+    outbox.append([status_record(f"ORD-{n}", OrderStatus.CONFIRMED) for n in range(1, 51)])
+    producer = FailingKeyProducer("ORD-0")
+    relay, _ = make_relay(outbox, producer, batch_size=2)
+
+    # each batch is ORD-0 (failing) plus one other order
+    for _ in range(60):
+        relay.relay_once()
+
+    # far more than the window used to hold behind a stuck head (batch_size * 4)
+    assert relay.delivered == 50
+    assert outbox.committed == 0
+
+    producer.failing = False
+    relay.relay_once()
+    assert outbox.pending_bytes == 0
+
+
+def test_an_order_in_backoff_does_not_slow_down_the_others(tmp_path):
+    outbox = Outbox(str(tmp_path / "cart.outbox"), fsync=False)
+    outbox.append([status_record("ORD-0", OrderStatus.CONFIRMED)])
+    outbox.append([status_record(f"ORD-{n}", OrderStatus.CONFIRMED) for n in range(1, 501)])
+    relay, _ = make_relay(outbox, FailingKeyProducer("ORD-0"), batch_size=10, retry_backoff_ms=500, max_backoff_sec=1.0)
+
+    started = time.monotonic()
+    relay.start()
+    while relay.delivered < 500 and time.monotonic() - started < 5:
+        time.sleep(0.01)
+    elapsed = time.monotonic() - started
+    relay.stop(drain_timeout_sec=0)
+
+    # with the whole relay backing off after every batch holding ORD-0, this took about a minute
+    assert relay.delivered == 500
+    assert elapsed < 1.0
+    assert 1 <= relay.failed <= 3
+
+
+def test_a_corrupt_record_stops_the_relay(tmp_path):
+    path = str(tmp_path / "cart.outbox")
+    outbox = Outbox(path, fsync=False)
+    outbox.append([status_record("ORD-1", OrderStatus.CONFIRMED)])
+    with open(path, "r+b") as f:
+        f.seek(-1, 2)
+        last = f.read(1)
+        f.seek(-1, 2)
+        f.write(bytes([last[0] ^ 0xFF]))
+    relay, producer = make_relay(outbox)
+
+    relay.start()
+    relay._thread.join(timeout=2)
+
+    assert not relay._thread.is_alive()
+    assert isinstance(relay.error, OutboxCorrupt)
+    assert producer.produced == [] and outbox.pending_bytes > 0
+
+
+def test_undelivered_events_survive_a_restart_and_a_torn_tail_is_dropped(tmp_path):
+    path = str(tmp_path / "cart.outbox")
+    outbox = Outbox(path, fsync=False)
+    outbox.append([status_record("ORD-1", OrderStatus.CONFIRMED)])
+    relay, _ = make_relay(outbox)
+    relay.relay_once()
+    outbox.append([status_record("ORD-1", OrderStatus.SHIPPED)])
+    outbox.close()
+    with open(path, "ab") as f:
+        f.write(b"\x40\x00\x00\x00\x01\x02")  # crash in the middle of an append
+
+    reopened = Outbox(path, fsync=False)
+    relay, producer = make_relay(reopened)
+    relay.relay_once()
+
+    assert published(producer) == [("ORD-1", OrderStatus.SHIPPED)]
+    assert reopened.pending_bytes == 0
+
+
+def test_drained_outbox_is_compacted(tmp_path):
+    outbox = Outbox(str(tmp_path / "cart.outbox"), fsync=False, compact_bytes=1)
+    relay, producer = make_relay(outbox)
+    outbox.append([status_record("ORD-1", OrderStatus.CONFIRMED)])
+    relay.relay_once()
+    assert outbox.end == 0 and outbox.committed == 0
+
+    outbox.append([status_record("ORD-1", OrderStatus.SHIPPED)])
+    relay.relay_once()
+    assert published(producer) == [("ORD-1", OrderStatus.CONFIRMED), ("ORD-1", OrderStatus.SHIPPED)]
+
+
+def test_generator_writes_events_to_the_outbox_instead_of_publishing(tmp_path):
+    outbox = Outbox(str(tmp_path / "cart.outbox"), fsync=False)
+    producer = FakeProducer()
+    publisher = OrderEventPublisher(producer=producer, retry_backoff_ms=0)
+    generator = OrderGenerator(publisher=publisher, store=OrderStoreMemory(), outbox=outbox)
+
+    generator.create_order("1", 2)
+    generator.update_order_status("1", OrderStatus.CONFIRMED)
+    results = generator.create_orders([("2", 1), ("1", 1)])
+
+    assert producer.produced == []
+    assert [err is None for _, err in results] == [True, False]
+    events = [(r.key, deserialize_event(r.value).event_type) for _, r in outbox.read(0, 10)]
+    assert [key for key, _ in events] == ["ORD-1", "ORD-1", "ORD-2"]
+    relay = OutboxRelay(outbox, publisher)
+    assert relay.relay_once() == (2, 0)
+    assert relay.relay_once() == (1, 0)
+
+
+class FailingOutbox(Outbox):
+    fail = False
+
+    def append(self, records):
+        if self.fail:
+            raise OutboxError("disk full")
+        super().append(records)
+
+
+def test_failed_outbox_write_rolls_back_the_store_change(tmp_path):
+    outbox = FailingOutbox(str(tmp_path / "cart.outbox"), fsync=False)
+    store = OrderStoreMemory()
+    generator = OrderGenerator(publisher=None, store=store, outbox=outbox)
+    generator.create_order("1", 1)
+    outbox.fail = True
+
+    with pytest.raises(OutboxError):
+        generator.create_order("2", 1)
+    with pytest.raises(OutboxError):
+        generator.update_order_status("1", OrderStatus.SHIPPED)
+    results = generator.create_orders([("3", 1)])
+
+    assert isinstance(results[0][1], OutboxError)
+    assert not store.exists("ORD-2") and not store.exists("ORD-3")
+    assert store.get("ORD-1").status == OrderStatus.NEW
+
+
+class SlowCreateOutbox(Outbox):
+    """Takes a while to append ORDER_CREATED, so a status update can run between the store write and the append."""
+
+    def append(self, records):
+        if any(deserialize_event(r.value).event_type == EventType.ORDER_CREATED for r in records):
+            time.sleep(0.02)
+        super().append(records)
+
+
+def test_outbox_holds_each_orders_events_in_store_order(tmp_path):
+    outbox = SlowCreateOutbox(str(tmp_path / "cart.outbox"), fsync=False)
+    generator = OrderGenerator(publisher=None, store=OrderStoreMemory(), outbox=outbox)
+
+    def confirm():
+        while True:
+            try:
+                return generator.update_order_status("1", OrderStatus.CONFIRMED)
+            except OrderNotFound:
+                time.sleep(0)
+
+    updater = threading.Thread(target=confirm)
+    updater.start()
+    generator.create_order("1", 1)
+    updater.join()
+
+    events = [deserialize_event(r.value).event_type for _, r in outbox.read(0, 10)]
+    assert events == [EventType.ORDER_CREATED, EventType.ORDER_STATUS_UPDATED]
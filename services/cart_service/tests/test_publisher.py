@@ -0,0 +1,141 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+
+import pytest
+from confluent_kafka import KafkaError
+
+from libs.kafka_common.models import Order, OrderItem, Currency, OrderStatus
+from libs.kafka_common.serdes_json import deserialize_event
+from libs.kafka_common.event_headers import EVENT_SCHEMA_VERSION, read_event_headers
+from services.cart_service.publisher import (
+    OrderEventPublisher,
+    KafkaBrokersUnavailable,
+    KafkaTimeout,
+    ProducerQueueFull,
+)
+from services.cart_service.tests.fakes import FakeProducer
+
+
+def make_order(order_id="ORD-1"):
+    return Order(
+        order_id=order_id,
+        customer_id="CUST-00001",
+        order_date=datetime.now(timezone.utc),
+        items=[OrderItem(item_id="ITEM-001", quantity=2, price=10.0)],
+        total_amount=20.0,
+        currency=Currency.USD,
+        status=OrderStatus.NEW,
+    )
+
+
+def test_publish_waits_for_delivery_and_returns_event():
+    producer = FakeProducer()
+    publisher = OrderEventPublisher(producer=producer, retry_backoff_ms=0)
+
+    event = publisher.publish_order_created(make_order("ORD-5"))
+
+    assert event.order_id == "ORD-5"
+    topic, key, value = producer.produced[0]
+    assert key == b"ORD-5"
+    assert deserialize_event(value).order_id == "ORD-5"
+    assert publisher.in_flight == 0
+
+    headers = read_event_headers(producer.headers[0])
+    assert headers.event_type == event.event_type
+    assert headers.event_id == event.event_id
+    assert headers.schema_version == EVENT_SCHEMA_VERSION
+    assert headers.produced_at_ms > 0
+
+
+def test_enqueue_tracks_deliveries_until_single_wait():
+    producer = FakeProducer()
+    publisher = OrderEventPublisher(producer=producer, retry_backoff_ms=0)
+
+    futures = [publisher.enqueue_order_status_updated(f"ORD-{i}", OrderStatus.SHIPPED) for i in range(3)]
+    assert len(producer.produced) == 3
+    assert producer.flush_calls == 0
+
+    publisher.wait_for_delivery(futures)
+
+    assert producer.flush_calls == 1
+    assert [f.result().order_id for f in futures] == ["ORD-0", "ORD-1", "ORD-2"]
+    assert publisher.in_flight == 0
+
+
+def test_pipelined_mode_delivers_from_background_poller():
+    producer = FakeProducer()
+    publisher = OrderEventPublisher(producer=producer, retry_backoff_ms=0, pipelined=True, poll_interval_sec=0.001)
+    try:
+        event = publisher.publish_order_status_updated("ORD-9", OrderStatus.CONFIRMED)
+        assert event.status == OrderStatus.CONFIRMED
+        assert producer.flush_calls == 0
+    finally:
+        publisher.close()
+
+
+def test_async_publish_without_pipelining_flushes_instead_of_starting_the_poller():
+    producer = FakeProducer()
+    publisher = OrderEventPublisher(producer=producer, retry_backoff_ms=0)
+
+    event = asyncio.run(publisher.publish_order_status_updated_async("ORD-9", OrderStatus.SHIPPED))
+
+    assert event.status == OrderStatus.SHIPPED
+    assert producer.flush_calls == 1
+    assert publisher._poller is None
+
+
+def test_undelivered_message_raises_timeout():
+    publisher = OrderEventPublisher(producer=FakeProducer(deliver=False), retry_backoff_ms=0, flush_timeout_sec=0.01)
+
+    with pytest.raises(KafkaTimeout):
+        publisher.publish_order_created(make_order())
+
+
+def test_delivery_error_is_mapped():
+    producer = FakeProducer(error=KafkaError(KafkaError._ALL_BROKERS_DOWN))
+    publisher = OrderEventPublisher(producer=producer, retry_backoff_ms=0)
+
+    with pytest.raises(KafkaBrokersUnavailable):
+        publisher.publish_order_created(make_order())
+    assert publisher.in_flight == 0
+
+
+def test_full_queue_raises_after_retries():
+    publisher = OrderEventPublisher(producer=FakeProducer(buffer_full=True), retry_backoff_ms=0)
+
+    with pytest.raises(ProducerQueueFull):
+        publisher.publish_order_created(make_order())
+    assert publisher.in_flight == 0
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_no_backoff_after_the_last_enqueue_attempt(use_async):
+    publisher = OrderEventPublisher(producer=FakeProducer(buffer_full=True), max_retries=1, retry_backoff_ms=500)
+
+    started = time.monotonic()
+    with pytest.raises(ProducerQueueFull):
+        if use_async:
+            asyncio.run(publisher.enqueue_order_created_async(make_order()))
+        else:
+            publisher.enqueue_order_created(make_order())
+    assert time.monotonic() - started < 0.25
+
+
+def test_metrics_record_publish_latency_retries_and_failures():
+    producer = FakeProducer(error=KafkaError(KafkaError._ALL_BROKERS_DOWN))
+    publisher = OrderEventPublisher(producer=producer, retry_backoff_ms=0)
+    with pytest.raises(KafkaBrokersUnavailable):
+        publisher.publish_order_created(make_order())
+    producer.error = None
+    publisher.publish_order_created(make_order("ORD-2"))
+    producer.buffer_full = True
+    with pytest.raises(ProducerQueueFull):
+        publisher.publish_order_created(make_order("ORD-3"))
+
+    assert publisher.metrics.get("cart_publish_latency_seconds").count == 2
+    text = publisher.metrics.render()
+    assert "cart_publish_delivery_failures_total 1" in text
+    # max_retries=3 attempts: the last failure is not retried
+    assert "cart_publish_retries_total 2" in text
+    assert "cart_producer_queue_depth 0" in text
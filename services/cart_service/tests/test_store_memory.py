@@ -0,0 +1,88 @@
+import threading
+
+from libs.kafka_common.models import OrderStatus
+from services.cart_service.order_generator import OrderAlreadyExists, OrderGenerator
+from services.cart_service.store_memory import OrderStoreMemory
+
+
+class RecordingPublisher:
+    def __init__(self):
+        self.created = []
+        self.updated = []
+
+    def publish_order_created(self, order):
+        self.created.append(order.order_id)
+
+    def publish_order_status_updated(self, order_id, status):
+        self.updated.append((order_id, status))
+
+
+def run_concurrently(fn, threads=16):
+    barrier = threading.Barrier(threads)
+    results = [None] * threads
+
+    def worker(i):
+        barrier.wait()
+        try:
+            results[i] = fn(i)
+        except Exception as e:
+            results[i] = e
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return results
+
+
+class ExistsRaceStore(OrderStoreMemory):
+    """Lets every thread pass the exists() pre-check before any of them stores the order."""
+
+    def __init__(self, threads):
+        super().__init__(shards=4)
+        self.barrier = threading.Barrier(threads)
+
+    def exists(self, order_id):
+        found = super().exists(order_id)
+        self.barrier.wait()
+        return found
+
+
+def test_concurrent_creates_of_one_id_publish_once():
+    publisher = RecordingPublisher()
+    generator = OrderGenerator(publisher=publisher, store=ExistsRaceStore(threads=16), seed=1)
+
+    results = run_concurrently(lambda i: generator.create_order("77", 50), threads=16)
+
+    assert results.count("ORD-77") == 1
+    assert all(isinstance(r, OrderAlreadyExists) for r in results if r != "ORD-77")
+    assert publisher.created == ["ORD-77"]
+
+
+def test_compare_and_set_status_has_a_single_winner():
+    store = OrderStoreMemory(shards=1)
+    generator = OrderGenerator(publisher=RecordingPublisher(), store=store, seed=1)
+    generator.create_order("1", 1)
+    held = store.get("ORD-1")
+    statuses = [OrderStatus.CONFIRMED, OrderStatus.CANCELLED]
+
+    results = run_concurrently(lambda i: store.compare_and_set_status("ORD-1", OrderStatus.NEW, statuses[i % 2]))
+
+    assert results.count(True) == 1
+    assert store.get("ORD-1").status in statuses
+    assert held.status == OrderStatus.NEW  # replaced, not mutated
+    assert not store.compare_and_set_status("ORD-404", OrderStatus.NEW, OrderStatus.SHIPPED)
+
+
+def test_concurrent_status_updates_all_apply():
+    publisher = RecordingPublisher()
+    store = OrderStoreMemory()
+    generator = OrderGenerator(publisher=publisher, store=store, seed=1)
+    for n in range(8):
+        generator.create_order(str(n), 1)
+
+    run_concurrently(lambda i: generator.update_order_status(str(i % 8), OrderStatus.SHIPPED))
+
+    assert all(store.get(f"ORD-{n}").status == OrderStatus.SHIPPED for n in range(8))
+    assert len(publisher.updated) == 16 and len(store) == 8
@@ -0,0 +1,11 @@
+from typing import List
+
+from pydantic import BaseModel, ConfigDict, Field
+
+MAX_ORDER_IDS_PER_BATCH = 5_000
+
+
+class OrderDetailsBatchRequest(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+    order_ids: List[str] = Field(..., alias="orderIds", min_length=1, max_length=MAX_ORDER_IDS_PER_BATCH)
@@ -1,11 +1,30 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+import asyncio
+import json
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional
 
-from services.order_service.consumer_db import OrderDB
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response, StreamingResponse
+
+from libs.kafka_common.metrics import CONTENT_TYPE, Registry
+from libs.kafka_common.models import Currency, OrderStatus
+from services.order_service.app.api.models import OrderDetailsBatchRequest
+from services.order_service.consumer_db import OrderDB, epoch_us
+from services.order_service.received_ids import ReceivedIdsPage
+from services.order_service.response_cache import CachedResponse
 
 router = APIRouter()
 
+DEFAULT_IDS_PAGE_SIZE = 1000
+MAX_IDS_PAGE_SIZE = 10_000
+DEFAULT_ORDERS_PAGE_SIZE = 100
+MAX_ORDERS_PAGE_SIZE = 1000
+# found orders serialized per chunk of a streamed batch response
+BATCH_CHUNK_SIZE = 200
+
 
 def get_db() -> OrderDB:
     """
@@ -14,32 +33,262 @@ def get_db() -> OrderDB:
     raise RuntimeError("OrderDB dependency is not configured")
 
 
+def get_metrics() -> Registry:
+    """
+    Overridden in app/main.py with the registry the consumer records into.
+    """
+    raise RuntimeError("Metrics registry dependency is not configured")
+
+
 def _normalize_order_id(order_id: str) -> str:
     # Support "123" or "ORD-123"
     return f"ORD-{order_id}" if order_id.isdigit() else order_id
 
 
+def _is_valid_order_id(order_id: str) -> bool:
+    return order_id.isdigit() or order_id.startswith("ORD-")
+
+
+def _order_details(db: OrderDB, order_id: str) -> Optional[dict]:
+    entry = db.get(order_id)
+    if entry is None:
+        return None
+    return {
+        "order": entry.order.model_dump(by_alias=True),
+        "shippingCost": entry.shipping_cost,
+    }
+
+
+def _etag(db: OrderDB, version: int) -> str:
+    return f'"{db.instance_tag}-{version}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == "*" or candidate == etag:
+            return True
+    return False
+
+
+def _render_order_details(db: OrderDB, order_id: str) -> Optional[CachedResponse]:
+    versioned = db.get_versioned(order_id)
+    if versioned is None:
+        return None
+    version, entry = versioned
+    details = {"order": entry.order.model_dump(by_alias=True), "shippingCost": entry.shipping_cost}
+    # byte-for-byte what FastAPI's JSONResponse would send for the dict
+    body = json.dumps(jsonable_encoder(details), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+    return CachedResponse(version, _etag(db, version), body)
+
+
 @router.get("/order-details")
-def order_details(order_id: str = Query(...,alias="orderId"),db: OrderDB = Depends(get_db)):
+async def order_details(
+    order_id: str = Query(...,alias="orderId"),
+    if_none_match: Optional[str] = Header(None),
+    db: OrderDB = Depends(get_db),
+):
+    """
+    Order details, served from db.response_cache when the order hasn't changed since it was
+    last serialized. The ETag is the order version; If-None-Match with it is answered with 304.
+    """
     order_id = _normalize_order_id(order_id)
 
-    if not (order_id.isdigit() or order_id.startswith("ORD-")):
+    if not _is_valid_order_id(order_id):
         raise HTTPException(
             status_code=400,
             detail="orderId must be a numeric string or start with 'ORD-'",
         )
 
-    entry = db.get(order_id)
-    if entry is None:
+    # lock-free: the stored record is never mutated in place (see OrderDB)
+    version = db.order_version(order_id)
+    if version is None:
         raise HTTPException(status_code=404, detail="order not found")
+    if _etag_matches(if_none_match, _etag(db, version)):
+        return Response(status_code=304, headers={"ETag": _etag(db, version)})
+
+    cached = db.response_cache.get(order_id, version)
+    if cached is None:
+        cached = _render_order_details(db, order_id)
+        if cached is None:
+            raise HTTPException(status_code=404, detail="order not found")
+        db.response_cache.put(order_id, cached)
+    return Response(content=cached.body, media_type="application/json", headers={"ETag": cached.etag})
 
-    return {
-        "order": entry.order.model_dump(by_alias=True),
-        "shippingCost": entry.shipping_cost,
-    }
+
+def _cached_order_details(db: OrderDB, order_id: str, version: int) -> Optional[CachedResponse]:
+    cached = db.response_cache.get(order_id, version)
+    if cached is None:
+        cached = _render_order_details(db, order_id)
+        if cached is not None:
+            db.response_cache.put(order_id, cached)
+    return cached
+
+
+async def _stream_order_details(db: OrderDB, found: Dict[str, int], missing: List[str]) -> AsyncIterator[bytes]:
+    """{"missing": [...], "orders": [<same objects as /order-details>, ...]}, sent in chunks."""
+    yield b'{"missing":' + json.dumps(missing).encode() + b',"orders":['
+    first = True
+    chunk: List[bytes] = []
+    for order_id, version in found.items():
+        cached = _cached_order_details(db, order_id, version)
+        if cached is None:
+            continue
+        chunk.append(cached.body)
+        if len(chunk) == BATCH_CHUNK_SIZE:
+            yield (b"" if first else b",") + b",".join(chunk)
+            first = False
+            chunk = []
+    if chunk:
+        yield (b"" if first else b",") + b",".join(chunk)
+    yield b"]}"
+
+
+@router.post("/order-details:batch")
+async def order_details_batch(request: OrderDetailsBatchRequest, db: OrderDB = Depends(get_db)):
+    """
+    Details of up to MAX_ORDER_IDS_PER_BATCH orders in one request, in request order (duplicates
+    once). Ids are normalized as in /order-details; unknown ones are listed under "missing".
+    Order bodies come from the same response cache as /order-details and are streamed.
+    """
+    order_ids = list(dict.fromkeys(_normalize_order_id(order_id) for order_id in request.order_ids))
+    invalid = [order_id for order_id in order_ids if not _is_valid_order_id(order_id)]
+    if invalid:
+        raise HTTPException(
+            status_code=400,
+            detail=f"orderIds must be numeric strings or start with 'ORD-': {invalid[:10]}",
+        )
+
+    # one pass over the DB: current versions decide what is found and which cache entries are fresh
+    found: Dict[str, int] = {}
+    missing: List[str] = []
+    for order_id in order_ids:
+        version = db.order_version(order_id)
+        if version is None:
+            missing.append(order_id)
+        else:
+            found[order_id] = version
+    return StreamingResponse(_stream_order_details(db, found, missing), media_type="application/json")
+
+
+async def _stream_ids(db: OrderDB, topic_name: str, cursor: int, distinct: bool) -> AsyncIterator[bytes]:
+    """The same JSON document as the unpaginated response, read and sent one page at a time."""
+    yield b'{"topicName": ' + json.dumps(topic_name).encode() + b', "orderIds": ['
+    first = True
+    while True:
+        page: ReceivedIdsPage = db.received_ids_page(topic_name, cursor, MAX_IDS_PAGE_SIZE, distinct)
+        if page.entries:
+            chunk = ", ".join(json.dumps(e.order_id) for e in page.entries)
+            yield (chunk if first else ", " + chunk).encode()
+            first = False
+        cursor = page.next_cursor
+        if not page.has_more:
+            break
+    yield b"]}"
+
+
+def _all_ids_body(db: OrderDB, topic_name: str, distinct: bool) -> bytes:
+    body = {"topicName": topic_name, "orderIds": db.get_all_ids_for_topic(topic_name, distinct)}
+    return json.dumps(body, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
 
 
 @router.get("/getAllOrderIdsFromTopic")
-def get_all_order_ids_from_topic(topic_name: str = Query(..., alias="topicName"),db: OrderDB = Depends(get_db),):
-    order_ids = db.get_all_ids_for_topic(topic_name)
-    return {"topicName": topic_name, "orderIds": order_ids}
+async def get_all_order_ids_from_topic(
+    topic_name: str = Query(..., alias="topicName"),
+    cursor: Optional[int] = Query(None, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_IDS_PAGE_SIZE),
+    distinct: bool = Query(False),
+    stream: bool = Query(False),
+    with_offsets: bool = Query(False, alias="withOffsets"),
+    db: OrderDB = Depends(get_db),
+):
+    """
+    Order ids received on a topic, oldest first (only what the retention limits kept).
+    - distinct=true lists each id once, at its most recent receipt.
+    - cursor/limit return one page plus nextCursor; pass it back to continue (also picks up new ids).
+    - stream=true streams the full list page by page instead of building it in memory.
+    """
+    if stream:
+        return StreamingResponse(_stream_ids(db, topic_name, cursor or 0, distinct), media_type="application/json")
+
+    if cursor is None and limit is None and not with_offsets:
+        # the full list can take 100+ ms to build and encode; keep it off the event loop
+        body = await asyncio.to_thread(_all_ids_body, db, topic_name, distinct)
+        return Response(content=body, media_type="application/json")
+
+    page = db.received_ids_page(topic_name, cursor or 0, limit or DEFAULT_IDS_PAGE_SIZE, distinct)
+    body = {
+        "topicName": topic_name,
+        "orderIds": [e.order_id for e in page.entries],
+        "nextCursor": page.next_cursor,
+        "hasMore": page.has_more,
+    }
+    if with_offsets:
+        body["entries"] = [{"orderId": e.order_id, "partition": e.partition, "offset": e.offset} for e in page.entries]
+    return body
+
+
+def _query_page(
+    db: OrderDB,
+    status: Optional[OrderStatus],
+    customer_id: Optional[str],
+    currency: Optional[Currency],
+    since: Optional[datetime],
+    until: Optional[datetime],
+    cursor: int,
+    limit: int,
+    ids_only: bool,
+) -> dict:
+    page = db.query_orders(status, customer_id, currency, since, until, cursor, limit)
+    body = {"nextCursor": page.next_cursor, "hasMore": page.has_more}
+    if ids_only:
+        body["orderIds"] = page.order_ids
+    else:
+        orders: List[dict] = []
+        for order_id in page.order_ids:
+            details = _order_details(db, order_id)
+            if details is not None:
+                orders.append(details)
+        body["orders"] = orders
+    return body
+
+
+@router.get("/orders")
+async def query_orders(
+    status: Optional[OrderStatus] = Query(None),
+    customer_id: Optional[str] = Query(None, alias="customerId"),
+    currency: Optional[Currency] = Query(None),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    cursor: int = Query(0, ge=0),
+    limit: int = Query(DEFAULT_ORDERS_PAGE_SIZE, ge=1, le=MAX_ORDERS_PAGE_SIZE),
+    ids_only: bool = Query(False, alias="idsOnly"),
+    db: OrderDB = Depends(get_db),
+):
+    """
+    Orders matching all given filters (orderDate in [since, until); naive times are UTC), in the
+    order they were received. Served from the OrderDB secondary indexes; pass nextCursor back
+    for the next page. idsOnly=true returns orderIds instead of the order details.
+    """
+    if since is not None and until is not None and epoch_us(since) >= epoch_us(until):
+        raise HTTPException(status_code=400, detail="since must be before until")
+    # an unindexed or unselective query scans many orders: run it on a worker thread
+    return await asyncio.to_thread(_query_page, db, status, customer_id, currency, since, until, cursor, limit, ids_only)
+
+
+@router.get("/orders/counts")
+async def order_counts(db: OrderDB = Depends(get_db)):
+    """Number of orders per status and per currency."""
+    if db.indexed:
+        return db.order_counts()
+    return await asyncio.to_thread(db.order_counts)
+
+
+@router.get("/metrics")
+async def metrics(registry: Registry = Depends(get_metrics)):
+    """Consumer lag, events, handle/decode times and the pending buffer, in Prometheus text format."""
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
@@ -1,8 +1,8 @@
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
-from services.order_service.app.api.routes import router, get_db
-from services.order_service.init_services import db, consumer_runner
+from services.order_service.app.api.routes import router, get_db, get_metrics
+from services.order_service.init_services import db, consumer_runner, metrics
 
 
 @asynccontextmanager
@@ -17,4 +17,17 @@ async def lifespan(app: FastAPI):
 app = FastAPI(lifespan=lifespan)
 app.include_router(router)
 
-app.dependency_overrides[get_db] = lambda: db
+
+async def _shared_db():
+    # async so FastAPI resolves it on the event loop instead of the threadpool
+    return db
+
+
+app.dependency_overrides[get_db] = _shared_db
+
+
+async def _metrics():
+    return metrics
+
+
+app.dependency_overrides[get_metrics] = _metrics
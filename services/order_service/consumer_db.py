@@ -1,37 +1,497 @@
 # services/order_service/consumer_db.py
 from __future__ import annotations
 
-from typing import Dict, List, Optional, Set, DefaultDict
-from collections import defaultdict
+import secrets
+import sys
+import threading
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar, Union
 
-from libs.kafka_common.models import OrderStatus
+from libs.kafka_common.models import Currency, Order, OrderItem, OrderStatus
 from .models import OrderEntry
+from .order_index import OrderQueryPage, SeqIndex
+from .received_ids import IdInterner, ReceivedIdLog, ReceivedIdsPage
+from .response_cache import ResponseCache
+
+T = TypeVar("T")
+
+_CURRENCIES = tuple(Currency)
+_CURRENCY_CODES = {c: i for i, c in enumerate(_CURRENCIES)}
+_STATUSES = tuple(OrderStatus)
+_STATUS_CODES = {s: i for i, s in enumerate(_STATUSES)}
+
+_EPOCH_NAIVE = datetime(1970, 1, 1)
+_EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+# candidates query_orders() checks per hold of the structure lock; writers get in between chunks
+_QUERY_SCAN_CHUNK = 4096
+
+
+def epoch_us(value: datetime) -> int:
+    """Microseconds since the epoch; naive datetimes are taken as UTC."""
+    if value.utcoffset() is None:
+        return (value - _EPOCH_NAIVE) // _MICROSECOND
+    return (value - _EPOCH_UTC) // _MICROSECOND
+
+
+def _int_array(values: List[int]) -> array:
+    try:
+        return array("i", values)
+    except OverflowError:
+        return array("q", values)
+
+
+class CompactOrder:
+    """
+    One stored order in compact mode: no per-instance dict, enums as small-int codes,
+    customer/item ids interned (shared between orders), the order date as epoch
+    microseconds, and the numbers in typed arrays:
+    amounts = [total_amount, shipping_cost, price_1..price_n], quantities = [qty_1..qty_n].
+    The order_id is the OrderDB key and is not stored again.
+    """
+
+    __slots__ = ("customer_id", "order_date_us", "utc_offset_sec", "currency", "status", "item_ids", "quantities", "amounts")
+
+    def __init__(self, entry: OrderEntry) -> None:
+        order = entry.order
+        offset = order.order_date.utcoffset()
+        self.order_date_us = epoch_us(order.order_date)
+        self.utc_offset_sec: Optional[int] = None if offset is None else int(offset.total_seconds())
+        self.customer_id = sys.intern(order.customer_id)
+        self.currency = _CURRENCY_CODES[order.currency]
+        self.status = _STATUS_CODES[order.status]
+        self.item_ids = tuple(sys.intern(item.item_id) for item in order.items)
+        self.quantities = _int_array([item.quantity for item in order.items])
+        self.amounts = array("d", [order.total_amount, entry.shipping_cost])
+        self.amounts.extend(item.price for item in order.items)
+
+    @classmethod
+    def from_parts(
+        cls, customer_id: str, order_date_us: int, utc_offset_sec: Optional[int], currency: Currency,
+        status: OrderStatus, item_ids: Iterable[str], quantities: Iterable[int], amounts: Iterable[float],
+    ) -> "CompactOrder":
+        """Rebuilds a record from its stored fields (snapshot restore)."""
+        record = cls.__new__(cls)
+        record.customer_id = sys.intern(customer_id)
+        record.order_date_us = order_date_us
+        record.utc_offset_sec = utc_offset_sec
+        record.currency = _CURRENCY_CODES[currency]
+        record.status = _STATUS_CODES[status]
+        record.item_ids = tuple(sys.intern(i) for i in item_ids)
+        record.quantities = _int_array(list(quantities))
+        record.amounts = array("d", amounts)
+        return record
+
+    def __reduce__(self):
+        # pickled as its raw fields (decode workers send records back to the consumer process);
+        # ids are interned again on arrival
+        return _unpickle_compact_order, tuple(getattr(self, name) for name in CompactOrder.__slots__)
+
+    def with_status(self, status: OrderStatus) -> "CompactOrder":
+        """A copy with another status; the (never mutated) arrays and tuples are shared."""
+        record = CompactOrder.__new__(CompactOrder)
+        for name in CompactOrder.__slots__:
+            setattr(record, name, getattr(self, name))
+        record.status = _STATUS_CODES[status]
+        return record
+
+    @property
+    def order_currency(self) -> Currency:
+        return _CURRENCIES[self.currency]
+
+    @property
+    def order_status(self) -> OrderStatus:
+        return _STATUSES[self.status]
+
+    def order_date(self) -> datetime:
+        if self.utc_offset_sec is None:
+            return _EPOCH_NAIVE + self.order_date_us * _MICROSECOND
+        value = _EPOCH_UTC + self.order_date_us * _MICROSECOND
+        return value if self.utc_offset_sec == 0 else value.astimezone(timezone(timedelta(seconds=self.utc_offset_sec)))
+
+    def to_entry(self, order_id: str) -> OrderEntry:
+        """Materializes the Pydantic models (API boundary only)."""
+        items = [
+            OrderItem(item_id=item_id, quantity=quantity, price=price)
+            for item_id, quantity, price in zip(self.item_ids, self.quantities, self.amounts[2:])
+        ]
+        order = Order(
+            order_id=order_id,
+            customer_id=self.customer_id,
+            order_date=self.order_date(),
+            items=items,
+            total_amount=self.amounts[0],
+            currency=self.order_currency,
+            status=self.order_status,
+        )
+        return OrderEntry(order=order, shipping_cost=self.amounts[1])
+
+
+def _unpickle_compact_order(
+    customer_id: str, order_date_us: int, utc_offset_sec: Optional[int], currency: int, status: int,
+    item_ids: Tuple[str, ...], quantities: array, amounts: array,
+) -> CompactOrder:
+    record = CompactOrder.__new__(CompactOrder)
+    record.customer_id = sys.intern(customer_id)
+    record.order_date_us = order_date_us
+    record.utc_offset_sec = utc_offset_sec
+    record.currency = currency
+    record.status = status
+    record.item_ids = tuple(sys.intern(i) for i in item_ids)
+    record.quantities = quantities
+    record.amounts = amounts
+    return record
+
+
+def _index_fields(record: Union[OrderEntry, CompactOrder]) -> Tuple[OrderStatus, str, Currency, int]:
+    """(status, customer_id, currency, order date in epoch us) of a stored record."""
+    if isinstance(record, CompactOrder):
+        return record.order_status, record.customer_id, record.order_currency, record.order_date_us
+    order = record.order
+    return order.status, order.customer_id, order.currency, epoch_us(order.order_date)
 
 
 class OrderDB:
-    def __init__(self) -> None:
-        self._orders: Dict[str, OrderEntry] = {}
-        self._received_ids_by_topic: DefaultDict[str, List[str]] = defaultdict(list)
+    def __init__(
+        self,
+        compact: bool = False,
+        received_ids_max_entries: int = 1_000_000,
+        received_ids_max_age_sec: float = 0.0,
+        indexed: bool = True,
+        date_bucket_sec: int = 3600,
+        response_cache_max_bytes: int = 64 * 2**20,
+    ) -> None:
+        """
+        compact=True stores orders as CompactOrder records instead of the Pydantic OrderEntry,
+        for a fraction of the memory; get() then builds a fresh OrderEntry on every call, so
+        changes must go through update_status() (in both modes, or the indexes go stale).
+
+        indexed=True maintains secondary indexes by status, customer, currency and order date
+        (buckets of date_bucket_sec, naive dates taken as UTC) for query_orders(); without them
+        queries scan every order.
+
+        The received-id log of each topic keeps at most received_ids_max_entries entries and/or
+        entries younger than received_ids_max_age_sec (0 = unbounded).
+
+        Every write to an order gives it a new version (order_version()), unique within this
+        instance; instance_tag tells instances apart, e.g. across restarts. response_cache holds
+        serialized API responses per order (LRU, response_cache_max_bytes) and is invalidated
+        by add_order() and update_status().
+
+        Concurrency: writers (the consumer) serialize on transaction(), which a batch may hold
+        for a while; readers never take it. Stored records are copy-on-write: update_status()
+        swaps in a new record instead of mutating the old one, so get()/get_status() are plain
+        dict lookups returning a consistent record, and an OrderEntry returned by get() must
+        not be mutated. The indexes and received-id logs are guarded by a second lock that
+        writers hold only for the individual update, so their readers wait for at most one
+        update rather than a whole batch.
+        """
+        self.compact = compact
+        self._orders: Dict[str, Union[OrderEntry, CompactOrder]] = {}
+        # Orders numbered in insertion order: the sort order and pagination cursor of queries.
+        self._order_ids: List[str] = []
+        self._seqs: Dict[str, int] = {}
+        # version of each order's current record, indexed by seq
+        self._versions = array("q")
+        self._write_count = 0
+        self.instance_tag = secrets.token_hex(4)
+        self.response_cache = ResponseCache(response_cache_max_bytes)
+        self.indexed = indexed
+        self.date_bucket_us = date_bucket_sec * 1_000_000
+        self._by_status: SeqIndex[OrderStatus] = SeqIndex()
+        self._by_customer: SeqIndex[str] = SeqIndex()
+        self._by_currency: SeqIndex[Currency] = SeqIndex()
+        self._by_date_bucket: SeqIndex[int] = SeqIndex()
+        self.received_ids_max_entries = received_ids_max_entries
+        self.received_ids_max_age_sec = received_ids_max_age_sec
+        self._received_id_codes = IdInterner()
+        self._received_ids_by_topic: Dict[str, ReceivedIdLog] = {}
+        # Serializes writers (consumer thread), held across a batch via transaction().
+        self._lock = threading.RLock()
+        # Guards the indexes and received-id logs; held briefly by writers and readers alike.
+        # Lock order: _lock before _structure_lock.
+        self._structure_lock = threading.Lock()
 
+    def transaction(self) -> threading.RLock:
+        """Lock to hold while applying several mutations as one unit (`with db.transaction(): ...`)."""
+        return self._lock
 
     def add_order(self, order_entry: OrderEntry):
-        self._orders[order_entry.order.order_id] = order_entry
+        record = CompactOrder(order_entry) if self.compact else order_entry
+        with self._lock:
+            self._store(order_entry.order.order_id, record)
+
+    def add_record(self, order_id: str, record: CompactOrder) -> None:
+        """Stores an order built elsewhere (a snapshot, a decode worker) without going through OrderEntry."""
+        with self._lock:
+            self._store(order_id, record if self.compact else record.to_entry(order_id))
+
+    def _store(self, order_id: str, record: Union[OrderEntry, CompactOrder]) -> None:
+        with self._structure_lock:
+            seq = self._seqs.get(order_id)
+            new = seq is None
+            if new:
+                seq = len(self._order_ids)
+                self._order_ids.append(order_id)
+                self._versions.append(0)
+            elif self.indexed:
+                self._unindex(seq, self._orders[order_id])
+            self._write_count += 1
+            self._orders[order_id] = record
+            self._versions[seq] = self._write_count
+            if self.indexed:
+                status, customer_id, currency, date_us = _index_fields(record)
+                self._by_status.add(status, seq)
+                self._by_customer.add(customer_id, seq)
+                self._by_currency.add(currency, seq)
+                self._by_date_bucket.add(date_us // self.date_bucket_us, seq)
+            if new:
+                # published last: a lock-free order_version() that finds the seq finds its version too
+                self._seqs[order_id] = seq
+        self.response_cache.invalidate(order_id)
+
+    def _unindex(self, seq: int, record: Union[OrderEntry, CompactOrder]) -> None:
+        status, customer_id, currency, date_us = _index_fields(record)
+        self._by_status.remove(status, seq)
+        self._by_customer.remove(customer_id, seq)
+        self._by_currency.remove(currency, seq)
+        self._by_date_bucket.remove(date_us // self.date_bucket_us, seq)
 
     def get(self, order_id: str) -> Optional[OrderEntry]:
-        return self._orders.get(order_id)
+        """Lock-free. In non-compact mode this is the stored entry itself: read it, don't mutate it."""
+        record = self._orders.get(order_id)
+        if isinstance(record, CompactOrder):
+            return record.to_entry(order_id)
+        return record
+
+    def contains(self, order_id: str) -> bool:
+        return order_id in self._orders
+
+    def get_status(self, order_id: str) -> Optional[OrderStatus]:
+        """Status of an order without materializing it."""
+        record = self._orders.get(order_id)
+        if record is None:
+            return None
+        if isinstance(record, CompactOrder):
+            return record.order_status
+        return record.order.status
 
     def update_status(self, order_id: str , status: OrderStatus) -> bool:
-        entry = self._orders.get(order_id)
-        if entry is None:
-            return False
-        entry.order.status = status
-        self._orders[order_id] = entry
-        return True
+        with self._lock:
+            entry = self._orders.get(order_id)
+            if entry is None:
+                return False
+            # copy-on-write: readers holding the old record keep a consistent view
+            if isinstance(entry, CompactOrder):
+                updated = entry.with_status(status)
+            else:
+                updated = entry.model_copy(update={"order": entry.order.model_copy(update={"status": status})})
+            seq = self._seqs[order_id]
+            with self._structure_lock:
+                if self.indexed:
+                    self._by_status.move(_index_fields(entry)[0], status, seq)
+                self._write_count += 1
+                self._orders[order_id] = updated
+                self._versions[seq] = self._write_count
+            self.response_cache.invalidate(order_id)
+            return True
+
+    def order_version(self, order_id: str) -> Optional[int]:
+        """Version of the order's current record (changes on every write), None if unknown. Lock-free."""
+        seq = self._seqs.get(order_id)
+        return self._versions[seq] if seq is not None else None
+
+    def get_versioned(self, order_id: str) -> Optional[Tuple[int, OrderEntry]]:
+        """get() together with the version of the record it was built from."""
+        with self._structure_lock:
+            seq = self._seqs.get(order_id)
+            if seq is None:
+                return None
+            version, record = self._versions[seq], self._orders[order_id]
+        entry = record.to_entry(order_id) if isinstance(record, CompactOrder) else record
+        return version, entry
+
+    def query_orders(
+        self,
+        status: Optional[OrderStatus] = None,
+        customer_id: Optional[str] = None,
+        currency: Optional[Currency] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        cursor: int = 0,
+        limit: int = 100,
+    ) -> OrderQueryPage:
+        """
+        Up to `limit` ids of orders matching every given filter (order_date in [since, until),
+        naive datetimes taken as UTC), in insertion order from `cursor` on. Pass next_cursor
+        back for the next page. The smallest matching index bucket drives the scan; the other
+        filters are checked on the records it yields.
+        """
+        since_us = epoch_us(since) if since is not None else None
+        until_us = epoch_us(until) if until is not None else None
+        order_ids: List[str] = []
+        next_cursor = cursor
+        scan_from = cursor
+        while True:
+            with self._structure_lock:
+                page, scan_from, next_cursor = self._scan_chunk(
+                    order_ids, next_cursor, scan_from, status, customer_id, currency, since_us, until_us, limit
+                )
+            if page is not None:
+                return page
+
+    def _scan_chunk(
+        self,
+        order_ids: List[str],
+        next_cursor: int,
+        scan_from: int,
+        status: Optional[OrderStatus],
+        customer_id: Optional[str],
+        currency: Optional[Currency],
+        since_us: Optional[int],
+        until_us: Optional[int],
+        limit: int,
+    ) -> Tuple[Optional[OrderQueryPage], int, int]:
+        """
+        Scans at most _QUERY_SCAN_CHUNK candidates from seq scan_from on, adding matches to
+        order_ids. Returns (the page if the query is done, where to resume, next_cursor). Called
+        with _structure_lock held; query_orders releases it between chunks so writers get in.
+        """
+        scanned = 0
+        has_more = False
+        for seq in self._candidates(status, customer_id, currency, since_us, until_us, scan_from):
+            if scanned == _QUERY_SCAN_CHUNK:
+                return None, seq, next_cursor
+            scanned += 1
+            order_id = self._order_ids[seq]
+            record_status, record_customer, record_currency, date_us = _index_fields(self._orders[order_id])
+            if (
+                (status is not None and record_status != status)
+                or (customer_id is not None and record_customer != customer_id)
+                or (currency is not None and record_currency != currency)
+                or (since_us is not None and date_us < since_us)
+                or (until_us is not None and date_us >= until_us)
+            ):
+                continue
+            if len(order_ids) == limit:
+                has_more = True
+                break
+            order_ids.append(order_id)
+            next_cursor = seq + 1
+        if not has_more:
+            next_cursor = max(next_cursor, len(self._order_ids))
+        return OrderQueryPage(order_ids, next_cursor, has_more), scan_from, next_cursor
+
+    def _candidates(
+        self,
+        status: Optional[OrderStatus],
+        customer_id: Optional[str],
+        currency: Optional[Currency],
+        since_us: Optional[int],
+        until_us: Optional[int],
+        cursor: int,
+    ) -> Iterator[int]:
+        if not self.indexed:
+            return iter(range(cursor, len(self._order_ids)))
+        # (index, keys) per filter; an order is under exactly one key of each index
+        filters = []
+        if status is not None:
+            filters.append((self._by_status, [status]))
+        if customer_id is not None:
+            filters.append((self._by_customer, [customer_id]))
+        if currency is not None:
+            filters.append((self._by_currency, [currency]))
+        if since_us is not None or until_us is not None:
+            first = since_us // self.date_bucket_us if since_us is not None else None
+            last = (until_us - 1) // self.date_bucket_us if until_us is not None else None
+            buckets = [
+                b for b in self._by_date_bucket.keys()
+                if (first is None or b >= first) and (last is None or b <= last)
+            ]
+            filters.append((self._by_date_bucket, buckets))
+        if not filters:
+            return iter(range(cursor, len(self._order_ids)))
+        # A match is in every filter's set, so none comes before the largest of their first entries
+        for index, keys in filters:
+            firsts = [seq for seq in (index.first_from(key, cursor) for key in keys) if seq is not None]
+            if not firsts:
+                return iter(())
+            cursor = max(cursor, min(firsts))
+        index, keys = min(filters, key=lambda f: sum(f[0].count(key) for key in f[1]))
+        return index.merged_seqs_from(keys, cursor)
+
+    def order_counts(self) -> Dict[str, Dict[str, int]]:
+        """Number of orders per status and per currency, read from the indexes (else counted from a copy)."""
+        with self._structure_lock:
+            if self.indexed:
+                by_status = self._by_status.counts()
+                by_currency = self._by_currency.counts()
+            else:
+                records = list(self._orders.values())
+        if not self.indexed:
+            by_status, by_currency = {}, {}
+            for record in records:
+                status, _, currency, _ = _index_fields(record)
+                by_status[status] = by_status.get(status, 0) + 1
+                by_currency[currency] = by_currency.get(currency, 0) + 1
+        return {
+            "byStatus": {s.value: n for s, n in by_status.items()},
+            "byCurrency": {c.value: n for c, n in by_currency.items()},
+        }
+
+    def track_received_id(self, topic: str, order_id: str, partition: int = -1, offset: int = -1) -> None:
+        with self._lock, self._structure_lock:
+            log = self._received_ids_by_topic.get(topic)
+            if log is None:
+                log = self._received_ids_by_topic[topic] = ReceivedIdLog(
+                    self._received_id_codes, self.received_ids_max_entries, self.received_ids_max_age_sec
+                )
+            log.append(order_id, partition, offset)
+
+    def get_all_ids_for_topic(self, topic: str, distinct: bool = False) -> List[str]:
+        """Every retained id; the log is copied under the lock and the list built outside it."""
+        with self._structure_lock:
+            log = self._received_ids_by_topic.get(topic)
+            if log is None:
+                return []
+            snapshot = log.snapshot()
+        return snapshot.ids(distinct)
+
+    def received_ids_page(self, topic: str, cursor: int = 0, limit: int = 1000, distinct: bool = False) -> ReceivedIdsPage:
+        """One page of a topic's received ids; see ReceivedIdLog.page()."""
+        with self._structure_lock:
+            log = self._received_ids_by_topic.get(topic)
+            if log is None:
+                return ReceivedIdsPage([], cursor, False)
+            return log.page(cursor, limit, distinct)
+
+    # Snapshot support (see snapshot.py)
 
-    def track_received_id(self, topic: str, order_id: str) -> None:
-        self._received_ids_by_topic[topic].append(order_id)
+    def export_orders(self) -> List[Tuple[str, Union[OrderEntry, CompactOrder]]]:
+        """A copy of the (order_id, stored record) pairs; cheap, so it can be taken inside transaction()."""
+        with self._lock, self._structure_lock:
+            return list(self._orders.items())
 
-    def get_all_ids_for_topic(self, topic: str) -> List[str]:
-        return list(self._received_ids_by_topic.get(topic, []))
+    def export_received_ids(self) -> List[Tuple[str, int, List[Tuple[str, int, int]]]]:
+        """Every topic's received-id log as (topic, first sequence number, entries)."""
+        with self._lock, self._structure_lock:
+            return [(topic, log.first_seq, list(log.entries())) for topic, log in self._received_ids_by_topic.items()]
 
+    def restore_received_ids(self, topic: str, first_seq: int, entries: Iterable[Tuple[str, int, int]]) -> None:
+        """Recreates a topic's received-id log; sequence numbers (API cursors) continue from first_seq."""
+        with self._lock, self._structure_lock:
+            log = self._received_ids_by_topic[topic] = ReceivedIdLog(
+                self._received_id_codes, self.received_ids_max_entries, self.received_ids_max_age_sec
+            )
+            log.start_at(first_seq)
+            for order_id, partition, offset in entries:
+                log.append(order_id, partition, offset)
 
+    def read_locked(self, fn: Callable[["OrderDB"], T]) -> T:
+        """
+        Runs fn(db) with no writer active, so several reads observe the same state. Single reads
+        don't need this (see __init__) and the API doesn't use it, as it waits for whole batches.
+        """
+        with self._lock:
+            return fn(self)
@@ -1,14 +1,30 @@
 from __future__ import annotations
 
 import threading
-from confluent_kafka import KafkaException, KafkaError
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, FrozenSet, Iterable, List, Optional, Tuple, Union
+from confluent_kafka import Consumer, KafkaException, KafkaError, TopicPartition
 
 from libs.kafka_common.config import ORDERS_TOPIC
+from libs.kafka_common.event_headers import EVENT_SCHEMA_VERSION, LazyOrderEvent, read_event_headers
+from libs.kafka_common.events import EventType, OrderEvent
 from libs.kafka_common.kafka_factory import create_consumer
+from libs.kafka_common.metrics import Registry, log_buckets
 from libs.kafka_common.serdes_json import deserialize_event
 
 from .consumer_db import OrderDB
-from .order_event_handler import OrderEventHandler
+from .decode_pool import DecodePool
+from .offset_tracker import OffsetTracker
+from .order_event_handler import ConsumedEvent, HandlerMetrics, OrderEventHandler
+from .pending_buffer import PendingStatusBuffer
+from .snapshot import SnapshotError, SnapshotInfo, load_snapshot, save_snapshot
+
+COMMIT_AUTO = "auto"
+COMMIT_MANUAL = "manual"
+
+# producer timestamp to consumer fetch: milliseconds when caught up, minutes when replaying a backlog
+END_TO_END_BUCKETS_SEC = log_buckets(1e-3, 600.0)
 
 
 class ConsumerRunner:
@@ -18,17 +34,126 @@ class ConsumerRunner:
         group_id: str = "order-service",
         max_retries: int = 5,
         retry_backoff_sec: float = 2.0,
+        batch_size: int = 1,
+        batch_timeout_sec: float = 1.0,
+        commit_strategy: str = COMMIT_AUTO,
+        commit_every_messages: int = 1000,
+        commit_interval_ms: int = 5000,
+        event_types: Optional[Iterable[Union[str, EventType]]] = None,
+        dedupe_window: int = 10_000,
+        latency_window: int = 10_000,
+        pending_max_size: int = 100_000,
+        pending_ttl_sec: float = 3600.0,
+        snapshot_path: Optional[str] = None,
+        snapshot_interval_sec: float = 60.0,
+        consumer_factory: Callable[..., Consumer] = create_consumer,
+        metrics: Optional[Registry] = None,
+        lag_interval_sec: float = 1.0,
+        decode_processes: int = 0,
     ) -> None:
+        """
+        batch_size > 1 switches from consumer.poll() to consumer.consume(batch_size, batch_timeout_sec):
+        up to batch_size messages (or whatever arrived within batch_timeout_sec) are deserialized and
+        applied with OrderEventHandler.handle_batch in one DB transaction.
+
+        Events are applied on the consumer thread, in message order. With decode_processes > 0 the
+        payloads of each batch are decoded by that many worker processes first (decode_pool.py), so
+        decoding, most of the per-event CPU time, runs on other cores; this needs a compact db and
+        pays off with batch_size in the hundreds.
+
+        commit_strategy="manual" disables auto-commit: offsets are committed asynchronously once
+        handled, every commit_every_messages messages or commit_interval_ms, and synchronously on
+        stop() and on partition revocation (at-least-once with bounded replay).
+
+        Messages carrying the publisher headers (event_headers.py) are filtered by event_types
+        (None = all), deduplicated by event_id over the last dedupe_window ids (0 = off) and timed
+        from their producer timestamp before any decoding; the payload is decoded lazily by the
+        handler. Messages without headers are decoded up front as before.
+
+        Status updates that arrive before their ORDER_CREATED wait in a PendingStatusBuffer of at
+        most pending_max_size entries, each dropped after pending_ttl_sec; it survives reconnects.
+
+        With a snapshot_path, the DB, the pending buffer and the processed offsets are saved there
+        every snapshot_interval_sec and on stop (see snapshot.py). start() loads the snapshot, and
+        each partition assigned later is consumed from the last offset this instance processed,
+        so a restart only replays the tail of the topic.
+
+        Events handled, handle/decode times, decode pool waits, end-to-end latency, poison messages,
+        duplicates, the pending buffer and the lag of each assigned partition (refreshed every
+        lag_interval_sec) are recorded in metrics.
+        """
+        if commit_strategy not in (COMMIT_AUTO, COMMIT_MANUAL):
+            raise ValueError(f"commit_strategy must be '{COMMIT_AUTO}' or '{COMMIT_MANUAL}'")
+        if decode_processes > 0 and not db.compact:
+            raise ValueError("decode_processes needs a compact OrderDB")
         self.db = db
         self.group_id = group_id
         self.max_retries = max_retries
         self.retry_backoff_sec = retry_backoff_sec
+        self.batch_size = max(1, batch_size)
+        self.batch_timeout_sec = batch_timeout_sec
+        self.commit_strategy = commit_strategy
+        self.commit_every_messages = commit_every_messages
+        self.commit_interval_ms = commit_interval_ms
+        self.event_types: Optional[FrozenSet[EventType]] = (
+            frozenset(EventType(t) for t in event_types) if event_types else None
+        )
+        self.dedupe_window = dedupe_window
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval_sec = snapshot_interval_sec
+        self.consumer_factory = consumer_factory
+        self.decode_pool: Optional[DecodePool] = DecodePool(decode_processes) if decode_processes > 0 else None
+        # next offset to consume per partition, as far as this instance's state goes
+        self._positions: Dict[Tuple[str, int], int] = {}
+        self._restored = False
+        self._last_snapshot_at = 0.0
+        self._seen_event_ids: "OrderedDict[str, None]" = OrderedDict()
+        self._latencies_ms: Deque[int] = deque(maxlen=max(1, latency_window))
+        self.pending = PendingStatusBuffer(max_size=pending_max_size, ttl_sec=pending_ttl_sec)
+        self.filtered = 0
+        self.duplicates = 0
         self._stop_event = threading.Event()
         self._thread: threading.Thread | None = None
+        self._uncommitted = 0
+        self._last_commit_at = 0.0
+        self.lag_interval_sec = lag_interval_sec
+        self._lag: Dict[Tuple[str, str], int] = {}
+        self._lag_refreshed_at = 0.0
+        self.metrics = metrics if metrics is not None else Registry()
+        self._register_metrics(self.metrics)
+
+    def _register_metrics(self, registry: Registry) -> None:
+        self._handler_metrics = HandlerMetrics(registry)
+        self._pool_wait_seconds = registry.histogram(
+            "order_consumer_decode_pool_wait_seconds", "Time the consumer thread waits for a batch's payloads from the decode pool"
+        )
+        self._poison = registry.counter("order_consumer_poison_messages_total", "Messages skipped because they could not be decoded or applied")
+        registry.counter_fn("order_consumer_duplicates_total", "Messages skipped as redeliveries of a recent event id", lambda: self.duplicates)
+        registry.counter_fn("order_consumer_filtered_total", "Messages skipped for their event type", lambda: self.filtered)
+        self._end_to_end_seconds = registry.histogram(
+            "order_consumer_end_to_end_latency_seconds",
+            "Time from the producer timestamp header to the consumer fetching the message",
+            buckets=END_TO_END_BUCKETS_SEC,
+        )
+        registry.gauge(
+            "order_consumer_lag",
+            "Messages behind the partition's high watermark, as of the last fetch",
+            lambda: dict(self._lag),
+            ("topic", "partition"),
+        )
+        registry.gauge("order_pending_status_size", "Status updates waiting for their ORDER_CREATED", lambda: len(self.pending))
+        registry.counter_fn("order_pending_status_evictions_total", "Buffered status updates dropped (expired or overflow)", lambda: self.pending.evictions)
+
+    @property
+    def poison(self) -> int:
+        return int(self._poison.value)
 
     def start(self) -> None:
         if self._thread and self._thread.is_alive():
             return
+        if not self._restored:
+            self._restored = True
+            self.restore_snapshot()
         self._stop_event.clear()
         self._thread = threading.Thread(target=self._run_with_reconnect, daemon=True)
         self._thread.start()
@@ -37,6 +162,39 @@ class ConsumerRunner:
         self._stop_event.set()
         if self._thread:
             self._thread.join(timeout=5)
+        if self.decode_pool is not None:
+            self.decode_pool.close()
+
+    def restore_snapshot(self) -> Optional[SnapshotInfo]:
+        """Loads the snapshot (if there is a usable one) into the DB and pending buffer."""
+        if not self.snapshot_path:
+            return None
+        try:
+            info = load_snapshot(self.snapshot_path, self.db, self.pending)
+        except FileNotFoundError:
+            return None
+        except (OSError, SnapshotError) as e:
+            print(f"Ignoring unusable snapshot, replaying the topic: {e}")
+            return None
+        self._positions.update(info.offsets)
+        print(f"Restored snapshot: {info.orders} orders, {info.pending} pending, {len(info.offsets)} partition offsets")
+        return info
+
+    def _remember_positions(self, tracker: OffsetTracker) -> None:
+        for tp in tracker.positions():
+            self._positions[(tp.topic, tp.partition)] = tp.offset
+
+    def _snapshot(self, tracker: OffsetTracker) -> None:
+        # positions first: the state copied afterwards is at least as recent as they are
+        self._remember_positions(tracker)
+        try:
+            info = save_snapshot(self.snapshot_path, self.db, self.pending, dict(self._positions))
+        except Exception as e:
+            print(f"Failed to write snapshot: {e}")
+            return
+        finally:
+            self._last_snapshot_at = time.monotonic()
+        print(f"Snapshot written: {info.orders} orders, {info.size_bytes} bytes")
 
     def _run_with_reconnect(self) -> None:
         """Wrapper that handles reconnection on failures."""
@@ -58,33 +216,256 @@ class ConsumerRunner:
         if retry_count >= self.max_retries:
             print("Max retries reached. Consumer stopped.")
 
+    def _fetch(self, consumer: Consumer) -> List[Any]:
+        if self.batch_size == 1:
+            msg = consumer.poll(self.batch_timeout_sec)
+            return [] if msg is None else [msg]
+        return consumer.consume(num_messages=self.batch_size, timeout=self.batch_timeout_sec)
+
+    @staticmethod
+    def _split_errors(messages: List[Any]) -> Tuple[List[Any], Optional[KafkaError]]:
+        """Returns the data messages before the first fatal error, and that error (if any)."""
+        data: List[Any] = []
+        for msg in messages:
+            if msg.error():
+                # Topic not available yet - just wait, don't fail
+                if msg.error().code() == KafkaError.UNKNOWN_TOPIC_OR_PART:
+                    continue
+                return data, msg.error()
+            data.append(msg)
+        return data, None
+
+    def _admit(self, msg: Any) -> bool:
+        """
+        Header-only checks, run on the consumer thread before a message is handed on: records the
+        end-to-end latency and drops unwanted event types and recently seen event ids.
+        """
+        headers = read_event_headers(msg.headers())
+        if headers is None:
+            return True
+        if headers.produced_at_ms is not None:
+            latency_ms = int(time.time() * 1000) - headers.produced_at_ms
+            self._latencies_ms.append(latency_ms)
+            # clock skew between hosts can make it negative
+            self._end_to_end_seconds.observe(max(0, latency_ms) / 1000.0)
+        if self.event_types is not None and headers.event_type not in self.event_types:
+            self.filtered += 1
+            return False
+        if self.dedupe_window > 0 and headers.event_id is not None:
+            seen = self._seen_event_ids
+            if headers.event_id in seen:
+                seen.move_to_end(headers.event_id)
+                self.duplicates += 1
+                return False
+            seen[headers.event_id] = None
+            if len(seen) > self.dedupe_window:
+                seen.popitem(last=False)
+        return True
+
+    def latency_ms(self) -> Dict[str, int]:
+        """Producer-to-consumer latency percentiles over the last latency_window messages with headers."""
+        samples = sorted(self._latencies_ms)
+        if not samples:
+            return {}
+        pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))]
+        return {"count": len(samples), "p50": pick(0.50), "p99": pick(0.99), "max": samples[-1]}
+
+    def _to_event(self, msg: Any) -> Optional[Union[OrderEvent, LazyOrderEvent]]:
+        """Wraps a message with headers in a LazyOrderEvent, decodes the rest. None = filtered out."""
+        headers = read_event_headers(msg.headers())
+        key = msg.key()
+        if headers is not None and key and headers.schema_version == EVENT_SCHEMA_VERSION:
+            return LazyOrderEvent(msg.value(), headers, key.decode("utf-8"))
+        started = time.perf_counter()
+        event = deserialize_event(msg.value())
+        self._handler_metrics.deserialize_seconds.observe(time.perf_counter() - started)
+        if self.event_types is not None and event.event_type not in self.event_types:
+            self.filtered += 1
+            return None
+        return event
+
+    def _apply(self, handler: OrderEventHandler, messages: List[Any]) -> None:
+        """Turns data messages into events and applies them in order. Poison messages are skipped individually."""
+        batch: List[ConsumedEvent] = []
+        for msg in messages:
+            try:
+                event = self._to_event(msg)
+            except Exception as e:
+                self._poison.inc()
+                print(f"Failed to process message: {e}")
+                continue
+            if event is not None:
+                batch.append(ConsumedEvent(event, msg.topic(), msg.partition(), msg.offset()))
+        if self.decode_pool is not None:
+            self._predecode(batch)
+
+        for _, e in handler.handle_batch(batch):
+            self._poison.inc()
+            print(f"Failed to process message: {e}")
+
+    def _predecode(self, batch: List[ConsumedEvent]) -> None:
+        """
+        Replaces the LazyOrderEvents of batch with their payloads decoded by the decode pool.
+        ORDER_CREATED events of orders already in the DB are left for the handler to drop undecoded.
+        """
+        indexes = [
+            i for i, item in enumerate(batch)
+            if isinstance(item.event, LazyOrderEvent)
+            and not (item.event.event_type == EventType.ORDER_CREATED and self.db.contains(item.event.order_id))
+        ]
+        if len(indexes) < self.decode_pool.min_pooled:
+            return  # cheaper to decode on this thread than to round-trip
+        started = time.perf_counter()
+        decoded = self.decode_pool.decode([batch[i].event for i in indexes])
+        self._pool_wait_seconds.observe(time.perf_counter() - started)
+        for i, event in zip(indexes, decoded):
+            if event is not None:
+                batch[i] = batch[i]._replace(event=event)
+
+    def _process(self, handler: OrderEventHandler, messages: List[Any], tracker: Optional[OffsetTracker]) -> None:
+        data, fatal = self._split_errors(messages)
+        # Apply what was read before the error so it is not lost on reconnect.
+        # Skipped messages are still tracked so their offsets are committed.
+        if tracker is not None:
+            admitted = []
+            for msg in data:
+                tracker.begin(msg.topic(), msg.partition(), msg.offset())
+                if self._admit(msg):
+                    admitted.append(msg)
+                else:
+                    tracker.complete(msg.topic(), msg.partition(), msg.offset())
+            self._apply(handler, admitted)
+            for msg in admitted:
+                tracker.complete(msg.topic(), msg.partition(), msg.offset())
+        else:
+            self._apply(handler, [msg for msg in data if self._admit(msg)])
+        self._uncommitted += len(data)
+
+        if fatal is not None:
+            raise KafkaException(fatal)
+
+    def _refresh_lag(self, consumer: Consumer) -> None:
+        """
+        Lag per assigned partition from the consumer's local state only: the high watermark of the
+        last fetch response (cached=True, no broker round trip) minus the fetch position.
+        """
+        lag: Dict[Tuple[str, str], int] = {}
+        try:
+            for tp in consumer.position(consumer.assignment()):
+                if tp.offset < 0:
+                    continue  # nothing fetched from this partition yet
+                offsets = consumer.get_watermark_offsets(tp, cached=True)
+                if offsets is None or offsets[1] < 0:
+                    continue
+                lag[(tp.topic, str(tp.partition))] = max(0, offsets[1] - tp.offset)
+        except KafkaException as e:
+            print(f"Failed to read consumer lag: {e}")
+        else:
+            self._lag = lag
+        self._lag_refreshed_at = time.monotonic()
+
+    @staticmethod
+    def _store_offsets(consumer: Consumer, offsets: List[TopicPartition]) -> None:
+        if not offsets:
+            return
+        try:
+            consumer.store_offsets(offsets=offsets)
+        except KafkaException as e:
+            # Partitions revoked in the meantime; their new owner re-reads from the last commit
+            print(f"Failed to store offsets: {e}")
+
+    @staticmethod
+    def _commit(consumer: Consumer, offsets: List[TopicPartition], asynchronous: bool) -> None:
+        if not offsets:
+            return
+        try:
+            consumer.commit(offsets=offsets, asynchronous=asynchronous)
+        except KafkaException as e:
+            print(f"Failed to commit offsets: {e}")
+
+    def _checkpoint(self, consumer: Consumer, tracker: OffsetTracker) -> None:
+        """Hands processed offsets to Kafka: committed per the manual policy, or stored for auto-commit."""
+        if self.commit_strategy == COMMIT_MANUAL:
+            now = time.monotonic()
+            due = (
+                self._uncommitted >= self.commit_every_messages
+                or (now - self._last_commit_at) * 1000 >= self.commit_interval_ms
+            )
+            if due:
+                self._commit(consumer, tracker.collect(), asynchronous=True)
+                self._uncommitted = 0
+                self._last_commit_at = now
+        else:
+            self._store_offsets(consumer, tracker.collect())
+
+    def _final_checkpoint(self, consumer: Consumer, tracker: OffsetTracker, partitions: Optional[List[TopicPartition]] = None) -> None:
+        """Synchronously hands over everything processed (for the given partitions, or all)."""
+        positions = tracker.positions()
+        if partitions is not None:
+            wanted = {(tp.topic, tp.partition) for tp in partitions}
+            positions = [tp for tp in positions if (tp.topic, tp.partition) in wanted]
+        if self.commit_strategy == COMMIT_MANUAL:
+            self._commit(consumer, positions, asynchronous=False)
+        else:
+            self._store_offsets(consumer, positions)
+
     def _run(self) -> None:
         """Main consumer loop."""
-        consumer = create_consumer(
+        manual = self.commit_strategy == COMMIT_MANUAL
+        tracked = manual or bool(self.snapshot_path)
+        extra_config: Dict[str, Any] = {}
+        if tracked:
+            # Offsets are handed over only once the whole prefix has been applied
+            extra_config["enable.auto.offset.store"] = False
+        if manual:
+            extra_config["enable.auto.commit"] = False
+        consumer = self.consumer_factory(
             group_id=self.group_id,
-            auto_offset_reset="earliest"
+            auto_offset_reset="earliest",
+            extra_config=extra_config or None,
         )
-        handler = OrderEventHandler(self.db)
-        consumer.subscribe([ORDERS_TOPIC])
+        handler = OrderEventHandler(self.db, self.pending, self._handler_metrics)
+
+        tracker: Optional[OffsetTracker] = OffsetTracker() if tracked else None
+        def on_revoke(c: Consumer, partitions: List[TopicPartition]) -> None:
+            if tracker is None:
+                return
+            self._final_checkpoint(c, tracker, partitions)
+            self._remember_positions(tracker)
+            tracker.forget(partitions)
+
+        def on_assign(c: Consumer, partitions: List[TopicPartition]) -> None:
+            # Resume where this instance's state ends (snapshot or earlier ownership), not at the
+            # group's committed offset, which may be ahead of what this DB has seen
+            if not self.snapshot_path:
+                return
+            for tp in partitions:
+                position = self._positions.get((tp.topic, tp.partition))
+                if position is not None:
+                    tp.offset = position
+            c.assign(partitions)
+
+        consumer.subscribe([ORDERS_TOPIC], on_assign=on_assign, on_revoke=on_revoke)
+        self._uncommitted = 0
+        self._last_commit_at = time.monotonic()
+        self._last_snapshot_at = time.monotonic()
 
         try:
             while not self._stop_event.is_set():
-                msg = consumer.poll(1.0)
-                if msg is None:
-                    continue
-
-                if msg.error():
-                    # Topic not available yet - just wait, don't fail
-                    if msg.error().code() == KafkaError.UNKNOWN_TOPIC_OR_PART:
-                        continue
-                    raise KafkaException(msg.error())
-
-                try:
-                    event = deserialize_event(msg.value())
-                    handler.handle(event, topic=msg.topic())
-                except Exception as e:
-                    print(f"Failed to process message: {e}")
-                    continue
+                messages = self._fetch(consumer)
+                if messages:
+                    self._process(handler, messages, tracker)
+                if time.monotonic() - self._lag_refreshed_at >= self.lag_interval_sec:
+                    self._refresh_lag(consumer)
+                if tracker is not None:
+                    self._checkpoint(consumer, tracker)
+                    if self.snapshot_path and time.monotonic() - self._last_snapshot_at >= self.snapshot_interval_sec:
+                        self._snapshot(tracker)
 
         finally:
+            if tracker is not None:
+                self._final_checkpoint(consumer, tracker)
+                if self.snapshot_path:
+                    self._snapshot(tracker)
             consumer.close()
+            self._lag = {}
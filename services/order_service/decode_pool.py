@@ -0,0 +1,95 @@
+"""
+Payload decoding in worker processes, so one order-service process uses more than one core.
+
+Decoding and validating payloads is most of the consumer's CPU time, and threads can't share it
+out (the GIL). With a DecodePool the consumer thread still fetches, filters, deduplicates and
+applies every event itself, in message order, so per-order ordering, the pending status buffer
+and offset tracking are the same as without it; only the payloads are parsed in the workers.
+
+Workers send back what the DB stores (DecodedOrderCreated carries a CompactOrder) instead of
+Pydantic models, which cost the consumer thread as much to unpickle and rebuild as to decode, so
+the pool is only used with a compact OrderDB.
+"""
+from __future__ import annotations
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Sequence, Tuple
+
+from libs.kafka_common.event_headers import LazyOrderEvent
+from libs.kafka_common.events import OrderCreatedEvent
+from libs.kafka_common.serdes_json import deserialize_event
+
+from .consumer_db import CompactOrder
+from .models import OrderEntry
+from .order_event_handler import DecodedEvent, DecodedOrderCreated, DecodedStatusUpdate, OrderEventHandler
+
+MIN_POOLED_PAYLOADS = 32
+
+# (payload, event type value from the headers, order id from the message key)
+_Job = Tuple[bytes, str, str]
+
+
+def decode_payloads(jobs: Sequence[_Job]) -> List[Optional[DecodedEvent]]:
+    """
+    Runs in a worker process. None for a payload that can't be decoded or contradicts its
+    headers: the consumer thread decodes that one itself and reports the error as usual.
+    """
+    decoded: List[Optional[DecodedEvent]] = []
+    for raw, event_type, order_id in jobs:
+        try:
+            event = deserialize_event(raw)
+        except Exception:
+            decoded.append(None)
+            continue
+        if event.event_type.value != event_type or event.order_id != order_id:
+            decoded.append(None)
+        elif isinstance(event, OrderCreatedEvent):
+            shipping_cost = OrderEventHandler.calculate_shipping_cost(event.order.total_amount)
+            record = CompactOrder(OrderEntry(order=event.order, shipping_cost=shipping_cost))
+            decoded.append(DecodedOrderCreated(event.event_id, order_id, record))
+        else:
+            decoded.append(DecodedStatusUpdate(event.event_id, order_id, event.status))
+    return decoded
+
+
+class DecodePool:
+    def __init__(self, processes: int, min_pooled: int = MIN_POOLED_PAYLOADS) -> None:
+        """
+        processes worker processes, started on first use. They are spawned, not forked: the
+        consumer process runs librdkafka and API threads. Callers decode batches of fewer than
+        min_pooled payloads themselves; the round trip would cost more.
+        """
+        if processes < 1:
+            raise ValueError("processes must be at least 1")
+        self.processes = processes
+        self.min_pooled = min_pooled
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def decode(self, events: Sequence[LazyOrderEvent]) -> List[Optional[DecodedEvent]]:
+        """
+        Decodes the payloads of events, split into one contiguous chunk per worker; the results
+        are in the order of events. None = decode that event on the consumer thread (bad
+        payloads, and everything if the pool broke; a new pool is started next time).
+        """
+        jobs = [(bytes(e.payload), e.event_type.value, e.order_id) for e in events]
+        chunk = -(-len(jobs) // self.processes)
+        executor = self._ensure_executor()
+        try:
+            futures = [executor.submit(decode_payloads, jobs[i:i + chunk]) for i in range(0, len(jobs), chunk)]
+            return [decoded for future in futures for decoded in future.result()]
+        except BrokenProcessPool as e:
+            print(f"Decode pool failed, decoding on the consumer thread: {e}")
+            self.close()
+            return [None] * len(events)
+
+    def _ensure_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
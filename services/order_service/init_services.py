@@ -1,5 +1,49 @@
+from libs.kafka_common.config import (
+    ORDER_CONSUMER_BATCH_SIZE,
+    ORDER_CONSUMER_BATCH_TIMEOUT_SEC,
+    ORDER_CONSUMER_COMMIT_EVERY_MESSAGES,
+    ORDER_CONSUMER_COMMIT_INTERVAL_MS,
+    ORDER_CONSUMER_COMMIT_STRATEGY,
+    ORDER_CONSUMER_DECODE_PROCESSES,
+    ORDER_CONSUMER_DEDUPE_WINDOW,
+    ORDER_CONSUMER_EVENT_TYPES,
+    ORDER_DB_COMPACT,
+    ORDER_DB_DATE_BUCKET_SEC,
+    ORDER_DB_INDEXES,
+    ORDER_DB_RECEIVED_IDS_MAX_AGE_SEC,
+    ORDER_DB_RECEIVED_IDS_MAX_ENTRIES,
+    ORDER_DETAILS_CACHE_MAX_BYTES,
+    ORDER_PENDING_STATUS_MAX,
+    ORDER_PENDING_STATUS_TTL_SEC,
+    ORDER_SNAPSHOT_INTERVAL_SEC,
+    ORDER_SNAPSHOT_PATH,
+)
+from libs.kafka_common.metrics import Registry
 from services.order_service.consumer_db import OrderDB
 from services.order_service.consumer_runner import ConsumerRunner
 
-db = OrderDB()
-consumer_runner = ConsumerRunner(db=db)
+metrics = Registry()
+db = OrderDB(
+    compact=ORDER_DB_COMPACT,
+    received_ids_max_entries=ORDER_DB_RECEIVED_IDS_MAX_ENTRIES,
+    received_ids_max_age_sec=ORDER_DB_RECEIVED_IDS_MAX_AGE_SEC,
+    indexed=ORDER_DB_INDEXES,
+    date_bucket_sec=ORDER_DB_DATE_BUCKET_SEC,
+    response_cache_max_bytes=ORDER_DETAILS_CACHE_MAX_BYTES,
+)
+consumer_runner = ConsumerRunner(
+    db=db,
+    batch_size=ORDER_CONSUMER_BATCH_SIZE,
+    batch_timeout_sec=ORDER_CONSUMER_BATCH_TIMEOUT_SEC,
+    commit_strategy=ORDER_CONSUMER_COMMIT_STRATEGY,
+    commit_every_messages=ORDER_CONSUMER_COMMIT_EVERY_MESSAGES,
+    commit_interval_ms=ORDER_CONSUMER_COMMIT_INTERVAL_MS,
+    event_types=ORDER_CONSUMER_EVENT_TYPES or None,
+    dedupe_window=ORDER_CONSUMER_DEDUPE_WINDOW,
+    pending_max_size=ORDER_PENDING_STATUS_MAX,
+    pending_ttl_sec=ORDER_PENDING_STATUS_TTL_SEC,
+    snapshot_path=ORDER_SNAPSHOT_PATH or None,
+    snapshot_interval_sec=ORDER_SNAPSHOT_INTERVAL_SEC,
+    metrics=metrics,
+    decode_processes=ORDER_CONSUMER_DECODE_PROCESSES,
+)
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from confluent_kafka import TopicPartition
+
+
+class _PartitionProgress:
+    __slots__ = ("dispatched", "completed", "next_offset", "reported")
+
+    def __init__(self) -> None:
+        self.dispatched: Deque[int] = deque()
+        self.completed: Set[int] = set()
+        self.next_offset: Optional[int] = None
+        self.reported: Optional[int] = None
+
+
+class OffsetTracker:
+    """
+    Tracks which offsets of each partition have been fully processed.
+
+    Messages may finish out of order (skipped messages complete before the batch they were
+    read with is applied), so a partition's safe position is the offset after the longest
+    fully-processed prefix of the begun offsets. Offsets must be begun in increasing order per
+    partition. Thread-safe.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._partitions: Dict[Tuple[str, int], _PartitionProgress] = {}
+
+    def begin(self, topic: str, partition: int, offset: int) -> None:
+        with self._lock:
+            progress = self._partitions.get((topic, partition))
+            if progress is None:
+                progress = self._partitions[(topic, partition)] = _PartitionProgress()
+            progress.dispatched.append(offset)
+
+    def complete(self, topic: str, partition: int, offset: int) -> None:
+        with self._lock:
+            progress = self._partitions.get((topic, partition))
+            if progress is None:
+                return
+            progress.completed.add(offset)
+            while progress.dispatched and progress.dispatched[0] in progress.completed:
+                done = progress.dispatched.popleft()
+                progress.completed.discard(done)
+                progress.next_offset = done + 1
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return sum(len(p.dispatched) for p in self._partitions.values())
+
+    def positions(self) -> List[TopicPartition]:
+        """The next offset to consume for every partition with processed messages."""
+        with self._lock:
+            return [
+                TopicPartition(topic, partition, p.next_offset)
+                for (topic, partition), p in self._partitions.items()
+                if p.next_offset is not None
+            ]
+
+    def collect(self) -> List[TopicPartition]:
+        """Positions that advanced since the previous collect()."""
+        with self._lock:
+            advanced: List[TopicPartition] = []
+            for (topic, partition), p in self._partitions.items():
+                if p.next_offset is not None and p.next_offset != p.reported:
+                    advanced.append(TopicPartition(topic, partition, p.next_offset))
+                    p.reported = p.next_offset
+            return advanced
+
+    def forget(self, partitions: List[TopicPartition]) -> None:
+        """Drops state for partitions that are no longer assigned to this consumer."""
+        with self._lock:
+            for tp in partitions:
+                self._partitions.pop((tp.topic, tp.partition), None)
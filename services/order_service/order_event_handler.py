@@ -1,10 +1,14 @@
 from __future__ import annotations
-from typing import Dict
+import time
+from typing import List, NamedTuple, Optional, Sequence, Tuple, Union
 
-from libs.kafka_common.events import OrderCreatedEvent, OrderStatusUpdatedEvent, OrderEvent
+from libs.kafka_common.event_headers import LazyOrderEvent
+from libs.kafka_common.events import EventType, OrderCreatedEvent, OrderStatusUpdatedEvent, OrderEvent
+from libs.kafka_common.metrics import Registry
 from libs.kafka_common.models import OrderStatus
-from .consumer_db import OrderDB
+from .consumer_db import CompactOrder, OrderDB
 from .models import OrderEntry
+from .pending_buffer import PendingStatusBuffer
 
 
 class OrderAlreadyExists(Exception):
@@ -14,25 +18,110 @@ class OrderAlreadyExists(Exception):
 class OrderNotFound(Exception):
     pass
 
+class DecodedOrderCreated(NamedTuple):
+    """An ORDER_CREATED decoded by a worker process (decode_pool.py), carried as the record to store."""
+    event_id: Optional[str]
+    order_id: str
+    record: CompactOrder
+    event_type = EventType.ORDER_CREATED
+
+
+class DecodedStatusUpdate(NamedTuple):
+    """An ORDER_STATUS_UPDATED decoded by a worker process (decode_pool.py)."""
+    event_id: Optional[str]
+    order_id: str
+    status: OrderStatus
+    event_type = EventType.ORDER_STATUS_UPDATED
+
+
+DecodedEvent = Union[DecodedOrderCreated, DecodedStatusUpdate]
+
+
+class ConsumedEvent(NamedTuple):
+    """A deserialized (or lazily decoded) event together with where it was read from."""
+    event: Union[OrderEvent, LazyOrderEvent, DecodedEvent]
+    topic: str
+    partition: int = -1
+    offset: int = -1
+
+
+class HandlerMetrics:
+    """Per-event instruments, registered in (or taken from) a service's metrics Registry."""
+
+    def __init__(self, registry: Registry) -> None:
+        self.events = registry.counter("order_consumer_events_total", "Events handled, by event type", ("event_type",))
+        self.handle_seconds = registry.histogram(
+            "order_consumer_handle_seconds", "Time to apply one event, including decoding its payload", ("event_type",)
+        )
+        self.deserialize_seconds = registry.histogram("order_consumer_deserialize_seconds", "Time to decode one event payload")
+        self._by_type = {t: (self.events.labels(t.value), self.handle_seconds.labels(t.value)) for t in EventType}
+
+    def record(self, event_type: EventType, seconds: float) -> None:
+        events, handle_seconds = self._by_type[event_type]
+        events.inc()
+        handle_seconds.observe(seconds)
+
+
 class OrderEventHandler:
-    def __init__(self, db: OrderDB) -> None:
+    def __init__(self, db: OrderDB, pending: Optional[PendingStatusBuffer] = None, metrics: Optional[HandlerMetrics] = None) -> None:
+        """
+        pending buffers status updates that arrive before their ORDER_CREATED (bounded, with TTL).
+        With metrics, handle_batch counts and times every event, and lazy payload decoding is timed.
+        """
         self.db = db
-        self._pending_status: Dict[str, OrderStatus] = {}
+        self._pending_status = pending if pending is not None else PendingStatusBuffer()
+        self.metrics = metrics
 
-    def handle(self, event: OrderEvent, topic: str) -> None:
-        self.db.track_received_id(topic, event.order_id)
+    def handle(self, event: Union[OrderEvent, LazyOrderEvent, DecodedEvent], topic: str, partition: int = -1, offset: int = -1) -> None:
+        """
+        Applies one event. A LazyOrderEvent is only decoded when its payload is needed:
+        an ORDER_CREATED for an order that already exists is dropped without parsing it.
+        """
+        self.db.track_received_id(topic, event.order_id, partition, offset)
 
+        if event.event_type == EventType.ORDER_CREATED and self.db.contains(event.order_id):
+            return
+        if isinstance(event, LazyOrderEvent):
+            event = self._decode(event)
 
         if isinstance(event, OrderCreatedEvent):
             self._handle_created(event)
-        elif isinstance(event, OrderStatusUpdatedEvent):
+        elif isinstance(event, DecodedOrderCreated):
+            self._handle_decoded_created(event)
+        elif isinstance(event, (OrderStatusUpdatedEvent, DecodedStatusUpdate)):
             self._handle_status_updated(event)
 
+    def handle_batch(self, batch: Sequence[ConsumedEvent]) -> List[Tuple[ConsumedEvent, Exception]]:
+        """
+        Applies a batch of events in order inside a single DB transaction.
+        A failing event does not abort the batch; failures are returned for the caller to report.
+        """
+        failures: List[Tuple[ConsumedEvent, Exception]] = []
+        metrics = self.metrics
+        with self.db.transaction():
+            for item in batch:
+                started = time.perf_counter()
+                try:
+                    self.handle(item.event, item.topic, item.partition, item.offset)
+                except Exception as e:
+                    failures.append((item, e))
+                if metrics is not None:
+                    metrics.record(item.event.event_type, time.perf_counter() - started)
+        return failures
+
+    def _decode(self, event: LazyOrderEvent) -> OrderEvent:
+        if self.metrics is None:
+            return event.decode()
+        started = time.perf_counter()
+        decoded = event.decode()
+        self.metrics.deserialize_seconds.observe(time.perf_counter() - started)
+        return decoded
+
     def _handle_created(self, event: OrderCreatedEvent) -> None:
         order = event.order
-        if self.db.get(order.order_id) is not None:
+        if self.db.contains(order.order_id):
             return
-        pending = self._pending_status.pop(order.order_id, None)
+        pending = self._pending_status.pop(order.order_id)
         if pending is not None:
             order.status = pending
 
@@ -40,13 +129,20 @@ class OrderEventHandler:
         entry = OrderEntry(order=order, shipping_cost=shipping_cost)
         self.db.add_order(entry)
 
-    def _handle_status_updated(self, event: OrderStatusUpdatedEvent) -> None:
-        entry = self.db.get(event.order_id)
-        if entry is None:
-            self._pending_status[event.order_id] = event.status
+    def _handle_decoded_created(self, event: DecodedOrderCreated) -> None:
+        if self.db.contains(event.order_id):
+            return
+        pending = self._pending_status.pop(event.order_id)
+        record = event.record if pending is None else event.record.with_status(pending)
+        self.db.add_record(event.order_id, record)
+
+    def _handle_status_updated(self, event: Union[OrderStatusUpdatedEvent, DecodedStatusUpdate]) -> None:
+        current = self.db.get_status(event.order_id)
+        if current is None:
+            self._pending_status.put(event.order_id, event.status)
             return
 
-        if entry.order.status == event.status:
+        if current == event.status:
             return
 
         self.db.update_status(event.order_id, event.status)
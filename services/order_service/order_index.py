@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import heapq
+from array import array
+from bisect import bisect_left, insort
+from typing import Dict, Generic, Hashable, Iterable, Iterator, List, NamedTuple, Optional, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+
+
+class OrderQueryPage(NamedTuple):
+    order_ids: List[str]
+    next_cursor: int
+    has_more: bool
+
+
+class SeqIndex(Generic[K]):
+    """
+    Secondary index: key -> sorted array of order sequence numbers (OrderDB assigns them in
+    insertion order). New orders have the highest number so adding is an append; moving an
+    order between keys (status updates) is a bisect plus a memmove of the newer entries, which
+    stays short because orders are mostly updated soon after they are created.
+    Not thread-safe: OrderDB serializes access.
+    """
+
+    def __init__(self) -> None:
+        self._buckets: Dict[K, array] = {}
+
+    def add(self, key: K, seq: int) -> None:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = array("i")
+        if not bucket or bucket[-1] < seq:
+            bucket.append(seq)
+        else:
+            insort(bucket, seq)
+
+    def remove(self, key: K, seq: int) -> None:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return
+        i = bisect_left(bucket, seq)
+        if i < len(bucket) and bucket[i] == seq:
+            del bucket[i]
+            if not bucket:
+                del self._buckets[key]
+
+    def move(self, old: K, new: K, seq: int) -> None:
+        if old != new:
+            self.remove(old, seq)
+            self.add(new, seq)
+
+    def count(self, key: K) -> int:
+        bucket = self._buckets.get(key)
+        return len(bucket) if bucket is not None else 0
+
+    def counts(self) -> Dict[K, int]:
+        return {key: len(bucket) for key, bucket in self._buckets.items()}
+
+    def keys(self) -> Iterable[K]:
+        return self._buckets.keys()
+
+    def first_from(self, key: K, cursor: int) -> Optional[int]:
+        """Smallest sequence number under key that is >= cursor."""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return None
+        i = bisect_left(bucket, cursor)
+        return bucket[i] if i < len(bucket) else None
+
+    def seqs_from(self, key: K, cursor: int) -> Iterator[int]:
+        """Sequence numbers under key that are >= cursor, ascending."""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return
+        for i in range(bisect_left(bucket, cursor), len(bucket)):
+            yield bucket[i]
+
+    def merged_seqs_from(self, keys: Iterable[K], cursor: int) -> Iterator[int]:
+        """Ascending union of several keys' sequence numbers (an order is under one key per index)."""
+        return heapq.merge(*(self.seqs_from(key, cursor) for key in keys))
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from libs.kafka_common.models import OrderStatus
+
+EVICTED_EXPIRED = "expired"
+EVICTED_OVERFLOW = "overflow"
+
+
+class EvictedStatus(NamedTuple):
+    order_id: str
+    status: OrderStatus
+    arrived_at: float
+    reason: str
+
+
+def log_evicted(evicted: EvictedStatus) -> None:
+    print(f"Dropped pending status '{evicted.status.value}' for {evicted.order_id} ({evicted.reason})")
+
+
+class PendingStatusBuffer:
+    """
+    Status updates waiting for their ORDER_CREATED, bounded in size and age.
+
+    Entries are kept in an OrderedDict in arrival order (a newer update for the same order
+    replaces the status and moves it to the back), so both expiry and overflow evict from the
+    front in O(1). Evicted entries are handed to `sink`. Thread-safe; the sink runs outside the lock.
+    max_size / ttl_sec of 0 disable the respective limit.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 100_000,
+        ttl_sec: float = 3600.0,
+        sink: Callable[[EvictedStatus], None] = log_evicted,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl_sec = ttl_sec
+        self.sink = sink
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, OrderStatus]]" = OrderedDict()
+        self.evicted_expired = 0
+        self.evicted_overflow = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def evictions(self) -> int:
+        return self.evicted_expired + self.evicted_overflow
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": len(self._entries), "evicted_expired": self.evicted_expired, "evicted_overflow": self.evicted_overflow}
+
+    def _expire_locked(self, now: float, evicted: List[EvictedStatus]) -> None:
+        if not self.ttl_sec:
+            return
+        cutoff = now - self.ttl_sec
+        entries = self._entries
+        while entries:
+            order_id, (arrived_at, status) = next(iter(entries.items()))
+            if arrived_at > cutoff:
+                break
+            del entries[order_id]
+            self.evicted_expired += 1
+            evicted.append(EvictedStatus(order_id, status, arrived_at, EVICTED_EXPIRED))
+
+    def _evict_overflow_locked(self, evicted: List[EvictedStatus]) -> None:
+        while self.max_size and len(self._entries) > self.max_size:
+            oldest_id, (arrived_at, oldest_status) = self._entries.popitem(last=False)
+            self.evicted_overflow += 1
+            evicted.append(EvictedStatus(oldest_id, oldest_status, arrived_at, EVICTED_OVERFLOW))
+
+    def _drain(self, evicted: List[EvictedStatus]) -> None:
+        for e in evicted:
+            try:
+                self.sink(e)
+            except Exception as ex:
+                print(f"Pending status sink failed: {ex}")
+
+    def put(self, order_id: str, status: OrderStatus) -> None:
+        evicted: List[EvictedStatus] = []
+        with self._lock:
+            now = self._clock()
+            self._expire_locked(now, evicted)
+            self._entries[order_id] = (now, status)
+            self._entries.move_to_end(order_id)
+            self._evict_overflow_locked(evicted)
+        self._drain(evicted)
+
+    def pop(self, order_id: str) -> Optional[OrderStatus]:
+        """Removes and returns the pending status of an order, unless it expired."""
+        evicted: List[EvictedStatus] = []
+        with self._lock:
+            self._expire_locked(self._clock(), evicted)
+            entry = self._entries.pop(order_id, None)
+        self._drain(evicted)
+        return entry[1] if entry is not None else None
+
+    def export(self) -> List[Tuple[str, OrderStatus, float]]:
+        """Buffered entries as (order_id, status, age in seconds), oldest first."""
+        with self._lock:
+            now = self._clock()
+            return [(order_id, status, now - arrived_at) for order_id, (arrived_at, status) in self._entries.items()]
+
+    def restore(self, entries: Iterable[Tuple[str, OrderStatus, float]]) -> None:
+        """
+        Re-adds exported entries (oldest first), keeping their age. The buffer's own limits apply:
+        entries past ttl_sec and the oldest ones beyond max_size are evicted right away.
+        """
+        evicted: List[EvictedStatus] = []
+        with self._lock:
+            now = self._clock()
+            for order_id, status, age in entries:
+                self._entries[order_id] = (now - age, status)
+                self._entries.move_to_end(order_id)
+            self._expire_locked(now, evicted)
+            self._evict_overflow_locked(evicted)
+        self._drain(evicted)
+
+    def expire(self) -> int:
+        """Evicts expired entries now (they are otherwise evicted lazily on put/pop)."""
+        evicted: List[EvictedStatus] = []
+        with self._lock:
+            self._expire_locked(self._clock(), evicted)
+        self._drain(evicted)
+        return len(evicted)
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import time
+from array import array
+from bisect import bisect_left
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+# Retention is enforced in batches of at most this many entries, so appends stay O(1) amortized.
+_MAX_EVICT_BATCH = 4096
+
+
+class IdInterner:
+    """
+    Maps ids to small int codes so each distinct id is stored once, however often it is logged.
+    Codes are reference counted; a code whose last reference is released is reused.
+    """
+
+    def __init__(self) -> None:
+        self._codes: Dict[str, int] = {}
+        self._values: List[Optional[str]] = []
+        self._refs = array("I")
+        self._free: List[int] = []
+
+    def acquire(self, value: str) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            if self._free:
+                code = self._free.pop()
+                self._values[code] = value
+                self._refs[code] = 0
+            else:
+                code = len(self._values)
+                self._values.append(value)
+                self._refs.append(0)
+            self._codes[value] = code
+        self._refs[code] += 1
+        return code
+
+    def release(self, code: int) -> None:
+        self._refs[code] -= 1
+        if self._refs[code] == 0:
+            del self._codes[self._values[code]]
+            self._values[code] = None
+            self._free.append(code)
+
+    def value(self, code: int) -> str:
+        return self._values[code]
+
+    def values(self) -> List[Optional[str]]:
+        """A copy of the id of every code (None = free), to resolve codes without a lock later."""
+        return list(self._values)
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+
+class ReceivedId(NamedTuple):
+    seq: int
+    order_id: str
+    partition: int
+    offset: int
+
+
+class ReceivedIdsPage(NamedTuple):
+    entries: List[ReceivedId]
+    next_cursor: int
+    has_more: bool
+
+
+def _ids(codes: array, last_seq: array, first_seq: int, value: Callable[[int], Optional[str]], distinct: bool) -> List[str]:
+    if distinct:
+        return [value(code) for seq, code in enumerate(codes, first_seq) if last_seq[code] == seq]
+    return [value(code) for code in codes]
+
+
+class ReceivedIdsSnapshot(NamedTuple):
+    """Copies of a ReceivedIdLog's arrays, taken under the caller's lock and read without it."""
+    codes: array
+    last_seq: array
+    first_seq: int
+    values: List[Optional[str]]
+
+    def ids(self, distinct: bool = False) -> List[str]:
+        return _ids(self.codes, self.last_seq, self.first_seq, self.values.__getitem__, distinct)
+
+
+class ReceivedIdLog:
+    """
+    Append-only log of the order ids received on one topic, with the partition/offset they were read at.
+
+    Entries are kept in parallel typed arrays (interned id code, partition, offset, receive time)
+    and addressed by a sequence number that keeps increasing as old entries are evicted, so it
+    works as a stable pagination cursor. Retention: at most max_entries entries and/or entries
+    younger than max_age_sec (0 = no limit), enforced in batches on append and in full on read.
+
+    The distinct view lists every retained id once, at its most recent entry.
+    Not thread-safe: OrderDB serializes access.
+    """
+
+    def __init__(self, interner: IdInterner, max_entries: int = 0, max_age_sec: float = 0.0, clock: Callable[[], float] = time.time) -> None:
+        self._interner = interner
+        self.max_entries = max_entries
+        self.max_age_sec = max_age_sec
+        self._clock = clock
+        self._codes = array("I")
+        self._partitions = array("i")
+        self._offsets = array("q")
+        self._received_at = array("d")
+        self._first_seq = 0
+        # sequence number of each id's most recent entry, indexed by id code (-1 = not in this log)
+        self._last_seq = array("q")
+        self._evict_batch = max(1, min(_MAX_EVICT_BATCH, max_entries // 16)) if max_entries else _MAX_EVICT_BATCH
+
+    @property
+    def first_seq(self) -> int:
+        return self._first_seq
+
+    @property
+    def end_seq(self) -> int:
+        return self._first_seq + len(self._codes)
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def start_at(self, first_seq: int) -> None:
+        """Sets the sequence number of the first entry; only valid on an empty log."""
+        if self._codes:
+            raise ValueError("start_at() on a non-empty log")
+        self._first_seq = first_seq
+
+    def entries(self) -> Iterator[Tuple[str, int, int]]:
+        """All retained entries as (order_id, partition, offset), oldest first."""
+        value = self._interner.value
+        return ((value(c), p, o) for c, p, o in zip(self._codes, self._partitions, self._offsets))
+
+    def append(self, order_id: str, partition: int = -1, offset: int = -1) -> None:
+        code = self._interner.acquire(order_id)
+        if code >= len(self._last_seq):
+            self._last_seq.extend([-1] * (code + 1 - len(self._last_seq)))
+        self._last_seq[code] = self.end_seq
+        self._codes.append(code)
+        self._partitions.append(partition)
+        self._offsets.append(offset)
+        if self.max_age_sec:
+            self._received_at.append(self._clock())
+        self._enforce_retention()
+
+    def _enforce_retention(self, force: bool = False) -> None:
+        """Evicts what is past the limits: in batches on append, everything due before a read."""
+        due = 0
+        if self.max_entries:
+            due = len(self._codes) - self.max_entries
+        if self.max_age_sec and self._received_at:
+            cutoff = self._clock() - self.max_age_sec
+            if self._received_at[0] < cutoff:
+                due = max(due, bisect_left(self._received_at, cutoff))
+        if due > 0 and (force or due >= self._evict_batch):
+            self._evict(due)
+
+    def _evict(self, n: int) -> None:
+        for i in range(n):
+            code = self._codes[i]
+            if self._last_seq[code] == self._first_seq + i:
+                self._last_seq[code] = -1
+            self._interner.release(code)
+        del self._codes[:n]
+        del self._partitions[:n]
+        del self._offsets[:n]
+        if self._received_at:
+            del self._received_at[:n]
+        self._first_seq += n
+
+    def _entry(self, seq: int) -> ReceivedId:
+        i = seq - self._first_seq
+        return ReceivedId(seq, self._interner.value(self._codes[i]), self._partitions[i], self._offsets[i])
+
+    def page(self, cursor: int = 0, limit: int = 1000, distinct: bool = False) -> ReceivedIdsPage:
+        """
+        Up to `limit` entries from sequence number `cursor` on (evicted entries are skipped).
+        Pass next_cursor back to continue; it also picks up entries appended later.
+        """
+        self._enforce_retention(force=True)
+        seq = max(cursor, self._first_seq)
+        end = self.end_seq
+        entries: List[ReceivedId] = []
+        if distinct:
+            last_seq = self._last_seq
+            codes = self._codes
+            while seq < end and len(entries) < limit:
+                if last_seq[codes[seq - self._first_seq]] == seq:
+                    entries.append(self._entry(seq))
+                seq += 1
+        else:
+            stop = min(end, seq + limit)
+            entries = [self._entry(s) for s in range(seq, stop)]
+            seq = stop
+        return ReceivedIdsPage(entries, seq, seq < end)
+
+    def ids(self, distinct: bool = False) -> List[str]:
+        self._enforce_retention(force=True)
+        return _ids(self._codes, self._last_seq, self._first_seq, self._interner.value, distinct)
+
+    def snapshot(self) -> ReceivedIdsSnapshot:
+        """
+        The retained entries as array copies (memcpy-fast even at 1M entries), so a full listing
+        can be built outside the lock that serializes this log.
+        """
+        self._enforce_retention(force=True)
+        return ReceivedIdsSnapshot(array("I", self._codes), array("q", self._last_seq), self._first_seq, self._interner.values())
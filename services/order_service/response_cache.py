@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional
+
+# Rough per-entry bookkeeping cost (OrderedDict node, tuple, bytes header), counted against max_bytes.
+ENTRY_OVERHEAD_BYTES = 200
+
+
+class CachedResponse(NamedTuple):
+    version: int
+    etag: str
+    body: bytes
+
+
+class ResponseCache:
+    """
+    Serialized responses per order id, tagged with the order version they were built from.
+    LRU with a total size bound of max_bytes (bodies plus ENTRY_OVERHEAD_BYTES each; 0 disables
+    caching). Thread-safe: the API reads and fills it, the consumer invalidates it.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 2**20) -> None:
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._size
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def get(self, key: str, version: int) -> Optional[CachedResponse]:
+        """The cached response if it was built from `version`."""
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None or cached.version != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return cached
+
+    def put(self, key: str, response: CachedResponse) -> None:
+        cost = len(response.body) + ENTRY_OVERHEAD_BYTES
+        if cost > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.get(key)
+            if old is not None:
+                if old.version > response.version:
+                    return  # a newer version was cached meanwhile
+                self._size -= len(old.body) + ENTRY_OVERHEAD_BYTES
+            self._entries[key] = response
+            self._entries.move_to_end(key)
+            self._size += cost
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted.body) + ENTRY_OVERHEAD_BYTES
+                self.evictions += 1
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old.body) + ENTRY_OVERHEAD_BYTES
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
@@ -0,0 +1,251 @@
+"""
+Point-in-time snapshots of the order service state, so a restart only replays the topic tail.
+
+A snapshot holds the OrderDB orders and received-id logs, the pending status buffer and, per
+partition, the offset of the next message not yet reflected in that state. It is written to
+`<path>.tmp`, fsynced and renamed over `<path>`, so readers only ever see complete snapshots.
+
+File layout (little-endian), version 1:
+
+    7s  magic b"ODBSNAP", u8 version, f64 created_at (unix time)
+    u32 n, n x (u16 length + UTF-8)          string table: every id, topic and enum value, stored once
+    u32 n, n x (u32 topic, i32 partition, i64 next offset)
+    u32 n, n x order:
+        u32 order_id, u32 customer_id, i64 order date (epoch us), i32 UTC offset sec (NAIVE_OFFSET = naive),
+        u32 currency, u32 status, u32 item count k, k x u32 item_id, k x i64 quantity,
+        (2 + k) x f64 amounts (total, shipping cost, item prices)
+    u32 n, n x (u32 order_id, u32 status, f64 age sec)              pending status buffer
+    u32 n, n x received-id log:
+        u32 topic, i64 first sequence number, u32 entries m, m x (u32 order_id, i32 partition, i64 offset)
+    u32 CRC-32 of everything above
+
+u32 values other than counts are indexes into the string table.
+"""
+from __future__ import annotations
+
+import os
+import struct
+import time
+import zlib
+from typing import Dict, List, NamedTuple, Tuple
+
+from libs.kafka_common.models import Currency, OrderStatus
+
+from .consumer_db import CompactOrder, OrderDB
+from .pending_buffer import PendingStatusBuffer
+
+SNAPSHOT_MAGIC = b"ODBSNAP"
+SNAPSHOT_VERSION = 1
+NAIVE_OFFSET = -(2 ** 31)
+
+_HEADER = struct.Struct("<7sBd")
+_U32 = struct.Struct("<I")
+_U16 = struct.Struct("<H")
+_OFFSET = struct.Struct("<Iiq")
+_ORDER = struct.Struct("<IIqiIII")
+_PENDING = struct.Struct("<IId")
+_LOG = struct.Struct("<IqI")
+_LOG_ENTRY = struct.Struct("<Iiq")
+
+Offsets = Dict[Tuple[str, int], int]
+
+
+class SnapshotError(Exception):
+    """The snapshot file is unreadable, corrupt or of an unsupported version."""
+
+
+class SnapshotInfo(NamedTuple):
+    created_at: float
+    offsets: Offsets
+    orders: int
+    pending: int
+    size_bytes: int
+
+
+class _StringTable:
+    def __init__(self) -> None:
+        self.index: Dict[str, int] = {}
+
+    def ref(self, value: str) -> int:
+        i = self.index.get(value)
+        if i is None:
+            i = self.index[value] = len(self.index)
+        return i
+
+    def encode(self) -> bytes:
+        out = [_U32.pack(len(self.index))]
+        for value in self.index:
+            data = value.encode("utf-8")
+            if len(data) > 0xFFFF:
+                raise ValueError(f"string too long for a snapshot: {value[:32]!r}...")
+            out.append(_U16.pack(len(data)))
+            out.append(data)
+        return b"".join(out)
+
+
+def _encode(db: OrderDB, pending: PendingStatusBuffer, offsets: Offsets) -> Tuple[bytes, int, int]:
+    strings = _StringTable()
+    ref = strings.ref
+    body: List[bytes] = []
+
+    body.append(_U32.pack(len(offsets)))
+    for (topic, partition), offset in sorted(offsets.items()):
+        body.append(_OFFSET.pack(ref(topic), partition, offset))
+
+    # Copy references under the lock, encode outside it: stored records are copy-on-write, so
+    # later updates don't reach the copied ones. The state may still be ahead of `offsets`;
+    # replaying the tail re-applies those updates in order, so the result is the same.
+    with db.transaction():
+        orders = db.export_orders()
+        buffered = pending.export()
+        logs = db.export_received_ids()
+
+    body.append(_U32.pack(len(orders)))
+    for order_id, record in orders:
+        rec = record if isinstance(record, CompactOrder) else CompactOrder(record)
+        n = len(rec.item_ids)
+        body.append(_ORDER.pack(
+            ref(order_id), ref(rec.customer_id), rec.order_date_us,
+            NAIVE_OFFSET if rec.utc_offset_sec is None else rec.utc_offset_sec,
+            ref(rec.order_currency.value), ref(rec.order_status.value), n,
+        ))
+        body.append(struct.pack(f"<{n}I{n}q{n + 2}d", *[ref(i) for i in rec.item_ids], *rec.quantities, *rec.amounts))
+
+    body.append(_U32.pack(len(buffered)))
+    for order_id, status, age in buffered:
+        body.append(_PENDING.pack(ref(order_id), ref(status.value), age))
+
+    body.append(_U32.pack(len(logs)))
+    for topic, first_seq, entries in logs:
+        body.append(_LOG.pack(ref(topic), first_seq, len(entries)))
+        body.extend(_LOG_ENTRY.pack(ref(order_id), partition, offset) for order_id, partition, offset in entries)
+
+    payload = b"".join([_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, time.time()), strings.encode(), *body])
+    return payload + _U32.pack(zlib.crc32(payload)), len(orders), len(buffered)
+
+
+def save_snapshot(path: str, db: OrderDB, pending: PendingStatusBuffer, offsets: Offsets) -> SnapshotInfo:
+    """
+    Writes a snapshot of db/pending, valid as of the given per-partition offsets (the next offset
+    to consume). Offsets must not be ahead of the state: events up to them must already be applied.
+    """
+    data, n_orders, n_pending = _encode(db, pending, offsets)
+    tmp = f"{path}.tmp"
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    try:
+        # persist the rename itself
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    except OSError:
+        pass
+    return SnapshotInfo(time.time(), dict(offsets), n_orders, n_pending, len(data))
+
+
+class _Reader:
+    __slots__ = ("buf", "pos")
+
+    def __init__(self, buf: memoryview) -> None:
+        self.buf = buf
+        self.pos = 0
+
+    def unpack(self, st: struct.Struct) -> tuple:
+        values = st.unpack_from(self.buf, self.pos)
+        self.pos += st.size
+        return values
+
+    def strings(self) -> List[str]:
+        (n,) = self.unpack(_U32)
+        values: List[str] = []
+        for _ in range(n):
+            (length,) = self.unpack(_U16)
+            end = self.pos + length
+            if end > len(self.buf):
+                raise ValueError("truncated string table")
+            values.append(str(self.buf[self.pos:end], "utf-8"))
+            self.pos = end
+        return values
+
+
+def load_snapshot(path: str, db: OrderDB, pending: PendingStatusBuffer) -> SnapshotInfo:
+    """
+    Loads a snapshot into an empty db and pending buffer and returns its offsets.
+    Raises FileNotFoundError if there is none and SnapshotError if it cannot be used; db and
+    pending are left untouched in both cases.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < _HEADER.size + _U32.size:
+        raise SnapshotError(f"{path}: truncated snapshot")
+    payload, (crc,) = data[:-_U32.size], _U32.unpack(data[-_U32.size:])
+    if zlib.crc32(payload) != crc:
+        raise SnapshotError(f"{path}: checksum mismatch")
+    try:
+        return _decode(memoryview(payload), db, pending, len(data))
+    except (struct.error, UnicodeDecodeError, IndexError, ValueError) as e:
+        raise SnapshotError(f"{path}: {e}") from e
+
+
+def _decode(buf: memoryview, db: OrderDB, pending: PendingStatusBuffer, size: int) -> SnapshotInfo:
+    r = _Reader(buf)
+    magic, version, created_at = r.unpack(_HEADER)
+    if magic != SNAPSHOT_MAGIC:
+        raise SnapshotError("not an OrderDB snapshot")
+    if version != SNAPSHOT_VERSION:
+        raise SnapshotError(f"unsupported snapshot version {version}")
+    s = r.strings()
+
+    (n,) = r.unpack(_U32)
+    offsets: Offsets = {}
+    for _ in range(n):
+        topic, partition, offset = r.unpack(_OFFSET)
+        offsets[(s[topic], partition)] = offset
+
+    # parse everything before touching db/pending, so a bad snapshot leaves them empty
+    (n_orders,) = r.unpack(_U32)
+    orders = []
+    for _ in range(n_orders):
+        order_id, customer_id, date_us, utc_offset, currency, status, k = r.unpack(_ORDER)
+        columns = r.unpack(struct.Struct(f"<{k}I{k}q{k + 2}d"))
+        item_ids = [s[i] for i in columns[:k]]
+        quantities = columns[k:2 * k]
+        amounts = columns[2 * k:]
+        orders.append((s[order_id], CompactOrder.from_parts(
+            s[customer_id], date_us, None if utc_offset == NAIVE_OFFSET else utc_offset,
+            Currency(s[currency]), OrderStatus(s[status]), item_ids, quantities, amounts,
+        )))
+
+    (n_pending,) = r.unpack(_U32)
+    buffered = []
+    for _ in range(n_pending):
+        order_id, status, age = r.unpack(_PENDING)
+        buffered.append((s[order_id], OrderStatus(s[status]), age))
+
+    (n_logs,) = r.unpack(_U32)
+    logs = []
+    for _ in range(n_logs):
+        topic, first_seq, m = r.unpack(_LOG)
+        entries = []
+        for _ in range(m):
+            order_id, partition, offset = r.unpack(_LOG_ENTRY)
+            entries.append((s[order_id], partition, offset))
+        logs.append((s[topic], first_seq, entries))
+
+    if r.pos != len(buf):
+        raise SnapshotError(f"{len(buf) - r.pos} trailing bytes")
+
+    with db.transaction():
+        for order_id, record in orders:
+            db.add_record(order_id, record)
+        for topic, first_seq, entries in logs:
+            db.restore_received_ids(topic, first_seq, entries)
+    pending.restore(buffered)
+    return SnapshotInfo(created_at, offsets, n_orders, n_pending, size)
@@ -0,0 +1,108 @@
+"""Test doubles shared by the order service tests."""
+from confluent_kafka import KafkaError
+
+
+class FakeMessage:
+    def __init__(self, value, topic="orders.events", partition=0, offset=0, key=None, error=None, headers=None):
+        self._value = value
+        self._headers = headers
+        self._topic = topic
+        self._partition = partition
+        self._offset = offset
+        self._key = key
+        self._error = error
+
+    def value(self):
+        return self._value
+
+    def key(self):
+        return self._key
+
+    def headers(self):
+        return self._headers
+
+    def topic(self):
+        return self._topic
+
+    def partition(self):
+        return self._partition
+
+    def offset(self):
+        return self._offset
+
+    def error(self):
+        return self._error
+
+
+def error_message(code=KafkaError._TRANSPORT):
+    return FakeMessage(None, error=KafkaError(code))
+
+
+class FakeConsumer:
+    """Serves a fixed list of messages, then calls on_drained (typically the runner's stop)."""
+
+    def __init__(self, messages, on_drained=None, revoke_after=None, revoke=None, partitions=None):
+        self.messages = list(messages)
+        # partitions handed to on_assign before the first message
+        self.partitions = partitions
+        self.on_assign = None
+        self.assigned = None
+        self.on_drained = on_drained
+        # after `revoke_after` messages were handed out, the `revoke` partitions are revoked
+        self.revoke_after = revoke_after
+        self.revoke = revoke or []
+        self.taken = 0
+        self.subscribed = None
+        self.on_revoke = None
+        self.commits = []
+        self.closed = False
+        self.consume_calls = 0
+        self.poll_calls = 0
+        self.stored = {}
+
+    def subscribe(self, topics, on_assign=None, on_revoke=None, **kwargs):
+        self.subscribed = topics
+        self.on_assign = on_assign
+        self.on_revoke = on_revoke
+
+    def assign(self, partitions):
+        self.assigned = {(tp.topic, tp.partition): tp.offset for tp in partitions}
+
+    def _take(self, n):
+        if self.partitions is not None and self.on_assign:
+            partitions, self.partitions = self.partitions, None
+            self.on_assign(self, partitions)
+        if self.revoke_after is not None and self.taken >= self.revoke_after:
+            self.revoke_after = None
+            if self.on_revoke:
+                self.on_revoke(self, self.revoke)
+        batch, self.messages = self.messages[:n], self.messages[n:]
+        self.taken += len(batch)
+        if not self.messages and self.on_drained:
+            self.on_drained()
+        return batch
+
+    def poll(self, timeout=None):
+        self.poll_calls += 1
+        batch = self._take(1)
+        return batch[0] if batch else None
+
+    def consume(self, num_messages=1, timeout=None):
+        self.consume_calls += 1
+        return self._take(num_messages)
+
+    def assignment(self):
+        return []
+
+    def position(self, partitions):
+        return partitions
+
+    def store_offsets(self, message=None, offsets=None):
+        for tp in offsets or []:
+            self.stored[(tp.topic, tp.partition)] = tp.offset
+
+    def commit(self, message=None, offsets=None, asynchronous=True):
+        self.commits.append(({(tp.topic, tp.partition): tp.offset for tp in offsets or []}, asynchronous))
+
+    def close(self):
+        self.closed = True
@@ -1,3 +1,5 @@
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from fastapi.testclient import TestClient
 
 from services.order_service.app.main import app
@@ -57,3 +59,111 @@ def test_get_all_order_ids_from_topic():
     assert r.status_code == 200
     assert r.json()["orderIds"] == ["ORD-1", "ORD-1", "ORD-2"]
 
+
+
+def test_get_all_order_ids_pagination_distinct_and_stream():
+    db = OrderDB()
+    for offset, order_id in enumerate(["ORD-1", "ORD-2", "ORD-1", "ORD-3"]):
+        db.track_received_id("orders.events", order_id, partition=0, offset=offset)
+
+    app.dependency_overrides[get_db] = lambda: db
+    client = TestClient(app)
+
+    r = client.get("/getAllOrderIdsFromTopic", params={"topicName": "orders.events", "limit": 3, "withOffsets": True})
+    body = r.json()
+    assert body["orderIds"] == ["ORD-1", "ORD-2", "ORD-1"]
+    assert body["entries"][2] == {"orderId": "ORD-1", "partition": 0, "offset": 2}
+    assert body["hasMore"]
+
+    r = client.get("/getAllOrderIdsFromTopic", params={"topicName": "orders.events", "cursor": body["nextCursor"]})
+    assert r.json()["orderIds"] == ["ORD-3"] and not r.json()["hasMore"]
+
+    r = client.get("/getAllOrderIdsFromTopic", params={"topicName": "orders.events", "distinct": True})
+    assert r.json()["orderIds"] == ["ORD-2", "ORD-1", "ORD-3"]
+
+    r = client.get("/getAllOrderIdsFromTopic", params={"topicName": "orders.events", "stream": True})
+    assert r.json() == {"topicName": "orders.events", "orderIds": ["ORD-1", "ORD-2", "ORD-1", "ORD-3"]}
+
+    r = client.get("/getAllOrderIdsFromTopic", params={"topicName": "unknown", "stream": True})
+    assert r.json() == {"topicName": "unknown", "orderIds": []}
+
+
+def test_query_orders_endpoint_filters_and_paginates():
+    db = OrderDB()
+    for n in range(1, 4):
+        db.add_order(make_entry(f"ORD-{n}"))
+    db.update_status("ORD-2", OrderStatus.SHIPPED)
+    app.dependency_overrides[get_db] = lambda: db
+    client = TestClient(app)
+
+    r = client.get("/orders", params={"status": "new", "currency": "USD", "limit": 1})
+    body = r.json()
+    assert [o["order"]["orderId"] for o in body["orders"]] == ["ORD-1"] and body["hasMore"]
+    r = client.get("/orders", params={"status": "new", "cursor": body["nextCursor"], "idsOnly": True})
+    assert r.json() == {"orderIds": ["ORD-3"], "nextCursor": 3, "hasMore": False}
+
+    r = client.get("/orders", params={"customerId": "CUST-1", "since": "2000-01-01T00:00:00Z", "idsOnly": True})
+    assert r.json()["orderIds"] == ["ORD-1", "ORD-2", "ORD-3"]
+
+    assert client.get("/orders", params={"status": "lost"}).status_code == 422
+    assert client.get("/orders", params={"since": "2024-02-01T00:00:00", "until": "2024-01-01T00:00:00Z"}).status_code == 400
+    assert client.get("/orders/counts").json() == {"byStatus": {"new": 2, "shipped": 1}, "byCurrency": {"USD": 3}}
+
+
+def test_order_details_cached_with_etag_and_304():
+    db = OrderDB(compact=True)
+    db.add_order(make_entry("ORD-7"))
+    app.dependency_overrides[get_db] = lambda: db
+    client = TestClient(app)
+
+    first = client.get("/order-details", params={"orderId": "7"})
+    etag = first.headers["etag"]
+    # same bytes FastAPI produced for the dict before caching
+    details = {"order": db.get("ORD-7").order.model_dump(by_alias=True), "shippingCost": 2.0}
+    assert first.content == JSONResponse(content=jsonable_encoder(details)).body
+    assert len(db.response_cache) == 1
+
+    second = client.get("/order-details", params={"orderId": "ORD-7"})
+    assert second.content == first.content and second.headers["etag"] == etag
+    assert db.response_cache.hits == 1
+
+    not_modified = client.get("/order-details", params={"orderId": "ORD-7"}, headers={"If-None-Match": f'W/"x", {etag}'})
+    assert not_modified.status_code == 304 and not_modified.content == b""
+
+    db.update_status("ORD-7", OrderStatus.SHIPPED)
+    assert len(db.response_cache) == 0
+    changed = client.get("/order-details", params={"orderId": "ORD-7"}, headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+    assert changed.json()["order"]["status"] == "shipped"
+
+
+def test_order_details_batch_streams_found_and_missing():
+    db = OrderDB()
+    for n in range(1, 4):
+        db.add_order(make_entry(f"ORD-{n}"))
+    app.dependency_overrides[get_db] = lambda: db
+    client = TestClient(app)
+    single = client.get("/order-details", params={"orderId": "ORD-2"}).json()
+
+    r = client.post("/order-details:batch", json={"orderIds": ["2", "ORD-9", "ORD-1", "ORD-2", "ORD-3"]})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["missing"] == ["ORD-9"]
+    assert [o["order"]["orderId"] for o in body["orders"]] == ["ORD-2", "ORD-1", "ORD-3"]
+    assert body["orders"][0] == single
+
+    assert client.post("/order-details:batch", json={"orderIds": ["abc"]}).status_code == 400
+    assert client.post("/order-details:batch", json={"orderIds": []}).status_code == 422
+    r = client.post("/order-details:batch", json={"orderIds": ["ORD-404"]})
+    assert r.json() == {"missing": ["ORD-404"], "orders": []}
+
+
+def test_metrics_endpoint_serves_prometheus_text():
+    client = TestClient(app)
+
+    r = client.get("/metrics")
+
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE order_consumer_handle_seconds histogram" in r.text
+    assert "# TYPE order_consumer_lag gauge" in r.text
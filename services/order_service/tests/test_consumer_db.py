@@ -0,0 +1,265 @@
+import pickle
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from libs.kafka_common.models import Currency, Order, OrderItem, OrderStatus
+from services.order_service import consumer_db
+from services.order_service.consumer_db import OrderDB
+from services.order_service.models import OrderEntry
+
+
+def make_entry(order_id, order_date, customer_id="CUST-00001", currency=Currency.GBP):
+    items = [OrderItem(item_id=f"ITEM-{i:03d}", quantity=i + 1, price=9.99 * (i + 1)) for i in range(3)]
+    order = Order(
+        order_id=order_id,
+        customer_id=customer_id,
+        order_date=order_date,
+        items=items,
+        total_amount=round(sum(i.quantity * i.price for i in items), 2),
+        currency=currency,
+        status=OrderStatus.NEW,
+    )
+    return OrderEntry(order=order, shipping_cost=1.23)
+
+
+@pytest.mark.parametrize("order_date", [
+    datetime(2024, 1, 18, 12, 0, 0, 654321),
+    datetime(2024, 1, 18, 12, 0, tzinfo=timezone.utc),
+    datetime(2024, 1, 18, 12, 0, tzinfo=timezone(timedelta(hours=-3))),
+])
+def test_compact_mode_round_trips_orders(order_date):
+    entry = make_entry("ORD-1", order_date)
+    db = OrderDB(compact=True)
+    db.add_order(entry.model_copy(deep=True))
+
+    assert db.contains("ORD-1") and not db.contains("ORD-2")
+    assert db.get("ORD-1") == entry
+    assert db.get("ORD-1").order.order_date.utcoffset() == order_date.utcoffset()
+
+    assert db.update_status("ORD-1", OrderStatus.SHIPPED)
+    assert db.get_status("ORD-1") == OrderStatus.SHIPPED
+    assert db.get("ORD-1").order.status == OrderStatus.SHIPPED
+    assert db.get("ORD-2") is None and db.get_status("ORD-2") is None
+
+
+def test_compact_mode_shares_customer_and_item_ids():
+    db = OrderDB(compact=True)
+    # built at runtime so the two orders start out with distinct string objects
+    for n in (1, 2):
+        db.add_order(make_entry(f"ORD-{n}", datetime(2024, 1, 1), customer_id="".join(["CUST-", "00042"])))
+
+    first, second = db._orders["ORD-1"], db._orders["ORD-2"]
+    assert first.customer_id is second.customer_id
+    assert all(a is b for a, b in zip(first.item_ids, second.item_ids))
+
+
+def test_compact_records_survive_pickling_with_ids_interned_again():
+    db = OrderDB(compact=True)
+    db.add_order(make_entry("ORD-1", datetime(2024, 1, 1, tzinfo=timezone.utc)))
+    entry = make_entry("ORD-2", datetime(2024, 1, 2, tzinfo=timezone.utc))
+
+    # what a decode worker process sends back
+    record = pickle.loads(pickle.dumps(consumer_db.CompactOrder(entry)))
+    db.add_record("ORD-2", record)
+
+    assert db.get("ORD-2") == entry
+    assert db._orders["ORD-2"].customer_id is db._orders["ORD-1"].customer_id
+
+
+@pytest.mark.parametrize("compact", [False, True])
+@pytest.mark.parametrize("indexed", [True, False])
+def test_query_orders_uses_maintained_indexes(compact, indexed):
+    db = OrderDB(compact=compact, indexed=indexed)
+    start = datetime(2024, 1, 1, 10, 0, tzinfo=timezone.utc)
+    for n in range(10):
+        currency = Currency.USD if n % 2 else Currency.EUR
+        db.add_order(make_entry(f"ORD-{n}", start + timedelta(minutes=20 * n), customer_id=f"CUST-{n % 3}", currency=currency))
+    for n in (2, 5, 7):
+        db.update_status(f"ORD-{n}", OrderStatus.SHIPPED)
+    db.update_status("ORD-5", OrderStatus.CANCELLED)
+
+    assert db.query_orders(status=OrderStatus.SHIPPED).order_ids == ["ORD-2", "ORD-7"]
+    assert db.query_orders(customer_id="CUST-1", currency=Currency.USD).order_ids == ["ORD-1", "ORD-7"]
+    # [10:40, 12:00) spans three hour buckets; naive bounds are UTC
+    window = db.query_orders(currency=Currency.USD, since=datetime(2024, 1, 1, 10, 40), until=start + timedelta(hours=2))
+    assert window.order_ids == ["ORD-3", "ORD-5"]
+
+    first = db.query_orders(status=OrderStatus.NEW, limit=3)
+    assert first.order_ids == ["ORD-0", "ORD-1", "ORD-3"] and first.has_more
+    rest = db.query_orders(status=OrderStatus.NEW, cursor=first.next_cursor, limit=10)
+    assert rest.order_ids == ["ORD-4", "ORD-6", "ORD-8", "ORD-9"] and not rest.has_more
+    # the cursor also picks up orders added later
+    db.add_order(make_entry("ORD-10", start, customer_id="CUST-1"))
+    assert db.query_orders(status=OrderStatus.NEW, cursor=rest.next_cursor).order_ids == ["ORD-10"]
+
+    counts = db.order_counts()
+    assert counts["byStatus"] == {"new": 8, "shipped": 2, "cancelled": 1}
+    assert counts["byCurrency"] == {"EUR": 5, "USD": 5, "GBP": 1}
+
+
+def test_re_adding_an_order_reindexes_it():
+    db = OrderDB()
+    db.add_order(make_entry("ORD-1", datetime(2024, 1, 1), customer_id="CUST-1"))
+    db.add_order(make_entry("ORD-2", datetime(2024, 1, 1), customer_id="CUST-1"))
+    db.add_order(make_entry("ORD-1", datetime(2024, 3, 1), customer_id="CUST-2"))
+
+    assert db.query_orders(customer_id="CUST-1").order_ids == ["ORD-2"]
+    assert db.query_orders(customer_id="CUST-2").order_ids == ["ORD-1"]
+    assert db.query_orders(until=datetime(2024, 2, 1)).order_ids == ["ORD-2"]
+    assert db.query_orders().order_ids == ["ORD-1", "ORD-2"]
+
+
+def test_reads_do_not_wait_for_an_open_transaction():
+    db = OrderDB()
+    db.add_order(make_entry("ORD-1", datetime(2024, 1, 1)))
+    db.track_received_id("orders.events", "ORD-1")
+    in_transaction = threading.Event()
+    release = threading.Event()
+
+    def writer():
+        with db.transaction():
+            db.update_status("ORD-1", OrderStatus.SHIPPED)
+            in_transaction.set()
+            release.wait(timeout=5)
+
+    t = threading.Thread(target=writer)
+    t.start()
+    in_transaction.wait(timeout=5)
+    try:
+        # all answered while the batch is still open
+        assert db.get("ORD-1").order.status == OrderStatus.SHIPPED
+        assert db.query_orders(status=OrderStatus.SHIPPED).order_ids == ["ORD-1"]
+        assert db.received_ids_page("orders.events").entries[0].order_id == "ORD-1"
+    finally:
+        release.set()
+        t.join()
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_concurrent_readers_see_consistent_records_under_ingest(compact):
+    db = OrderDB(compact=compact, received_ids_max_entries=64)
+    statuses = [OrderStatus.CONFIRMED, OrderStatus.PROCESSING, OrderStatus.SHIPPED]
+    for n in range(50):
+        db.add_order(make_entry(f"ORD-{n}", datetime(2024, 1, 1)))
+    held = db.get("ORD-0")
+    stop = threading.Event()
+    errors = []
+
+    def writer():
+        i = 0
+        while not stop.is_set():
+            with db.transaction():
+                for n in range(50):
+                    db.update_status(f"ORD-{n}", statuses[i % 3])
+                    db.track_received_id("orders.events", f"ORD-{n}", offset=i * 50 + n)
+            i += 1
+
+    def reader():
+        try:
+            while not stop.is_set():
+                for n in range(50):
+                    dumped = db.get(f"ORD-{n}").model_dump(by_alias=True)
+                    assert dumped["order"]["status"] in ("new", "confirmed", "processing", "shipped")
+                page = db.received_ids_page("orders.events", limit=100)
+                offsets = [e.offset for e in page.entries]
+                assert offsets == list(range(offsets[0], offsets[0] + len(offsets))) if offsets else True
+                ids = db.query_orders(status=statuses[0], limit=100).order_ids
+                assert len(ids) == len(set(ids)) <= 50
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(3)]
+    for t in threads:
+        t.start()
+    threading.Event().wait(0.5)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    # a record handed out earlier is never changed underneath its reader
+    assert held.order.status == OrderStatus.NEW
+
+
+class CountingLock:
+    """Wraps a lock and counts how often it is taken."""
+
+    def __init__(self, lock):
+        self.lock = lock
+        self.acquired = 0
+
+    def __enter__(self):
+        self.lock.acquire()
+        self.acquired += 1
+        return self
+
+    def __exit__(self, *exc):
+        self.lock.release()
+
+
+@pytest.mark.parametrize("indexed", [True, False])
+def test_long_query_releases_the_structure_lock_between_chunks(monkeypatch, indexed):
+    monkeypatch.setattr(consumer_db, "_QUERY_SCAN_CHUNK", 4)
+    db = OrderDB(indexed=indexed)
+    for n in range(30):
+        db.add_order(make_entry(f"ORD-{n}", datetime(2024, 1, 1), customer_id=f"CUST-{n % 2}"))
+    db._structure_lock = CountingLock(db._structure_lock)
+
+    page = db.query_orders(customer_id="CUST-1", limit=100)
+
+    assert page.order_ids == [f"ORD-{n}" for n in range(1, 30, 2)]
+    assert page.next_cursor == 30 and not page.has_more
+    assert db._structure_lock.acquired > 1
+    first = db.query_orders(customer_id="CUST-1", limit=5)
+    rest = db.query_orders(customer_id="CUST-1", cursor=first.next_cursor, limit=100)
+    assert first.order_ids + rest.order_ids == page.order_ids
+
+
+def test_full_id_listing_is_built_from_a_copy_outside_the_lock():
+    db = OrderDB()
+    for n in range(5):
+        db.track_received_id("orders.events", f"ORD-{n % 3}")
+    log = db._received_ids_by_topic["orders.events"]
+    snapshot = log.snapshot()
+    # writes after the copy don't show up in it
+    db.track_received_id("orders.events", "ORD-9")
+
+    assert snapshot.ids() == ["ORD-0", "ORD-1", "ORD-2", "ORD-0", "ORD-1"]
+    assert snapshot.ids(distinct=True) == ["ORD-2", "ORD-0", "ORD-1"]
+    assert db.get_all_ids_for_topic("orders.events", distinct=True) == ["ORD-2", "ORD-0", "ORD-1", "ORD-9"]
+
+
+def test_order_version_never_sees_a_half_inserted_order():
+    db = OrderDB()
+    entries = [make_entry(f"ORD-{n}", datetime(2024, 1, 1)) for n in range(3000)]
+    done = threading.Event()
+    errors = []
+
+    def reader():
+        try:
+            while not done.is_set():
+                for n in range(0, 3000, 3):
+                    version = db.order_version(f"ORD-{n}")
+                    assert version is None or version > 0
+        except Exception as e:
+            errors.append(e)
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    readers = [threading.Thread(target=reader) for _ in range(3)]
+    try:
+        for t in readers:
+            t.start()
+        for entry in entries:
+            db.add_order(entry)
+    finally:
+        done.set()
+        for t in readers:
+            t.join()
+        sys.setswitchinterval(interval)
+
+    assert errors == []
+    assert all(db.order_version(e.order.order_id) for e in entries)
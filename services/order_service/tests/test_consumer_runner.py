@@ -0,0 +1,328 @@
+import time
+from datetime import datetime, timezone
+
+import pytest
+from confluent_kafka import KafkaError, KafkaException
+
+from libs.kafka_common.memory_broker import MemoryBroker, MemoryConsumer, MemoryProducer
+from libs.kafka_common.events import OrderCreatedEvent, OrderStatusUpdatedEvent
+from libs.kafka_common.models import Order, OrderItem, Currency, OrderStatus
+from libs.kafka_common.event_headers import event_headers
+from libs.kafka_common.serdes_json import serialize_event
+from services.cart_service.publisher import OrderEventPublisher
+from services.order_service.consumer_db import OrderDB
+from services.order_service.consumer_runner import ConsumerRunner
+from services.order_service.tests.fakes import FakeConsumer, FakeMessage, error_message
+
+
+def created(order_id, offset=0, partition=0, headers=False):
+    order = Order(
+        order_id=order_id,
+        customer_id="CUST-0001",
+        order_date=datetime.now(timezone.utc),
+        items=[OrderItem(item_id="ITEM-001", quantity=1, price=50.0)],
+        total_amount=50.0,
+        currency=Currency.EUR,
+        status=OrderStatus.NEW,
+    )
+    event = OrderCreatedEvent(order_id=order_id, order=order)
+    return message(event, offset, partition, headers)
+
+
+def status(order_id, new_status, offset=0, partition=0, headers=False):
+    event = OrderStatusUpdatedEvent(order_id=order_id, status=new_status)
+    return message(event, offset, partition, headers)
+
+
+def message(event, offset, partition, headers):
+    return FakeMessage(
+        serialize_event(event), partition=partition, offset=offset, key=event.order_id.encode(),
+        headers=event_headers(event) if headers else None,
+    )
+
+
+def corrupted(msg):
+    """Same headers and key, unparseable payload: fails if anything decodes it."""
+    return FakeMessage(b"{not json", partition=msg.partition(), offset=msg.offset(), key=msg.key(), headers=msg.headers())
+
+
+def run_once(messages, **kwargs):
+    db = OrderDB()
+    consumer = FakeConsumer(messages)
+    runner = ConsumerRunner(db, consumer_factory=lambda **kw: consumer, **kwargs)
+    consumer.on_drained = runner._stop_event.set
+    runner._run()
+    return db, consumer
+
+
+def test_batch_mode_consumes_in_batches_and_skips_poison_messages():
+    messages = [
+        created("ORD-1", offset=0),
+        FakeMessage(b"{not json", offset=1),
+        status("ORD-1", OrderStatus.CONFIRMED, offset=2),
+        FakeMessage(b'{"event_type": "ORDER_CREATED"}', offset=3),
+        created("ORD-2", offset=4),
+    ]
+
+    db, consumer = run_once(messages, batch_size=3, batch_timeout_sec=0.01)
+
+    assert consumer.consume_calls == 2 and consumer.poll_calls == 0
+    assert db.get("ORD-1").order.status == OrderStatus.CONFIRMED
+    assert db.get("ORD-2") is not None
+    assert db.get_all_ids_for_topic("orders.events") == ["ORD-1", "ORD-1", "ORD-2"]
+    assert consumer.closed
+
+
+def test_single_message_mode_uses_poll():
+    db, consumer = run_once([created("ORD-3"), status("ORD-3", OrderStatus.SHIPPED, offset=1)], batch_timeout_sec=0.01)
+
+    assert consumer.poll_calls == 2 and consumer.consume_calls == 0
+    assert db.get("ORD-3").order.status == OrderStatus.SHIPPED
+
+
+def test_unknown_topic_is_ignored_but_other_errors_raise_after_applying_batch():
+    messages = [
+        error_message(KafkaError.UNKNOWN_TOPIC_OR_PART),
+        created("ORD-4"),
+        error_message(KafkaError._TRANSPORT),
+    ]
+
+    db = OrderDB()
+    runner = ConsumerRunner(db, consumer_factory=lambda **kw: FakeConsumer(messages), batch_size=10)
+    with pytest.raises(KafkaException):
+        runner._run()
+    assert db.get("ORD-4") is not None
+
+
+def test_per_order_ordering_holds_across_partitions():
+    statuses = [OrderStatus.CONFIRMED, OrderStatus.PROCESSING, OrderStatus.SHIPPED]
+    messages = []
+    next_offset = {0: 0, 1: 0, 2: 0}
+
+    def add(factory, order_id, *args):
+        partition = int(order_id.split("-")[1]) % 3
+        messages.append(factory(order_id, *args, offset=next_offset[partition], partition=partition))
+        next_offset[partition] += 1
+
+    for i in range(60):
+        order_id = f"ORD-{i}"
+        if i % 5 == 0:
+            # out-of-order: update before create must still be applied on create
+            add(status, order_id, OrderStatus.CANCELLED)
+            add(created, order_id)
+        else:
+            add(created, order_id)
+            for s in statuses:
+                add(status, order_id, s)
+
+    db, _ = run_once(messages, batch_size=7, batch_timeout_sec=0.01)
+
+    for i in range(60):
+        expected = OrderStatus.CANCELLED if i % 5 == 0 else OrderStatus.SHIPPED
+        assert db.get(f"ORD-{i}").order.status == expected
+
+
+def test_manual_commits_every_n_messages_and_synchronously_on_stop():
+    messages = [created(f"ORD-{i}", offset=i) for i in range(5)]
+
+    db, consumer = run_once(
+        messages, batch_size=2, batch_timeout_sec=0.01,
+        commit_strategy="manual", commit_every_messages=2, commit_interval_ms=60_000,
+    )
+
+    assert consumer.commits == [
+        ({("orders.events", 0): 2}, True),
+        ({("orders.events", 0): 4}, True),
+        ({("orders.events", 0): 5}, False),
+    ]
+    assert consumer.stored == {}
+
+
+def test_revoked_partitions_are_committed_before_handover():
+    from confluent_kafka import TopicPartition
+
+    messages = [created("ORD-0", offset=0, partition=0), created("ORD-1", offset=0, partition=1),
+                created("ORD-2", offset=1, partition=0), created("ORD-3", offset=1, partition=1)]
+    db = OrderDB()
+    consumer = FakeConsumer(messages, revoke_after=2, revoke=[TopicPartition("orders.events", 1)])
+    runner = ConsumerRunner(
+        db, consumer_factory=lambda **kw: consumer, batch_size=2, batch_timeout_sec=0.01,
+        commit_strategy="manual", commit_every_messages=1000, commit_interval_ms=60_000,
+    )
+    consumer.on_drained = runner._stop_event.set
+    runner._run()
+
+    revoke_commit, final_commit = consumer.commits
+    assert revoke_commit == ({("orders.events", 1): 1}, False)
+    # the fake keeps serving partition 1 after the revoke, so it is tracked again from offset 1
+    assert final_commit == ({("orders.events", 0): 2, ("orders.events", 1): 2}, False)
+
+
+def test_headers_filter_and_dedupe_without_decoding_payloads(capsys):
+    first = created("ORD-1", offset=0, headers=True)
+    messages = [
+        first,
+        corrupted(status("ORD-1", OrderStatus.SHIPPED, offset=1, headers=True)),
+        FakeMessage(b"{not json", offset=2, key=first.key(), headers=first.headers()),  # redelivered event_id
+        status("ORD-1", OrderStatus.CANCELLED, offset=3),  # no headers: decoded, then filtered
+        created("ORD-2", offset=4, headers=True),
+    ]
+
+    db = OrderDB()
+    consumer = FakeConsumer(messages)
+    runner = ConsumerRunner(
+        db, consumer_factory=lambda **kw: consumer, batch_size=10, batch_timeout_sec=0.01,
+        commit_strategy="manual", event_types=["ORDER_CREATED"],
+    )
+    consumer.on_drained = runner._stop_event.set
+    runner._run()
+
+    assert db.get("ORD-1").order.status == OrderStatus.NEW
+    assert db.get("ORD-2") is not None
+    # one filtered by its headers, one after decoding
+    assert (runner.filtered, runner.duplicates) == (2, 1)
+    assert runner.latency_ms()["count"] == 4
+    assert runner.metrics.get("order_consumer_end_to_end_latency_seconds").count == 4
+    assert "order_consumer_filtered_total 2" in runner.metrics.render()
+    assert consumer.commits[-1] == ({("orders.events", 0): 5}, False)
+    assert "Failed to process message" not in capsys.readouterr().out
+
+
+def test_duplicate_created_event_is_not_decoded(capsys):
+    original = created("ORD-7", offset=0, headers=True)
+    # a re-published ORDER_CREATED (new event_id) for an order that already exists
+    republished = corrupted(created("ORD-7", offset=1, headers=True))
+
+    db, _ = run_once([original, republished, status("ORD-7", OrderStatus.SHIPPED, offset=2, headers=True)],
+                     batch_size=10, batch_timeout_sec=0.01)
+
+    assert db.get("ORD-7").order.status == OrderStatus.SHIPPED
+    assert "Failed to process message" not in capsys.readouterr().out
+
+
+def test_lazy_payload_that_contradicts_headers_is_poison(capsys):
+    msg = created("ORD-8", headers=True)
+    forged = FakeMessage(msg.value(), key=b"ORD-9", headers=msg.headers())
+
+    db, _ = run_once([forged], batch_size=10, batch_timeout_sec=0.01)
+
+    assert db.get("ORD-8") is None and db.get("ORD-9") is None
+    assert "does not match headers" in capsys.readouterr().out
+
+
+def test_decode_pool_keeps_message_order_and_reports_bad_payloads(capsys):
+    messages, offset = [], 0
+    for i in range(40):
+        order_id = f"ORD-{i}"
+        if i % 4 == 0:
+            # update before create: buffered, then applied to the record the pool decoded
+            events = [status(order_id, OrderStatus.CANCELLED, headers=True), created(order_id, headers=True)]
+        else:
+            events = [created(order_id, headers=True), status(order_id, OrderStatus.SHIPPED, headers=True)]
+        for msg in events:
+            messages.append(FakeMessage(msg.value(), offset=offset, key=msg.key(), headers=msg.headers()))
+            offset += 1
+    messages.append(corrupted(created("ORD-40", offset=offset, headers=True)))
+    forged = created("ORD-41", headers=True)
+    messages.append(FakeMessage(forged.value(), offset=offset + 1, key=b"ORD-42", headers=forged.headers()))
+
+    db = OrderDB(compact=True)
+    consumer = FakeConsumer(messages)
+    runner = ConsumerRunner(db, batch_size=100, batch_timeout_sec=0.01, decode_processes=2, consumer_factory=lambda **kw: consumer)
+    consumer.on_drained = runner._stop_event.set
+    try:
+        runner._run()
+    finally:
+        runner.decode_pool.close()
+
+    for i in range(40):
+        expected = OrderStatus.CANCELLED if i % 4 == 0 else OrderStatus.SHIPPED
+        assert db.get(f"ORD-{i}").order.status == expected
+    assert db.get("ORD-0").shipping_cost == 1.0
+    assert db.get("ORD-40") is None and db.get("ORD-41") is None and db.get("ORD-42") is None
+    assert runner.poison == 2
+    out = capsys.readouterr().out
+    assert "does not match headers" in out and "Decode pool failed" not in out
+    assert runner.metrics.get("order_consumer_decode_pool_wait_seconds").count == 1
+
+
+def test_decode_pool_needs_a_compact_db():
+    with pytest.raises(ValueError):
+        ConsumerRunner(OrderDB(), decode_processes=2)
+
+
+def is_shipped(db, order_id):
+    entry = db.get(order_id)
+    return entry is not None and entry.order.status == OrderStatus.SHIPPED
+
+
+def test_publisher_to_consumer_runner_end_to_end():
+    broker = MemoryBroker(num_partitions=3)
+    publisher = OrderEventPublisher(producer=MemoryProducer(broker=broker), pipelined=True, poll_interval_sec=0.01)
+    for n in range(30):
+        order = Order(
+            order_id=f"ORD-{n}", customer_id="CUST-00001", order_date=datetime.now(timezone.utc),
+            items=[OrderItem(item_id="ITEM-001", quantity=1, price=10.0)], total_amount=10.0,
+            currency=Currency.USD, status=OrderStatus.NEW,
+        )
+        publisher.publish_order_created(order)
+    publisher.publish_order_status_updated("ORD-7", OrderStatus.SHIPPED)
+    publisher.close()
+
+    db = OrderDB()
+    runner = ConsumerRunner(
+        db, batch_size=50, batch_timeout_sec=0.05, commit_strategy="manual",
+        consumer_factory=lambda group_id, auto_offset_reset, extra_config: MemoryConsumer({"group.id": group_id, "auto.offset.reset": auto_offset_reset, **(extra_config or {})}, broker=broker),
+    )
+    runner.start()
+    deadline = time.monotonic() + 5
+    while not is_shipped(db, "ORD-7") and time.monotonic() < deadline:
+        time.sleep(0.01)
+    runner.stop()
+
+    assert all(db.get(f"ORD-{n}") is not None for n in range(30))
+    assert is_shipped(db, "ORD-7")
+    assert runner.metrics.get("order_consumer_events_total").labels("ORDER_CREATED").value == 30
+    # offsets are committed on stop
+    assert broker.lag("order-service", "orders.events") == 0
+
+
+def test_metrics_count_events_by_type_poison_and_decode_times():
+    messages = [
+        created("ORD-1", offset=0, headers=True),
+        status("ORD-1", OrderStatus.CONFIRMED, offset=1),
+        FakeMessage(b"{not json", offset=2),
+        status("ORD-2", OrderStatus.SHIPPED, offset=3, headers=True),
+    ]
+    db = OrderDB()
+    consumer = FakeConsumer(messages)
+    runner = ConsumerRunner(db, consumer_factory=lambda **kw: consumer, batch_size=10, batch_timeout_sec=0.01)
+    consumer.on_drained = runner._stop_event.set
+    runner._run()
+
+    events = runner.metrics.get("order_consumer_events_total")
+    assert events.labels("ORDER_CREATED").value == 1
+    assert events.labels("ORDER_STATUS_UPDATED").value == 2
+    assert runner.metrics.get("order_consumer_handle_seconds").labels("ORDER_CREATED").count == 1
+    # one eager decode (no headers) and two lazy ones
+    assert runner.metrics.get("order_consumer_deserialize_seconds").count == 3
+    assert runner.poison == 1
+    text = runner.metrics.render()
+    assert "order_pending_status_size 1" in text
+    assert "order_consumer_poison_messages_total 1" in text
+
+
+def test_lag_is_read_from_the_consumers_local_state():
+    broker = MemoryBroker(num_partitions=1)
+    producer = MemoryProducer(broker=broker)
+    for n in range(10):
+        producer.produce("orders.events", value=b"x", key=b"ORD-1")
+    producer.flush(1)
+    consumer = MemoryConsumer({"group.id": "g", "auto.offset.reset": "earliest"}, broker=broker)
+    consumer.subscribe(["orders.events"])
+    assert len(consumer.consume(num_messages=4, timeout=0.1)) == 4
+
+    runner = ConsumerRunner(OrderDB())
+    runner._refresh_lag(consumer)
+
+    assert runner.metrics.get("order_consumer_lag").samples() == {("orders.events", "0"): 6}
@@ -0,0 +1,36 @@
+from services.order_service.offset_tracker import OffsetTracker
+
+
+def positions(tracker):
+    return {(tp.topic, tp.partition): tp.offset for tp in tracker.positions()}
+
+
+def test_position_advances_only_over_contiguous_completed_prefix():
+    t = OffsetTracker()
+    for offset in (10, 11, 12):
+        t.begin("orders.events", 0, offset)
+
+    t.complete("orders.events", 0, 11)
+    assert positions(t) == {}
+
+    t.complete("orders.events", 0, 10)
+    assert positions(t) == {("orders.events", 0): 12}
+
+    t.complete("orders.events", 0, 12)
+    assert positions(t) == {("orders.events", 0): 13}
+    assert t.in_flight() == 0
+
+
+def test_collect_reports_each_advance_once_and_forget_drops_partition():
+    t = OffsetTracker()
+    t.begin("orders.events", 0, 0)
+    t.begin("orders.events", 1, 5)
+    t.complete("orders.events", 0, 0)
+    t.complete("orders.events", 1, 5)
+
+    collected = {(tp.partition, tp.offset) for tp in t.collect()}
+    assert collected == {(0, 1), (1, 6)}
+    assert t.collect() == []
+
+    t.forget([tp for tp in t.positions() if tp.partition == 1])
+    assert [tp.partition for tp in t.positions()] == [0]
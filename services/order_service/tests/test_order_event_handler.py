@@ -83,3 +83,21 @@ def test_duplicate_created_is_ignored_but_tracking_keeps_arrivals():
 
     # business state doesn't duplicate; tracking list does (because we track arrivals)
     assert db.get_all_ids_for_topic("orders.events") == ["ORD-40", "ORD-40"]
+
+
+def test_pending_status_buffer_is_bounded():
+    from services.order_service.pending_buffer import PendingStatusBuffer
+
+    db = OrderDB()
+    dropped = []
+    h = OrderEventHandler(db, PendingStatusBuffer(max_size=2, sink=dropped.append))
+
+    for i in range(3):
+        h.handle(OrderStatusUpdatedEvent(order_id=f"ORD-5{i}", status=OrderStatus.CONFIRMED), topic="orders.events")
+    for i in range(3):
+        order = make_order(order_id=f"ORD-5{i}")
+        h.handle(OrderCreatedEvent(order_id=order.order_id, order=order), topic="orders.events")
+
+    assert [e.order_id for e in dropped] == ["ORD-50"]
+    assert db.get("ORD-50").order.status == OrderStatus.NEW
+    assert db.get("ORD-52").order.status == OrderStatus.CONFIRMED
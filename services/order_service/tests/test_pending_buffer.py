@@ -0,0 +1,63 @@
+from libs.kafka_common.models import OrderStatus
+from services.order_service.pending_buffer import EVICTED_EXPIRED, EVICTED_OVERFLOW, PendingStatusBuffer
+
+
+def make_buffer(**kwargs):
+    now = [0.0]
+    evicted = []
+    buffer = PendingStatusBuffer(sink=evicted.append, clock=lambda: now[0], **kwargs)
+    return buffer, now, evicted
+
+
+def test_overflow_evicts_oldest_arrival_to_sink():
+    buffer, now, evicted = make_buffer(max_size=2, ttl_sec=0)
+    buffer.put("ORD-1", OrderStatus.CONFIRMED)
+    buffer.put("ORD-2", OrderStatus.CONFIRMED)
+    buffer.put("ORD-1", OrderStatus.SHIPPED)  # newer update moves ORD-1 to the back
+    buffer.put("ORD-3", OrderStatus.CANCELLED)
+
+    assert [(e.order_id, e.reason) for e in evicted] == [("ORD-2", EVICTED_OVERFLOW)]
+    assert buffer.pop("ORD-1") == OrderStatus.SHIPPED
+    assert buffer.stats() == {"size": 1, "evicted_expired": 0, "evicted_overflow": 1}
+
+
+def test_expired_entries_are_evicted_and_not_returned():
+    buffer, now, evicted = make_buffer(max_size=0, ttl_sec=10)
+    buffer.put("ORD-1", OrderStatus.CONFIRMED)
+    now[0] = 5
+    buffer.put("ORD-2", OrderStatus.CONFIRMED)
+    now[0] = 12
+
+    assert buffer.pop("ORD-1") is None
+    assert [(e.order_id, e.status, e.reason) for e in evicted] == [("ORD-1", OrderStatus.CONFIRMED, EVICTED_EXPIRED)]
+
+    now[0] = 16
+    assert buffer.expire() == 1
+    assert len(buffer) == 0 and buffer.evictions == 2
+
+
+def test_failing_sink_does_not_break_the_buffer(capsys):
+    def sink(_):
+        raise RuntimeError("sink down")
+
+    buffer = PendingStatusBuffer(max_size=1, sink=sink)
+    buffer.put("ORD-1", OrderStatus.CONFIRMED)
+    buffer.put("ORD-2", OrderStatus.CONFIRMED)
+
+    assert buffer.pop("ORD-2") == OrderStatus.CONFIRMED
+    assert "sink down" in capsys.readouterr().out
+
+
+def test_restore_applies_the_buffers_own_limits():
+    buffer, now, evicted = make_buffer(max_size=2, ttl_sec=10)
+    now[0] = 100
+
+    buffer.restore([
+        ("ORD-1", OrderStatus.CONFIRMED, 15),  # older than ttl_sec
+        ("ORD-2", OrderStatus.CONFIRMED, 5),
+        ("ORD-3", OrderStatus.SHIPPED, 4),
+        ("ORD-4", OrderStatus.CANCELLED, 3),
+    ])
+
+    assert [(e.order_id, e.reason) for e in evicted] == [("ORD-1", EVICTED_EXPIRED), ("ORD-2", EVICTED_OVERFLOW)]
+    assert [order_id for order_id, _, _ in buffer.export()] == ["ORD-3", "ORD-4"]
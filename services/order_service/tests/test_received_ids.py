@@ -0,0 +1,60 @@
+from services.order_service.received_ids import IdInterner, ReceivedIdLog
+
+
+def test_pages_follow_cursor_and_pick_up_new_entries():
+    log = ReceivedIdLog(IdInterner())
+    for i in range(5):
+        log.append(f"ORD-{i}", partition=i % 2, offset=i)
+
+    page = log.page(cursor=0, limit=3)
+    assert [e.order_id for e in page.entries] == ["ORD-0", "ORD-1", "ORD-2"]
+    assert (page.entries[1].partition, page.entries[1].offset) == (1, 1)
+    assert page.has_more
+
+    page = log.page(cursor=page.next_cursor, limit=3)
+    assert [e.order_id for e in page.entries] == ["ORD-3", "ORD-4"]
+    assert not page.has_more
+
+    log.append("ORD-5")
+    assert [e.order_id for e in log.page(cursor=page.next_cursor).entries] == ["ORD-5"]
+
+
+def test_distinct_lists_each_id_once_at_its_latest_entry():
+    log = ReceivedIdLog(IdInterner())
+    for order_id in ["ORD-1", "ORD-2", "ORD-1", "ORD-3", "ORD-2"]:
+        log.append(order_id)
+
+    assert log.ids() == ["ORD-1", "ORD-2", "ORD-1", "ORD-3", "ORD-2"]
+    assert log.ids(distinct=True) == ["ORD-1", "ORD-3", "ORD-2"]
+    assert [e.order_id for e in log.page(limit=2, distinct=True).entries] == ["ORD-1", "ORD-3"]
+
+
+def test_max_entries_evicts_oldest_in_batches_and_releases_ids():
+    interner = IdInterner()
+    log = ReceivedIdLog(interner, max_entries=32)  # evicts once 2 entries are over the limit
+    for i in range(40):
+        log.append(f"ORD-{i % 20}")
+
+    assert 32 <= len(log) <= 33
+    # a cursor into the evicted range resumes at the oldest retained entry
+    assert log.page(cursor=0, limit=1).entries[0].seq == 8
+    assert len(log) == 32
+    assert len(interner) == 20
+
+    log2 = ReceivedIdLog(interner, max_entries=2)
+    for order_id in ["ORD-A", "ORD-B", "ORD-C"]:
+        log2.append(order_id)
+    assert log2.ids() == ["ORD-B", "ORD-C"]
+    assert len(interner) == 22  # ORD-A released, its code is free for reuse
+
+
+def test_max_age_evicts_expired_entries():
+    now = [1000.0]
+    log = ReceivedIdLog(IdInterner(), max_age_sec=10, clock=lambda: now[0])
+    log.append("ORD-1")
+    log.append("ORD-2")
+    now[0] += 11
+
+    log.append("ORD-3")
+
+    assert log.ids() == ["ORD-3"]
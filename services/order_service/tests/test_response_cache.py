@@ -0,0 +1,30 @@
+from services.order_service.response_cache import ENTRY_OVERHEAD_BYTES, CachedResponse, ResponseCache
+
+
+def response(version, size=100):
+    return CachedResponse(version, f'"v{version}"', b"x" * size)
+
+
+def test_lru_eviction_keeps_total_size_bounded():
+    cache = ResponseCache(max_bytes=3 * (100 + ENTRY_OVERHEAD_BYTES))
+    for key in ("a", "b", "c"):
+        cache.put(key, response(1))
+    assert cache.get("a", 1) is not None  # a is now the most recently used
+    cache.put("d", response(1))
+
+    assert cache.get("b", 1) is None
+    assert all(cache.get(key, 1) is not None for key in ("a", "c", "d"))
+    assert cache.size_bytes <= cache.max_bytes and cache.evictions == 1
+
+
+def test_versions_invalidation_and_oversized_bodies():
+    cache = ResponseCache(max_bytes=1000)
+    cache.put("a", response(2))
+    assert cache.get("a", 3) is None  # built from an older version
+    cache.put("a", response(1))  # a late, stale fill doesn't replace the newer entry
+    assert cache.get("a", 2).etag == '"v2"'
+
+    cache.invalidate("a")
+    assert cache.get("a", 2) is None and cache.size_bytes == 0
+    cache.put("big", response(1, size=1000))
+    assert len(cache) == 0
@@ -0,0 +1,96 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from confluent_kafka import TopicPartition
+
+from libs.kafka_common.models import OrderStatus
+from services.order_service.consumer_db import OrderDB
+from services.order_service.consumer_runner import ConsumerRunner
+from services.order_service.pending_buffer import PendingStatusBuffer
+from services.order_service.snapshot import SnapshotError, load_snapshot, save_snapshot
+from services.order_service.tests.fakes import FakeConsumer
+from services.order_service.tests.test_consumer_db import make_entry
+from services.order_service.tests.test_consumer_runner import created, status
+
+TOPIC = "orders.events"
+
+
+def populated(compact):
+    db = OrderDB(compact=compact, received_ids_max_entries=3)
+    dates = [
+        datetime(2024, 5, 1, 12, 30, 15, 123456),
+        datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc),
+        datetime(2024, 5, 1, 9, 30, tzinfo=timezone(timedelta(hours=-3))),
+    ]
+    for n, order_date in enumerate(dates):
+        db.add_order(make_entry(f"ORD-{n}", order_date, customer_id=f"CUST-{n % 2}"))
+    db.update_status("ORD-1", OrderStatus.SHIPPED)
+    for n in range(5):
+        db.track_received_id(TOPIC, f"ORD-{n % 3}", partition=n % 2, offset=n)
+    return db
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_round_trip_restores_orders_pending_ids_and_offsets(tmp_path, compact):
+    path = str(tmp_path / "orders.snap")
+    db = populated(compact)
+    now = [100.0]
+    pending = PendingStatusBuffer(clock=lambda: now[0])
+    pending.put("ORD-9", OrderStatus.CONFIRMED)
+    now[0] = 130.0
+    offsets = {(TOPIC, 0): 41, (TOPIC, 1): 7}
+
+    info = save_snapshot(path, db, pending, offsets)
+    assert info.orders == 3 and info.pending == 1
+    assert os.listdir(tmp_path) == ["orders.snap"]
+
+    restored = OrderDB(compact=compact, received_ids_max_entries=3)
+    restored_pending = PendingStatusBuffer(clock=lambda: 500.0)
+    loaded = load_snapshot(path, restored, restored_pending)
+
+    assert loaded.offsets == offsets
+    for n in range(3):
+        assert restored.get(f"ORD-{n}") == db.get(f"ORD-{n}")
+    assert restored.get_status("ORD-1") == OrderStatus.SHIPPED
+    assert restored_pending.export() == [("ORD-9", OrderStatus.CONFIRMED, 30.0)]
+    # cursors handed out before the restart stay valid
+    before = db.received_ids_page(TOPIC, cursor=3, limit=10)
+    after = restored.received_ids_page(TOPIC, cursor=3, limit=10)
+    assert after == before and after.entries[0].seq == 3
+
+
+def test_corrupt_snapshot_is_rejected_and_leaves_db_empty(tmp_path):
+    path = tmp_path / "orders.snap"
+    save_snapshot(str(path), populated(True), PendingStatusBuffer(), {(TOPIC, 0): 5})
+    data = bytearray(path.read_bytes())
+    data[len(data) // 2] ^= 0xFF
+    path.write_bytes(bytes(data))
+
+    db = OrderDB()
+    with pytest.raises(SnapshotError):
+        load_snapshot(str(path), db, PendingStatusBuffer())
+    assert not db.contains("ORD-0")
+    with pytest.raises(FileNotFoundError):
+        load_snapshot(str(tmp_path / "missing.snap"), db, PendingStatusBuffer())
+
+
+def test_runner_snapshots_on_stop_and_resumes_from_snapshot_offsets(tmp_path):
+    path = str(tmp_path / "orders.snap")
+    messages = [created("ORD-1", offset=0), created("ORD-2", offset=1), status("ORD-1", OrderStatus.CONFIRMED, offset=2)]
+    first = FakeConsumer(messages)
+    runner = ConsumerRunner(OrderDB(), snapshot_path=path, consumer_factory=lambda **kw: first)
+    first.on_drained = runner._stop_event.set
+    runner._run()
+    assert os.path.exists(path)
+
+    db = OrderDB()
+    second = FakeConsumer([], partitions=[TopicPartition(TOPIC, 0), TopicPartition(TOPIC, 1)])
+    restarted = ConsumerRunner(db, snapshot_path=path, consumer_factory=lambda **kw: second)
+    assert restarted.restore_snapshot().orders == 2
+    assert db.get_status("ORD-1") == OrderStatus.CONFIRMED
+
+    second.on_drained = restarted._stop_event.set
+    restarted._run()
+    # partition 0 resumes after the last applied message; partition 1 keeps the group offset
+    assert second.assigned == {(TOPIC, 0): 3, (TOPIC, 1): TopicPartition(TOPIC, 1).offset}